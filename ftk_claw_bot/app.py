@@ -235,6 +235,10 @@ class Application:
         try:
             from .services import ServiceRegistry
             
+            indexer = ServiceRegistry.get("workspace_indexer")
+            if indexer:
+                indexer.bind_config_manager(config_manager)
+            
             auto_start_services = ServiceRegistry.get_auto_start_services()
             total_services = len(auto_start_services)
             
@@ -359,6 +363,10 @@ class Application:
                 
                 from .services import ServiceRegistry
                 
+                indexer = ServiceRegistry.get("workspace_indexer")
+                if indexer:
+                    indexer.bind_config_manager(config_manager)
+                
                 auto_start_services = ServiceRegistry.get_auto_start_services()
                 total_services = len(auto_start_services)
                 
@@ -1,23 +1,35 @@
 from .wsl_manager import WSLManager
 from .clawbot_controller import ClawbotController
+from .connectivity_prober import ConnectivityProber
 from .skill_manager import SkillManager
 from .config_manager import ConfigManager
 from .clawbot_gateway_manager import ClawbotGatewayManager, GatewayStatus
 from .multi_clawbot_gateway_manager import MultiClawbotGatewayManager
+from .gateway_supervisor import GatewaySupervisor
 from .bridge_manager import BridgeManager
 from .config_sync_manager import ConfigSyncManager
 from .group_chat_manager import GroupChatManager, BotChatState
+from .group_chat_scheduler import GroupChatScheduler
+from .mention_router import MentionRouter
+from .chat_history_store import ChatHistoryStore, get_chat_history_store, close_chat_history_store
 
 __all__ = [
     "WSLManager",
     "ClawbotController",
+    "ConnectivityProber",
     "SkillManager",
     "ConfigManager",
     "ClawbotGatewayManager",
     "MultiClawbotGatewayManager",
+    "GatewaySupervisor",
     "GatewayStatus",
     "BridgeManager",
     "ConfigSyncManager",
     "GroupChatManager",
     "BotChatState",
+    "GroupChatScheduler",
+    "MentionRouter",
+    "ChatHistoryStore",
+    "get_chat_history_store",
+    "close_chat_history_store",
 ]
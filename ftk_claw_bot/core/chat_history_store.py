@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+GROUP_CONVERSATION = "group"
+DEFAULT_PAGE_SIZE = 50
+FLUSH_INTERVAL = 0.5  # 写入线程最长攒批时间（秒）
+FLUSH_BATCH = 256  # 攒够这么多条立即写入
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    name TEXT,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    message_type TEXT NOT NULL DEFAULT 'text'
+);
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    conversation TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (conversation, message_id)
+) WITHOUT ROWID;
+"""
+
+
+def bot_conversation(bot_name: str) -> str:
+    """单个 bot 的会话键"""
+    return f"bot:{bot_name}"
+
+
+class ChatHistoryStore:
+    """
+    聊天记录持久化（SQLite WAL）
+
+    每条消息只存一行，通过 conversation_messages 归属到一个或多个会话
+    （bot:<name> / group），面板时间线直接按 id 顺序读 messages。
+    append 只在内存中排队并立即分配 id，由后台线程攒批后在一个事务里写入；
+    读取前会先把排队的消息写入，保证读到的是完整记录。
+    """
+
+    def __init__(self, db_path: Path | str):
+        self._db_path = Path(db_path)
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self._db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+        self._lock = threading.Lock()  # 保护连接
+        self._cond = threading.Condition()  # 保护 _pending
+        self._pending: List[tuple] = []
+        self._next_id = (self._conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0) + 1
+        self._written = 0
+        self._batches = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer_loop, name="ChatHistoryWriter", daemon=True)
+        self._thread.start()
+        logger.info(f"[ChatHistory] 已打开: {self._db_path}")
+
+    # ========================================
+    # 写入
+    # ========================================
+
+    def reserve_id(self) -> int:
+        """预先分配 id（流式消息开始时占位，结束后用同一 id 写入，保证与显示顺序一致）"""
+        with self._cond:
+            message_id = self._next_id
+            self._next_id += 1
+        return message_id
+
+    def append(self, role: str, content: str, name: Optional[str] = None,
+               conversations: Iterable[str] = (), timestamp: Optional[float] = None,
+               message_type: str = "text", message_id: Optional[int] = None) -> int:
+        """排队写入一条消息，返回其 id"""
+        with self._cond:
+            if self._closed:
+                return 0
+            if message_id is None:
+                message_id = self._next_id
+                self._next_id += 1
+            self._pending.append((
+                message_id, role, name, content,
+                time.time() if timestamp is None else timestamp,
+                message_type, tuple(dict.fromkeys(conversations)),
+            ))
+            if len(self._pending) >= FLUSH_BATCH:
+                self._cond.notify()
+        return message_id
+
+    def _take_pending(self) -> List[tuple]:
+        with self._cond:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _write(self, batch: List[tuple]):
+        if not batch:
+            return
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO messages (id, role, name, content, timestamp, message_type) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [row[:6] for row in batch],
+                    )
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO conversation_messages (conversation, message_id) VALUES (?, ?)",
+                        [(conversation, row[0]) for row in batch for conversation in row[6]],
+                    )
+                self._written += len(batch)
+                self._batches += 1
+            except sqlite3.Error as e:
+                logger.error(f"[ChatHistory] 写入失败 ({len(batch)} 条): {e}")
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                # 攒批：等到间隔结束或条数够了再写
+                self._cond.wait_for(lambda: len(self._pending) >= FLUSH_BATCH or self._closed,
+                                    FLUSH_INTERVAL)
+                closed = self._closed
+            self._write(self._take_pending())
+            if closed:
+                return
+
+    def flush(self):
+        """立即写入排队的消息"""
+        self._write(self._take_pending())
+
+    # ========================================
+    # 读取
+    # ========================================
+
+    def load_page(self, conversation: Optional[str] = None, before_id: Optional[int] = None,
+                  limit: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """
+        读取一页消息（按时间正序）
+
+        Args:
+            conversation: 会话键，None 表示全部消息（面板时间线）
+            before_id: 只取 id 小于它的消息，None 表示从最新开始
+            limit: 条数
+        """
+        self.flush()
+        before = before_id if before_id is not None else self._next_id
+        if conversation is None:
+            sql = ("SELECT id, role, name, content, timestamp, message_type FROM messages "
+                   "WHERE id < ? ORDER BY id DESC LIMIT ?")
+            args: tuple = (before, limit)
+        else:
+            sql = ("SELECT m.id, m.role, m.name, m.content, m.timestamp, m.message_type "
+                   "FROM conversation_messages c JOIN messages m ON m.id = c.message_id "
+                   "WHERE c.conversation = ? AND c.message_id < ? ORDER BY c.message_id DESC LIMIT ?")
+            args = (conversation, before, limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        keys = ("id", "role", "name", "content", "timestamp", "message_type")
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+    def count(self, conversation: Optional[str] = None) -> int:
+        self.flush()
+        with self._lock:
+            if conversation is None:
+                return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM conversation_messages WHERE conversation = ?", (conversation,)
+            ).fetchone()[0]
+
+    def clear(self, conversation: Optional[str] = None):
+        """清空会话记录，None 表示清空全部"""
+        self.flush()
+        with self._lock:
+            with self._conn:
+                if conversation is None:
+                    self._conn.execute("DELETE FROM conversation_messages")
+                    self._conn.execute("DELETE FROM messages")
+                else:
+                    # 只属于该会话的消息一并删除
+                    self._conn.execute(
+                        "DELETE FROM messages WHERE id IN "
+                        "(SELECT message_id FROM conversation_messages WHERE conversation = ?) "
+                        "AND id NOT IN (SELECT message_id FROM conversation_messages WHERE conversation != ?)",
+                        (conversation, conversation),
+                    )
+                    self._conn.execute("DELETE FROM conversation_messages WHERE conversation = ?", (conversation,))
+        logger.info(f"[ChatHistory] 已清空: {conversation or '全部'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "path": str(self._db_path),
+            "pending": pending,
+            "written": self._written,
+            "batches": self._batches,
+        }
+
+    def close(self):
+        """写入剩余消息并关闭数据库"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(5)
+        self.flush()
+        with self._lock:
+            self._conn.close()
+        logger.info(f"[ChatHistory] 已关闭，共写入 {self._written} 条 / {self._batches} 批")
+
+
+_store: Optional[ChatHistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chat_history_store() -> ChatHistoryStore:
+    """进程内共享的聊天记录存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from ..utils.user_data_dir import user_data
+            _store = ChatHistoryStore(user_data.chat_history_file)
+        return _store
+
+
+def close_chat_history_store():
+    """关闭共享存储（未打开时不做任何事）"""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -3,8 +3,9 @@ import subprocess
 import threading
 import os
 import json
-import asyncio
-from typing import Optional, List, Dict, Any, Callable
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
 from datetime import datetime
 from pathlib import Path
 from loguru import logger
@@ -12,21 +13,24 @@ from loguru import logger
 from ..models import ClawbotConfig, ClawbotStatus, ClawbotInstance
 from .wsl_manager import WSLManager
 from .config_sync_manager import ConfigSyncManager
-
-try:
-    import websockets
-    WEBSOCKETS_AVAILABLE = True
-except ImportError:
-    WEBSOCKETS_AVAILABLE = False
+from .connectivity_prober import ConnectivityProber, WEBSOCKETS_AVAILABLE
 
 
 class ClawbotController:
+    IP_CACHE_TTL = 30.0  # distro IP 缓存时间（秒），探测失败时立即失效
+
     def __init__(self, wsl_manager: WSLManager):
         self._wsl_manager = wsl_manager
         self._config_sync_manager = ConfigSyncManager(wsl_manager)
         self._instances: dict[str, ClawbotInstance] = {}
         self._log_callbacks: list = []
         self._status_callbacks: list = []
+        self._prober = ConnectivityProber()
+        self._ip_cache: Dict[str, Tuple[float, str]] = {}
+
+    @property
+    def prober(self) -> ConnectivityProber:
+        return self._prober
 
     def start(self, config: ClawbotConfig) -> bool:
         distro = self._wsl_manager.get_distro(config.distro_name)
@@ -218,41 +222,22 @@ class ClawbotController:
         Returns:
             True if WebSocket connection can be established
         """
-        if not WEBSOCKETS_AVAILABLE:
-            return False
-
-        distro = self._wsl_manager.get_distro(instance.config.distro_name)
-        if not distro or not distro.is_running:
-            return False
+        return self.check_gateway_connectivity(instance.config.distro_name, instance.config.gateway_port)
 
-        ip = self._wsl_manager.get_distro_ip(instance.config.distro_name)
-        if not ip:
-            return False
-
-        gateway_url = f"ws://{ip}:{instance.config.gateway_port}/ws"
-
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            success = loop.run_until_complete(self._async_check_connectivity(gateway_url))
-            loop.close()
-            return success
-        except Exception:
-            return False
+    def _get_distro_ip(self, distro_name: str) -> Optional[str]:
+        cached = self._ip_cache.get(distro_name)
+        if cached is not None and time.monotonic() - cached[0] < self.IP_CACHE_TTL:
+            return cached[1]
+        ip = self._wsl_manager.get_distro_ip(distro_name)
+        if ip:
+            self._ip_cache[distro_name] = (time.monotonic(), ip)
+        return ip
 
-    async def _async_check_connectivity(self, gateway_url: str) -> bool:
-        """Async method to check WebSocket connectivity."""
-        try:
-            async with websockets.connect(gateway_url, open_timeout=5):
-                return True
-        except Exception:
-            return False
-    
     def check_gateway_connectivity(self, distro_name: str, gateway_port: int) -> bool:
         """Check if gateway is reachable via WebSocket.
         
         This method doesn't require an in-memory instance, it directly checks
-        the WebSocket connection.
+        the WebSocket connection. Results are cached briefly by the prober.
         
         Args:
             distro_name: WSL distro name
@@ -261,27 +246,49 @@ class ClawbotController:
         Returns:
             True if WebSocket connection can be established
         """
+        return self.check_gateways_connectivity([(distro_name, gateway_port)]).get((distro_name, gateway_port), False)
+
+    def check_gateways_connectivity(self, targets: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], bool]:
+        """批量检查多个 gateway 的连通性，所有探测并发执行
+
+        Args:
+            targets: (distro_name, gateway_port) 列表
+
+        Returns:
+            {(distro_name, gateway_port): 是否连通}
+        """
+        targets = list(dict.fromkeys(targets))
+        if not targets:
+            return {}
         if not WEBSOCKETS_AVAILABLE:
-            return False
-        
-        distro = self._wsl_manager.get_distro(distro_name)
-        if not distro or not distro.is_running:
-            return False
-        
-        ip = self._wsl_manager.get_distro_ip(distro_name)
-        if not ip:
-            return False
-        
-        gateway_url = f"ws://{ip}:{gateway_port}/ws"
-        
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            success = loop.run_until_complete(self._async_check_connectivity(gateway_url))
-            loop.close()
-            return success
-        except Exception:
-            return False
+            return {target: False for target in targets}
+
+        running = []
+        for distro_name in dict.fromkeys(distro for distro, _ in targets):
+            distro = self._wsl_manager.get_distro(distro_name)
+            if distro and distro.is_running:
+                running.append(distro_name)
+
+        # 查询 IP 需要执行 WSL 命令，不同 distro 并行查询
+        if len(running) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(running))) as pool:
+                ips = dict(zip(running, pool.map(self._get_distro_ip, running)))
+        else:
+            ips = {name: self._get_distro_ip(name) for name in running}
+
+        urls = {
+            (distro_name, port): f"ws://{ips[distro_name]}:{port}/ws" if ips.get(distro_name) else None
+            for distro_name, port in targets
+        }
+        probed = self._prober.probe_many([url for url in urls.values() if url])
+
+        results = {}
+        for (distro_name, port), url in urls.items():
+            ok = bool(url) and probed.get(url, False)
+            if url and not ok:
+                self._ip_cache.pop(distro_name, None)
+            results[(distro_name, port)] = ok
+        return results
 
     def check_gateway_connectivity_async(self, distro_name: str, gateway_port: int, callback: Callable[[bool], None]):
         """异步检查 Gateway 连通性
@@ -291,32 +298,10 @@ class ClawbotController:
             gateway_port: Gateway 端口
             callback: 结果回调函数，接收 bool 参数表示是否连通
         """
-        import threading
-        
-        def check():
-            if not WEBSOCKETS_AVAILABLE:
-                return False
-            
-            distro = self._wsl_manager.get_distro(distro_name)
-            if not distro or not distro.is_running:
-                return False
-            
-            ip = self._wsl_manager.get_distro_ip(distro_name)
-            if not ip:
-                return False
-            
-            gateway_url = f"ws://{ip}:{gateway_port}/ws"
-            
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                success = loop.run_until_complete(self._async_check_connectivity(gateway_url))
-                loop.close()
-                return success
-            except Exception:
-                return False
-        
-        thread = threading.Thread(target=lambda: callback(check()), daemon=True)
+        thread = threading.Thread(
+            target=lambda: callback(self.check_gateway_connectivity(distro_name, gateway_port)),
+            daemon=True
+        )
         thread.start()
 
     def get_logs(self, config_name: str, lines: int = 100) -> List[str]:
@@ -1,13 +1,12 @@
 # -*- coding: utf-8 -*-
 import subprocess
-import threading
-import time
-from typing import Optional, Callable
+from typing import Dict, Optional, Callable
 from enum import Enum
 
 from loguru import logger
 
 from .wsl_manager import WSLManager
+from .gateway_supervisor import GatewaySupervisor, wait_until_port_closed
 
 
 class GatewayStatus(Enum):
@@ -25,9 +24,10 @@ class ClawbotGatewayManager:
         self._wsl_manager = wsl_manager
         self._port = port
         self._status = GatewayStatus.STOPPED
-        self._process: Optional[subprocess.Popen] = None
+        self._supervisor: Optional[GatewaySupervisor] = None
         self._status_callbacks: list[Callable] = []
         self._distro_name: Optional[str] = None
+        self._launch_options = {"verbose": False, "no_guardian": True}
 
     @property
     def status(self) -> GatewayStatus:
@@ -70,6 +70,7 @@ class ClawbotGatewayManager:
             return True
 
         self._distro_name = distro_name
+        self._launch_options = {"verbose": verbose, "no_guardian": no_guardian}
         self._set_status(GatewayStatus.STARTING)
 
         distro = self._wsl_manager.get_distro(distro_name)
@@ -90,8 +91,8 @@ class ClawbotGatewayManager:
             f"clawbot gateway --port {self._port}" + (" --verbose" if verbose else "") + (" --no-guardian" if no_guardian else "")
         ]
 
-        try:
-            self._process = subprocess.Popen(
+        def launch() -> subprocess.Popen:
+            return subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
@@ -100,78 +101,43 @@ class ClawbotGatewayManager:
                 errors="replace"
             )
 
-            monitor_thread = threading.Thread(
-                target=self._monitor_gateway_process,
-                args=(distro_name,),
-                daemon=True
-            )
-            monitor_thread.start()
-
-            time.sleep(2)
+        # 同一 distro 复用 supervisor，重启次数等统计跨多次启动累计
+        if self._supervisor is None or self._supervisor.name != distro_name:
+            if self._supervisor is not None:
+                self._supervisor.stop()
+            self._supervisor = GatewaySupervisor(distro_name, self._on_supervisor_state)
 
-            if self._process.poll() is not None:
-                stdout, stderr = self._process.communicate()
-                logger.error(f"Gateway failed to start: {stderr}")
-                self._set_status(GatewayStatus.ERROR)
-                return False
-
-            self._set_status(GatewayStatus.RUNNING)
-            logger.info(f"Clawbot gateway started on port {self._port}")
-            return True
-
-        except Exception as e:
-            logger.error(f"Failed to start gateway: {e}")
-            self._set_status(GatewayStatus.ERROR)
+        if not self._supervisor.start(launch, f"ws://localhost:{self._port}/ws"):
             return False
+        logger.info(f"Clawbot gateway started on port {self._port}")
+        return True
 
-    def _monitor_gateway_process(self, distro_name: str):
-        if not self._process:
+    def _on_supervisor_state(self, state: str):
+        # stop_gateway 自己维护 STOPPING/STOPPED
+        status = GatewayStatus(state)
+        if self._status in (GatewayStatus.STOPPING, status):
             return
+        self._set_status(status)
 
-        def read_output(pipe, log_type):
-            try:
-                for line in iter(pipe.readline, ""):
-                    if line:
-                        cleaned = line.replace("\x00", "").strip()
-                        if cleaned:
-                            logger.debug(f"[gateway:{log_type}] {cleaned}")
-            except Exception:
-                pass
-
-        import threading as t
-        stdout_thread = t.Thread(
-            target=read_output,
-            args=(self._process.stdout, "stdout"),
-            daemon=True
-        )
-        stderr_thread = t.Thread(
-            target=read_output,
-            args=(self._process.stderr, "stderr"),
-            daemon=True
-        )
-        stdout_thread.start()
-        stderr_thread.start()
-
-        self._process.wait()
-
-        if self._status == GatewayStatus.RUNNING:
-            self._set_status(GatewayStatus.STOPPED)
+    def get_stats(self) -> Dict:
+        """运行时长、重启次数、启动到就绪耗时等"""
+        stats = self._supervisor.get_stats() if self._supervisor else {"state": self._status.value}
+        stats.update({"distro_name": self._distro_name, "port": self._port})
+        return stats
 
     def stop_gateway(self) -> bool:
-        if self._status != GatewayStatus.RUNNING:
+        if self._status not in (GatewayStatus.RUNNING, GatewayStatus.STARTING):
+            if self._supervisor:
+                # 可能正在等待崩溃后的重启
+                self._supervisor.stop()
             logger.warning("Gateway not running")
             return True
 
         self._set_status(GatewayStatus.STOPPING)
 
         try:
-            if self._process:
-                self._process.terminate()
-                try:
-                    self._process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self._process.kill()
-                    self._process.wait()
+            if self._supervisor:
+                self._supervisor.stop()
 
             if self._distro_name:
                 self._wsl_manager.execute_command(
@@ -194,8 +160,12 @@ class ClawbotGatewayManager:
             return False
 
         self.stop_gateway()
-        time.sleep(1)
-        return self.start_gateway(self._distro_name)
+        # 等旧进程释放端口即可，不再固定等待
+        if not wait_until_port_closed("localhost", self._port):
+            logger.warning(f"Port {self._port} still in use after stopping gateway")
+        if self._supervisor:
+            self._supervisor.note_restart()
+        return self.start_gateway(self._distro_name, **self._launch_options)
 
     def get_gateway_url(self, use_localhost: bool = True) -> Optional[str]:
         if self._status != GatewayStatus.RUNNING or not self._distro_name:
@@ -6,6 +6,7 @@ from datetime import datetime
 from pathlib import Path
 from loguru import logger
 
+from ..events import EventType, event_bus
 from ..models import ClawbotConfig
 from ..constants import VERSION
 
@@ -274,6 +275,7 @@ class ConfigManager:
 
             self._configs[config.name] = config
             logger.info(f"配置保存成功: {config.name}")
+            event_bus.publish(EventType.CONFIG_UPDATED, {"name": config.name}, source="ConfigManager")
             return True
         except Exception as e:
             logger.error(f"保存配置失败: {e}")
@@ -295,6 +297,7 @@ class ConfigManager:
                 self._default_config_name = remaining[0] if remaining else self.DEFAULT_CONFIG_NAME
                 self._save_main_config()
 
+            event_bus.publish(EventType.CONFIG_DELETED, {"name": config_name}, source="ConfigManager")
             return True
         except Exception:
             return False
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+from loguru import logger
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+DEFAULT_TTL = 3.0  # 探测结果缓存时间（秒）
+DEFAULT_TIMEOUT = 5.0  # WebSocket 握手超时
+TCP_TIMEOUT = 1.0  # TCP 预检超时
+
+
+class ConnectivityProber:
+    """
+    Gateway 连通性探测
+
+    所有探测在同一个后台事件循环上并发执行；结果按 URL 缓存 ttl 秒，
+    同一 URL 正在探测时复用同一个任务。tcp_precheck 开启时先做一次 TCP 连接，
+    端口不通直接判定失败，省掉握手超时。
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, timeout: float = DEFAULT_TIMEOUT,
+                 tcp_precheck: bool = True):
+        self._ttl = ttl
+        self._timeout = timeout
+        self._tcp_precheck = tcp_precheck
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, bool]] = {}  # url -> (时间, 结果)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._probes = 0
+        self._cache_hits = 0
+        self._tcp_rejects = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run_loop, args=(self._loop, ready),
+                    name="ConnectivityProber", daemon=True
+                )
+                self._thread.start()
+                ready.wait(5)
+            return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    # ========================================
+    # 探测
+    # ========================================
+
+    async def _tcp_open(self, host: str, port: int) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), TCP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    async def _probe_uncached(self, url: str) -> bool:
+        self._probes += 1
+        if self._tcp_precheck:
+            parsed = urlparse(url)
+            if parsed.hostname and not await self._tcp_open(parsed.hostname, parsed.port or 80):
+                self._tcp_rejects += 1
+                return False
+        try:
+            async with websockets.connect(url, open_timeout=self._timeout):
+                return True
+        except Exception:
+            return False
+
+    async def _probe(self, url: str) -> bool:
+        cached = self._cache.get(url)
+        if cached is not None and time.monotonic() - cached[0] < self._ttl:
+            self._cache_hits += 1
+            return cached[1]
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._probe_uncached(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._finish(url, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, url: str, task: asyncio.Future):
+        self._inflight.pop(url, None)
+        if not task.cancelled() and task.exception() is None:
+            self._cache[url] = (time.monotonic(), task.result())
+
+    async def _probe_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self._probe(url) for url in urls), return_exceptions=True)
+        return {url: result is True for url, result in zip(urls, results)}
+
+    def probe(self, url: str) -> bool:
+        """阻塞探测单个 URL（可从任意非循环线程调用）"""
+        return self.probe_many([url]).get(url, False)
+
+    def probe_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """并发探测多个 URL，总耗时约等于最慢的一个"""
+        urls = list(urls)
+        if not urls or not WEBSOCKETS_AVAILABLE:
+            return {url: False for url in urls}
+        future = asyncio.run_coroutine_threadsafe(self._probe_many(urls), self.loop)
+        try:
+            return future.result(self._timeout + TCP_TIMEOUT + 1)
+        except Exception as e:
+            logger.warning(f"Connectivity probe failed: {type(e).__name__}: {e}")
+            future.cancel()
+            return {url: False for url in urls}
+
+    def probe_async(self, url: str, callback: Callable[[bool], None]) -> Optional[Future]:
+        """非阻塞探测，callback 在探测循环线程中调用"""
+        if not WEBSOCKETS_AVAILABLE:
+            callback(False)
+            return None
+        future = asyncio.run_coroutine_threadsafe(self._probe(url), self.loop)
+
+        def done(f: Future):
+            try:
+                result = f.result()
+            except Exception:
+                result = False
+            try:
+                callback(result)
+            except Exception as e:
+                logger.error(f"Connectivity probe callback failed: {e}")
+
+        future.add_done_callback(done)
+        return future
+
+    def invalidate(self, url: Optional[str] = None):
+        """清除缓存，url 为 None 时全部清除"""
+        if url is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(url, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            "probes": self._probes,
+            "cache_hits": self._cache_hits,
+            "tcp_rejects": self._tcp_rejects,
+            "cached": len(self._cache),
+            "ttl": self._ttl,
+            "tcp_precheck": self._tcp_precheck,
+        }
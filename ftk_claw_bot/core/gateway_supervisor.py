@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+import random
+import socket
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+PROBE_TIMEOUT = 1.0  # 单次握手探测超时（秒）
+READY_TIMEOUT = 30.0  # 启动后等待就绪的最长时间
+PROBE_INITIAL_INTERVAL = 0.05  # 探测失败后的首次重试间隔，之后翻倍
+PROBE_MAX_INTERVAL = 0.5
+RESTART_BASE_DELAY = 1.0  # 崩溃后首次重启延迟，之后翻倍
+RESTART_MAX_DELAY = 60.0
+STABLE_UPTIME = 60.0  # 连续运行超过这个时间后再崩溃，重启延迟从头计算
+
+
+def probe_gateway(url: str, timeout: float = PROBE_TIMEOUT) -> bool:
+    """尝试一次 WebSocket 握手；服务端已有 HTTP 响应（即使拒绝升级）也视为就绪"""
+    from websockets.exceptions import InvalidHandshake, InvalidStatus
+    from websockets.sync.client import connect
+
+    try:
+        with connect(url, open_timeout=timeout, close_timeout=timeout):
+            return True
+    except InvalidStatus:
+        return True
+    except (OSError, TimeoutError, InvalidHandshake):
+        return False
+    except Exception as e:
+        logger.debug(f"Gateway probe {url} failed: {type(e).__name__}: {e}")
+        return False
+
+
+def wait_until_ready(url: str, is_alive: Callable[[], bool] = lambda: True,
+                     timeout: float = READY_TIMEOUT) -> Optional[float]:
+    """快速重试探测直到就绪，返回耗时（秒）；进程退出或超时返回 None"""
+    started = time.monotonic()
+    interval = PROBE_INITIAL_INTERVAL
+    while True:
+        if probe_gateway(url, min(PROBE_TIMEOUT, timeout)):
+            return time.monotonic() - started
+        if not is_alive():
+            return None
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, PROBE_MAX_INTERVAL)
+
+
+def wait_until_port_closed(host: str, port: int, timeout: float = 5.0) -> bool:
+    """等待端口不再接受连接（旧进程已退出），返回是否已关闭"""
+    deadline = time.monotonic() + timeout
+    interval = PROBE_INITIAL_INTERVAL
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=PROBE_TIMEOUT):
+                pass
+        except OSError:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 2, PROBE_MAX_INTERVAL)
+
+
+class GatewaySupervisor:
+    """
+    单个 gateway 进程的监督
+
+    start() 启动进程并通过 WebSocket 握手探测就绪（快速重试，不再固定等待）；
+    就绪过一次之后，进程意外退出会按指数退避（带抖动）自动重启，
+    稳定运行 STABLE_UPTIME 后退避重新计算。stop() 之后不再重启。
+
+    状态通过 on_state 回调通知，取值与 GatewayStatus 的 value 一致：
+    starting / running / stopped / error。
+    """
+
+    def __init__(self, name: str, on_state: Optional[Callable[[str], None]] = None,
+                 auto_restart: bool = True, ready_timeout: float = READY_TIMEOUT):
+        self.name = name
+        self._on_state = on_state
+        self._auto_restart = auto_restart
+        self._ready_timeout = ready_timeout
+        self._lock = threading.RLock()
+        self._launch: Optional[Callable[[], subprocess.Popen]] = None
+        self._url: Optional[str] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._state = "stopped"
+        self._stopping = False
+        self._supervising = False
+        self._restart_timer: Optional[threading.Timer] = None
+        self._failures = 0
+
+        self._spawned_at: Optional[float] = None
+        self._ready_at: Optional[float] = None
+        self._ready_latency: Optional[float] = None
+        self._restart_count = 0
+        self._crash_count = 0
+        self._last_exit_code: Optional[int] = None
+
+    def set_state_callback(self, on_state: Optional[Callable[[str], None]]):
+        self._on_state = on_state
+
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        return self._process
+
+    @property
+    def url(self) -> Optional[str]:
+        return self._url
+
+    def start(self, launch: Callable[[], subprocess.Popen], url: str) -> bool:
+        """启动进程并等待就绪，返回是否就绪"""
+        with self._lock:
+            self._cancel_restart()
+            self._launch = launch
+            self._url = url
+            self._stopping = False
+            self._supervising = False
+            self._failures = 0
+        return self._spawn_and_wait()
+
+    def restart(self) -> bool:
+        """手动重启：停止、等待端口释放后重新启动"""
+        if not self._launch or not self._url:
+            return False
+        self.stop()
+        self._wait_port_released()
+        self.note_restart()
+        return self.start(self._launch, self._url)
+
+    def note_restart(self):
+        """记一次手动重启（由调用方自行停止和启动时使用）"""
+        with self._lock:
+            self._restart_count += 1
+
+    def stop(self, timeout: float = 5):
+        """停止进程并取消待执行的重启"""
+        with self._lock:
+            self._stopping = True
+            self._supervising = False
+            self._cancel_restart()
+            process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        with self._lock:
+            self._ready_at = None
+            self._state = "stopped"
+
+    # ========================================
+    # 内部
+    # ========================================
+
+    def _set_state(self, state: str):
+        self._state = state
+        if self._on_state is not None:
+            try:
+                self._on_state(state)
+            except Exception as e:
+                logger.error(f"Gateway {self.name} state callback failed: {e}")
+
+    def _cancel_restart(self):
+        if self._restart_timer is not None:
+            self._restart_timer.cancel()
+            self._restart_timer = None
+
+    def _wait_port_released(self):
+        try:
+            from urllib.parse import urlparse
+            parsed = urlparse(self._url)
+            if parsed.hostname and parsed.port:
+                wait_until_port_closed(parsed.hostname, parsed.port)
+        except ValueError:
+            pass
+
+    def _spawn_and_wait(self) -> bool:
+        self._set_state("starting")
+        try:
+            process = self._launch()
+        except Exception as e:
+            logger.error(f"Failed to start gateway {self.name}: {e}")
+            self._set_state("error")
+            return False
+
+        with self._lock:
+            self._process = process
+            self._spawned_at = time.monotonic()
+            self._ready_at = None
+
+        for pipe, log_type in ((process.stdout, "stdout"), (process.stderr, "stderr")):
+            if pipe is not None:
+                threading.Thread(target=self._read_output, args=(pipe, log_type),
+                                 name=f"gateway-{self.name}-{log_type}", daemon=True).start()
+        threading.Thread(target=self._watch_process, args=(process,),
+                         name=f"gateway-{self.name}-watch", daemon=True).start()
+
+        latency = wait_until_ready(
+            self._url, lambda: process.poll() is None and not self._stopping, self._ready_timeout
+        )
+        with self._lock:
+            if process is not self._process or self._stopping:
+                return False
+            if latency is not None:
+                self._ready_at = time.monotonic()
+                self._ready_latency = latency
+                self._supervising = self._auto_restart
+        if latency is not None:
+            logger.info(f"Gateway {self.name} ready at {self._url} in {latency:.2f}s")
+            self._set_state("running")
+            return True
+
+        if process.poll() is None:
+            # 进程还在但端口一直不可用：结束它，交给退出处理（监督中则会重启）
+            logger.error(f"Gateway {self.name} not ready within {self._ready_timeout:.0f}s")
+            process.kill()
+        else:
+            logger.error(f"Gateway {self.name} exited before ready (code {process.returncode})")
+        with self._lock:
+            supervising = self._supervising
+        if not supervising:
+            self._set_state("error")
+        return False
+
+    def _read_output(self, pipe, log_type: str):
+        try:
+            for line in iter(pipe.readline, ""):
+                if line:
+                    cleaned = line.replace("\x00", "").strip()
+                    if cleaned:
+                        logger.debug(f"[gateway:{self.name}:{log_type}] {cleaned}")
+        except Exception:
+            pass
+
+    def _watch_process(self, process: subprocess.Popen):
+        code = process.wait()
+        with self._lock:
+            if process is not self._process:
+                return
+            uptime = time.monotonic() - self._ready_at if self._ready_at else 0.0
+            was_ready = self._ready_at is not None
+            self._ready_at = None
+            self._last_exit_code = code
+            if self._stopping:
+                return
+            self._crash_count += 1
+            delay = None
+            if self._supervising:
+                if uptime >= STABLE_UPTIME:
+                    self._failures = 0
+                self._failures += 1
+                delay = min(RESTART_BASE_DELAY * (2 ** (self._failures - 1)), RESTART_MAX_DELAY)
+                delay *= 1 - random.random() * 0.25
+                self._restart_timer = threading.Timer(delay, self._restart_after_crash)
+                self._restart_timer.daemon = True
+                self._restart_timer.start()
+
+        if delay is None:
+            if was_ready:
+                logger.warning(f"Gateway {self.name} exited with code {code} after {uptime:.0f}s")
+                self._set_state("stopped")
+            return
+        logger.warning(f"Gateway {self.name} exited with code {code} after {uptime:.0f}s, "
+                       f"restarting in {delay:.1f}s (attempt {self._failures})")
+        self._set_state("stopped")
+
+    def _restart_after_crash(self):
+        with self._lock:
+            if self._stopping or not self._supervising:
+                return
+            self._restart_timer = None
+            self._restart_count += 1
+        self._spawn_and_wait()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "state": self._state,
+                "pid": self._process.pid if self._process is not None and self._process.poll() is None else None,
+                "uptime_seconds": now - self._ready_at if self._ready_at else 0.0,
+                "ready_latency_seconds": self._ready_latency,
+                "restart_count": self._restart_count,
+                "crash_count": self._crash_count,
+                "last_exit_code": self._last_exit_code,
+                "restart_pending": self._restart_timer is not None,
+            }
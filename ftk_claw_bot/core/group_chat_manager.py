@@ -1,90 +1,222 @@
 # -*- coding: utf-8 -*-
-import re
 import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Set, Optional
+from typing import Callable, Deque, Dict, List, Set, Optional
 
-from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtCore import QObject, pyqtSignal
 from loguru import logger
 
+from .group_chat_scheduler import GroupChatScheduler, DEFAULT_MAX_TRIGGERS_PER_SECOND
+from .mention_router import MentionRouter
+
+
+DEFAULT_TOKEN_BUDGET = 4000  # 每次转发给 bot 的上下文 token 上限
+MESSAGE_TOKEN_OVERHEAD = 4  # 每条消息的角色/名字等结构开销
+MAX_EVICTED_FOR_SUMMARY = 50  # 等待摘要的被挤出消息最多保留条数
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：非 ASCII 字符（中日韩等）按 1 字 1 token，
+    ASCII 按 4 字符 1 token。只用于预算控制，不追求与具体 tokenizer 一致。
+    """
+    if not text:
+        return 0
+    extra_bytes = len(text.encode("utf-8")) - len(text)
+    non_ascii = (extra_bytes + 1) // 2  # 常见的中日韩字符 UTF-8 为 3 字节
+    ascii_chars = max(0, len(text) - non_ascii)
+    return non_ascii + (ascii_chars + 3) // 4
+
+
+class ContextMessage(dict):
+    """群聊消息条目，token 估算结果缓存在属性上，不会进入发给 bot 的 JSON"""
+    __slots__ = ("_tokens",)
+
+    @property
+    def tokens(self) -> int:
+        try:
+            return self._tokens
+        except AttributeError:
+            self._tokens = estimate_tokens(self.get("content", "")) + MESSAGE_TOKEN_OVERHEAD
+            return self._tokens
+
+
+# 摘要钩子：summarizer(bot_name, evicted_messages) -> 摘要文本，返回空表示不生成摘要
+Summarizer = Callable[[str, List[Dict]], Optional[str]]
+
 
 @dataclass
 class BotChatState:
     """单个 Bot 的群聊状态"""
     bot_name: str
-    timer: QTimer = field(default=None)
-    message_buffer: List[Dict] = field(default_factory=list)
+    message_buffer: Deque[ContextMessage] = field(default_factory=deque)
     last_speak_time: Optional[float] = None
-    
-    def __post_init__(self):
-        if self.timer is None:
-            self.timer = QTimer()
-            self.timer.setSingleShot(True)
+    token_budget: Optional[int] = None  # None 表示使用全局预算
+    buffered_tokens: int = 0
+    evicted: Deque[ContextMessage] = field(default_factory=lambda: deque(maxlen=MAX_EVICTED_FOR_SUMMARY))
+    evicted_count: int = 0
 
 
 class GroupChatManager(QObject):
-    """群聊管理器 - 管理多个 Bot 的独立计时器和消息缓冲"""
+    """群聊管理器 - 管理多个 Bot 的消息缓冲，触发时机由 GroupChatScheduler 统一调度"""
     
     # 信号
     message_to_bot = pyqtSignal(str, str, list)  # bot_name, trigger_reason, messages
     bot_reply_received = pyqtSignal(str, str)     # bot_name, content
+    _bot_due = pyqtSignal(str, str)               # 调度线程 -> 主线程: bot_name, trigger_reason
     
     MAX_BUFFER_SIZE = 50
+    MAX_HISTORY_SIZE = 200  # 内存中只保留最近的群聊消息，完整记录在聊天记录库中
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self._bot_states: Dict[str, BotChatState] = {}
-        self._message_history: List[Dict] = []
+        self._message_history: deque = deque(maxlen=self.MAX_HISTORY_SIZE)
         self._interval_seconds: int = 5
         self._connected_bots: Set[str] = set()
+        self._mention_router = MentionRouter()
+        self._token_budget: int = DEFAULT_TOKEN_BUDGET
+        self._summarizer: Optional[Summarizer] = None
+        self._bot_due.connect(self._on_bot_due)
+        self._scheduler = GroupChatScheduler(self._bot_due.emit, DEFAULT_MAX_TRIGGERS_PER_SECOND)
+        self._scheduler.start()
     
     def set_interval(self, seconds: int):
         """设置转发间隔（秒）"""
         self._interval_seconds = max(1, min(60, seconds))
     
+    def set_rate_limit(self, max_triggers_per_second: float):
+        """设置所有 Bot 合计每秒最多触发次数，<= 0 表示不限制"""
+        self._scheduler.set_rate_limit(max_triggers_per_second)
+    
+    def set_token_budget(self, tokens: int, bot_name: Optional[str] = None):
+        """设置上下文 token 预算；指定 bot_name 时只对该 Bot 生效"""
+        tokens = max(MESSAGE_TOKEN_OVERHEAD * 2, int(tokens))
+        if bot_name is None:
+            self._token_budget = tokens
+            states = list(self._bot_states.values())
+        else:
+            state = self._bot_states.get(bot_name)
+            if state is None:
+                return
+            state.token_budget = tokens
+            states = [state]
+        for state in states:
+            self._enforce_budget(state)
+    
+    def set_summarizer(self, summarizer: Optional[Summarizer]):
+        """设置摘要钩子，被预算挤出的消息在下次转发时交给它生成一条摘要"""
+        self._summarizer = summarizer
+    
     def register_bot(self, bot_name: str):
         """注册一个 Bot"""
         if bot_name not in self._bot_states:
             state = BotChatState(bot_name=bot_name)
-            state.timer.timeout.connect(lambda: self._on_bot_timer(bot_name))
             self._bot_states[bot_name] = state
             self._connected_bots.add(bot_name)
+            self._mention_router.set_bots(self._connected_bots)
             logger.info(f"[GroupChat] 注册 Bot: {bot_name}")
     
     def unregister_bot(self, bot_name: str):
         """注销一个 Bot"""
         if bot_name in self._bot_states:
-            state = self._bot_states.pop(bot_name)
-            state.timer.stop()
+            self._bot_states.pop(bot_name)
+            self._scheduler.cancel(bot_name)
             logger.info(f"[GroupChat] 注销 Bot: {bot_name}")
         self._connected_bots.discard(bot_name)
+        self._mention_router.set_bots(self._connected_bots)
+    
+    def set_bot_aliases(self, bot_name: str, aliases: List[str]):
+        """设置 Bot 的 @ 别名"""
+        self._mention_router.set_aliases(bot_name, aliases)
+    
+    def set_mention_group(self, group_name: str, members: Optional[List[str]]):
+        """设置 @ 分组（如 @team-x），members 为 None 表示删除；@all 为内置分组"""
+        self._mention_router.set_group(group_name, members)
     
     def get_connected_bots(self) -> Set[str]:
         """获取已连接的 Bot 列表"""
         return self._connected_bots.copy()
     
-    def _on_bot_timer(self, bot_name: str):
-        """Bot 计时器到期处理"""
+    # ========================================
+    # 上下文预算
+    # ========================================
+    
+    def _buffer_message(self, state: BotChatState, entry: ContextMessage):
+        state.message_buffer.append(entry)
+        state.buffered_tokens += entry.tokens
+        self._enforce_budget(state)
+    
+    def _enforce_budget(self, state: BotChatState):
+        """超出条数或 token 预算时从最旧的消息开始挤出，至少保留最新一条"""
+        budget = state.token_budget or self._token_budget
+        buffer = state.message_buffer
+        while len(buffer) > 1 and (len(buffer) > self.MAX_BUFFER_SIZE or state.buffered_tokens > budget):
+            evicted = buffer.popleft()
+            state.buffered_tokens -= evicted.tokens
+            state.evicted_count += 1
+            if self._summarizer is not None:
+                state.evicted.append(evicted)
+    
+    def _take_context(self, state: BotChatState) -> List[Dict]:
+        """取出缓冲区作为本次转发的上下文；有被挤出的消息且设置了摘要钩子时，在最前面加一条摘要"""
+        messages: List[Dict] = list(state.message_buffer)
+        state.message_buffer.clear()
+        state.buffered_tokens = 0
+        if not state.evicted:
+            return messages
+        
+        evicted = list(state.evicted)
+        state.evicted.clear()
+        if self._summarizer is None:
+            return messages
+        try:
+            summary = self._summarizer(state.bot_name, evicted)
+        except Exception as e:
+            logger.error(f"[GroupChat] 生成摘要失败: {type(e).__name__}: {e}")
+            summary = None
+        if summary:
+            messages.insert(0, ContextMessage(
+                role="system", content=summary, name="summary", timestamp=evicted[-1]["timestamp"]
+            ))
+        return messages
+    
+    def _dispatch(self, state: BotChatState, trigger_reason: str):
+        messages = self._take_context(state)
+        logger.info(f"[GroupChat] 发送给 {state.bot_name}: {len(messages)} 条消息, "
+                    f"约 {sum(m.tokens for m in messages)} tokens, "
+                    f"原因: {trigger_reason}")
+        self.message_to_bot.emit(state.bot_name, trigger_reason, messages)
+    
+    def get_context_stats(self) -> Dict[str, Dict]:
+        """各 Bot 缓冲区的消息数、token 数与被挤出的消息数"""
+        return {
+            name: {
+                "buffered_messages": len(state.message_buffer),
+                "buffered_tokens": state.buffered_tokens,
+                "token_budget": state.token_budget or self._token_budget,
+                "evicted": state.evicted_count,
+            }
+            for name, state in self._bot_states.items()
+        }
+    
+    def _on_bot_due(self, bot_name: str, trigger_reason: str):
+        """调度器触发（已切回主线程）"""
         if bot_name not in self._bot_states:
             return
         
         state = self._bot_states[bot_name]
         
         if not state.message_buffer:
-            logger.debug(f"[GroupChat] {bot_name} 计时器到期，但缓冲区为空")
+            logger.debug(f"[GroupChat] {bot_name} 触发 ({trigger_reason})，但缓冲区为空")
             return
         
-        messages = state.message_buffer.copy()
-        state.message_buffer.clear()
-        
-        logger.info(f"[GroupChat] {bot_name} 计时器到期，发送 {len(messages)} 条消息")
-        self.message_to_bot.emit(bot_name, "timer_expired", messages)
+        self._dispatch(state, trigger_reason)
     
     def parse_mentions(self, content: str) -> Set[str]:
-        """解析消息中的 @ 提及"""
-        pattern = r'@(\w+)'
-        matches = re.findall(pattern, content)
-        return {m for m in matches if m in self._connected_bots}
+        """解析消息中的 @ 提及（别名与分组已展开为 Bot 名）"""
+        return self._mention_router.route(content)
     
     def handle_user_message(self, content: str) -> Dict[str, str]:
         """
@@ -93,12 +225,12 @@ class GroupChatManager(QObject):
         """
         mentions = self.parse_mentions(content)
         
-        message_entry = {
-            "role": "user",
-            "content": content,
-            "name": "user",
-            "timestamp": time.time()
-        }
+        message_entry = ContextMessage(
+            role="user",
+            content=content,
+            name="user",
+            timestamp=time.time()
+        )
         self._message_history.append(message_entry)
         
         result = {}
@@ -108,19 +240,16 @@ class GroupChatManager(QObject):
             for bot_name in mentions:
                 if bot_name in self._bot_states:
                     state = self._bot_states[bot_name]
-                    state.message_buffer.append(message_entry)
-                    state.timer.stop()
+                    self._buffer_message(state, message_entry)
                     result[bot_name] = "mentioned"
                     logger.info(f"[GroupChat] 用户消息 @ {bot_name}，立即触发")
-                    # 立即发送
-                    messages = state.message_buffer.copy()
-                    state.message_buffer.clear()
-                    self.message_to_bot.emit(bot_name, "mentioned", messages)
+                    # 优先于计时触发
+                    self._scheduler.trigger_now(bot_name, "mentioned")
         else:
             # 无 @ 提及，发给所有 Bot 开始计时
             for bot_name, state in self._bot_states.items():
-                state.message_buffer.append(message_entry)
-                state.timer.start(self._interval_seconds * 1000)
+                self._buffer_message(state, message_entry)
+                self._scheduler.schedule(bot_name, self._interval_seconds)
                 result[bot_name] = "timer_started"
             logger.info(f"[GroupChat] 用户消息广播给所有 Bot，开始计时")
         
@@ -134,14 +263,14 @@ class GroupChatManager(QObject):
         
         state = self._bot_states[bot_name]
         state.last_speak_time = time.time()
-        state.timer.stop()
+        self._scheduler.cancel(bot_name)
         
-        message_entry = {
-            "role": "assistant",
-            "content": content,
-            "name": bot_name,
-            "timestamp": time.time()
-        }
+        message_entry = ContextMessage(
+            role="assistant",
+            content=content,
+            name=bot_name,
+            timestamp=time.time()
+        )
         self._message_history.append(message_entry)
         
         # 解析 Bot 消息中的 @ 提及
@@ -152,22 +281,16 @@ class GroupChatManager(QObject):
             if other_name == bot_name:
                 continue
             
-            other_state.message_buffer.append(message_entry)
-            
-            # 限制缓冲区大小
-            if len(other_state.message_buffer) > self.MAX_BUFFER_SIZE:
-                other_state.message_buffer = other_state.message_buffer[-self.MAX_BUFFER_SIZE:]
+            # 按条数与 token 预算限制缓冲区
+            self._buffer_message(other_state, message_entry)
             
             # 如果被 @ 则立即触发
             if other_name in mentions:
-                other_state.timer.stop()
-                messages = other_state.message_buffer.copy()
-                other_state.message_buffer.clear()
                 logger.info(f"[GroupChat] {bot_name} @ {other_name}，立即触发")
-                self.message_to_bot.emit(other_name, "mentioned", messages)
+                self._scheduler.trigger_now(other_name, "mentioned")
             else:
-                # 否则开始/重置计时器
-                other_state.timer.start(self._interval_seconds * 1000)
+                # 否则开始/重新计时（防抖）
+                self._scheduler.schedule(other_name, self._interval_seconds)
         
         self.bot_reply_received.emit(bot_name, content)
     
@@ -177,18 +300,27 @@ class GroupChatManager(QObject):
             return []
         
         state = self._bot_states[bot_name]
-        return state.message_buffer.copy()
+        return list(state.message_buffer)
     
     def clear_all(self):
         """清空所有状态"""
+        self._scheduler.cancel_all()
         for state in self._bot_states.values():
-            state.timer.stop()
             state.message_buffer.clear()
+            state.buffered_tokens = 0
+            state.evicted.clear()
         self._message_history.clear()
         logger.info("[GroupChat] 清空所有状态")
     
     def stop_all_timers(self):
-        """停止所有计时器"""
-        for state in self._bot_states.values():
-            state.timer.stop()
+        """取消所有待触发的调度"""
+        self._scheduler.cancel_all()
         logger.info("[GroupChat] 停止所有计时器")
+    
+    def get_scheduler_stats(self) -> Dict:
+        """触发次数、防抖/限流次数与排队延迟"""
+        return self._scheduler.get_stats()
+    
+    def shutdown(self):
+        """停止调度线程"""
+        self._scheduler.stop()
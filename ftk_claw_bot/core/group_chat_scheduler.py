@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+PRIORITY_MENTION = 0
+PRIORITY_TIMER = 1
+
+DEFAULT_MAX_TRIGGERS_PER_SECOND = 2.0
+DELAY_WINDOW = 256  # 统计排队延迟时保留的最近样本数
+
+
+class _Entry:
+    __slots__ = ("due", "priority", "seq", "bot", "reason", "cancelled")
+
+    def __init__(self, due: float, priority: int, seq: int, bot: str, reason: str):
+        self.due = due
+        self.priority = priority
+        self.seq = seq
+        self.bot = bot
+        self.reason = reason
+        self.cancelled = False
+
+
+class GroupChatScheduler:
+    """
+    群聊触发调度器
+
+    所有 bot 共用一个优先队列（按到期时间），每个 bot 同时只有一个有效条目：
+    再次 schedule 会作废旧条目并按新的到期时间重新排队（防抖）。
+    到期的条目进入就绪队列，被 @ 的 bot 优先；全局令牌桶限制每秒触发次数。
+
+    不依赖 Qt：on_trigger(bot, reason) 在调度线程中调用，调用方自行切回需要的线程。
+    测试时可以不启动线程，传入 clock 并直接调用 run_pending(now)。
+    """
+
+    def __init__(self, on_trigger: Callable[[str, str], None],
+                 max_triggers_per_second: float = DEFAULT_MAX_TRIGGERS_PER_SECOND,
+                 clock: Callable[[], float] = time.monotonic):
+        self._on_trigger = on_trigger
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._waiting: List[tuple] = []  # (due, seq, entry)，未到期
+        self._ready: List[tuple] = []  # (priority, due, seq, entry)，已到期等待令牌
+        self._entries: Dict[str, _Entry] = {}  # bot -> 当前有效条目
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._wakeup = False
+
+        self._rate = 0.0
+        self._burst = 1.0
+        self._tokens = 1.0
+        self._refilled_at = clock()
+        self.set_rate_limit(max_triggers_per_second)
+
+        self._triggers: Dict[str, int] = {}
+        self._debounced = 0
+        self._rate_limited = 0
+        self._delays: Deque[float] = deque(maxlen=DELAY_WINDOW)
+
+    # ========================================
+    # 调度
+    # ========================================
+
+    def set_rate_limit(self, max_triggers_per_second: float):
+        """设置全局触发速率上限，<= 0 表示不限制"""
+        with self._cond:
+            self._rate = max(0.0, float(max_triggers_per_second))
+            self._burst = max(1.0, self._rate)
+            self._tokens = min(self._tokens, self._burst)
+            self._wakeup = True
+            self._cond.notify()
+
+    def schedule(self, bot: str, delay: float, reason: str = "timer_expired"):
+        """delay 秒后触发 bot；已有待触发条目时重新计时。不会推迟已排队的 @ 触发"""
+        with self._cond:
+            current = self._entries.get(bot)
+            if current is not None:
+                if current.priority == PRIORITY_MENTION:
+                    return
+                current.cancelled = True
+                self._debounced += 1
+            self._push(bot, self._clock() + max(0.0, delay), PRIORITY_TIMER, reason)
+
+    def trigger_now(self, bot: str, reason: str = "mentioned"):
+        """立即触发 bot（优先于计时触发），取代它的待触发条目"""
+        with self._cond:
+            current = self._entries.get(bot)
+            if current is not None:
+                if current.priority == PRIORITY_MENTION:
+                    return
+                current.cancelled = True
+            self._push(bot, self._clock(), PRIORITY_MENTION, reason)
+
+    def _push(self, bot: str, due: float, priority: int, reason: str):
+        entry = _Entry(due, priority, next(self._seq), bot, reason)
+        self._entries[bot] = entry
+        heapq.heappush(self._waiting, (entry.due, entry.seq, entry))
+        self._wakeup = True
+        self._cond.notify()
+
+    def cancel(self, bot: str):
+        with self._cond:
+            entry = self._entries.pop(bot, None)
+            if entry is not None:
+                entry.cancelled = True
+
+    def cancel_all(self):
+        with self._cond:
+            for entry in self._entries.values():
+                entry.cancelled = True
+            self._entries.clear()
+            self._waiting.clear()
+            self._ready.clear()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def run_pending(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        触发所有已到期且有令牌的条目，返回距下一次需要处理的秒数（没有待处理条目时为 None）
+        """
+        fired = []
+        with self._cond:
+            now = self._clock() if now is None else now
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, entry = heapq.heappop(self._waiting)
+                if not entry.cancelled:
+                    heapq.heappush(self._ready, (entry.priority, entry.due, entry.seq, entry))
+
+            self._refill(now)
+            while self._ready:
+                entry = self._ready[0][3]
+                if entry.cancelled:
+                    heapq.heappop(self._ready)
+                    continue
+                if self._rate and self._tokens < 1:
+                    self._rate_limited += 1
+                    break
+                heapq.heappop(self._ready)
+                if self._rate:
+                    self._tokens -= 1
+                del self._entries[entry.bot]
+                self._triggers[entry.reason] = self._triggers.get(entry.reason, 0) + 1
+                self._delays.append(now - entry.due)
+                fired.append(entry)
+
+            wait = (1 - self._tokens) / self._rate if self._ready else None
+            while self._waiting and self._waiting[0][2].cancelled:
+                heapq.heappop(self._waiting)
+            if self._waiting:
+                until_due = max(0.0, self._waiting[0][0] - now)
+                wait = until_due if wait is None else min(wait, until_due)
+
+        for entry in fired:
+            try:
+                self._on_trigger(entry.bot, entry.reason)
+            except Exception as e:
+                logger.error(f"[GroupChatScheduler] 触发 {entry.bot} 异常: {type(e).__name__}: {e}")
+        return wait
+
+    def _refill(self, now: float):
+        if self._rate:
+            self._tokens = min(self._burst, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    # ========================================
+    # 调度线程
+    # ========================================
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="GroupChatScheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            wait = self.run_pending()
+            with self._cond:
+                self._cond.wait_for(lambda: self._wakeup or not self._running, wait)
+                self._wakeup = False
+                if not self._running:
+                    return
+
+    def stop(self, timeout: float = 2):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    # ========================================
+    # 状态
+    # ========================================
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            delays = sorted(self._delays)
+            return {
+                "pending": len(self._entries),
+                "triggers": dict(self._triggers),
+                "debounced": self._debounced,
+                "rate_limited": self._rate_limited,
+                "max_triggers_per_second": self._rate,
+                "queue_delay_avg_ms": sum(delays) / len(delays) * 1000 if delays else 0.0,
+                "queue_delay_p95_ms": delays[int(len(delays) * 0.95)] * 1000 if delays else 0.0,
+                "queue_delay_max_ms": delays[-1] * 1000 if delays else 0.0,
+            }
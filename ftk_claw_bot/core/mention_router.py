@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+ALL_GROUP = "all"  # @all 提及所有 Bot
+
+_TARGETS = ""  # trie 节点中保存匹配目标的键（不会与单个字符冲突）
+
+
+def _is_name_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def _is_boundary(text: str, end: int) -> bool:
+    """名字在 end 处结束是否合法：后面不是名字字符；'-' '.' 后面跟名字字符时视为名字的一部分"""
+    if end >= len(text):
+        return True
+    c = text[end]
+    if _is_name_char(c):
+        return False
+    if c in "-.":
+        return end + 1 >= len(text) or not _is_name_char(text[end + 1])
+    return True
+
+
+class MentionRouter:
+    """
+    @ 提及路由
+
+    名册（Bot 名、别名、分组）变化后标记失效，下次路由时重建前缀树。
+    路由只在 '@' 处沿前缀树向后匹配最长的名字，耗时与消息长度有关，与名册大小无关。
+    Bot 名可以包含 '-' 和 '.'；同名时 Bot 优先于别名，别名优先于分组。
+    """
+
+    def __init__(self):
+        self._bots: Set[str] = set()
+        self._aliases: Dict[str, Set[str]] = {}  # bot -> 别名
+        self._groups: Dict[str, Set[str]] = {}  # 分组名 -> 成员（Bot 名或别名）
+        self._trie: Optional[dict] = None
+
+    def set_bots(self, bots: Iterable[str]):
+        self._bots = set(bots)
+        self._trie = None
+
+    def set_aliases(self, bot: str, aliases: Iterable[str]):
+        """设置 Bot 的别名，传入空列表表示清除"""
+        aliases = {a.lstrip("@") for a in aliases if a}
+        if aliases:
+            self._aliases[bot] = aliases
+        else:
+            self._aliases.pop(bot, None)
+        self._trie = None
+
+    def set_group(self, name: str, members: Optional[Iterable[str]]):
+        """设置分组（如 team-x），members 为 None 表示删除；@all 为内置分组"""
+        name = name.lstrip("@")
+        if members is None:
+            self._groups.pop(name, None)
+        else:
+            self._groups[name] = set(members)
+        self._trie = None
+
+    def _build(self) -> dict:
+        alias_targets: Dict[str, str] = {}
+        for bot, aliases in self._aliases.items():
+            if bot in self._bots:
+                for alias in aliases:
+                    alias_targets[alias] = bot
+
+        entries: Dict[str, FrozenSet[str]] = {ALL_GROUP: frozenset(self._bots)}
+        for name, members in self._groups.items():
+            resolved = {alias_targets.get(m, m) for m in members}
+            entries[name] = frozenset(resolved & self._bots)
+        for alias, bot in alias_targets.items():
+            entries[alias] = frozenset((bot,))
+        for bot in self._bots:
+            entries[bot] = frozenset((bot,))
+
+        trie: dict = {}
+        for name, targets in entries.items():
+            if not name:
+                continue
+            node = trie
+            for c in name:
+                node = node.setdefault(c, {})
+            node[_TARGETS] = targets
+        self._trie = trie
+        return trie
+
+    def route(self, text: str) -> Set[str]:
+        """返回消息中提及的 Bot 名（分组与别名已展开）"""
+        result: Set[str] = set()
+        if not text:
+            return result
+        trie = self._trie if self._trie is not None else self._build()
+        n = len(text)
+        i = text.find("@")
+        while i >= 0:
+            # 邮箱等 xxx@yyy 不算提及
+            if i == 0 or not _is_name_char(text[i - 1]):
+                node = trie
+                j = i + 1
+                matched = None
+                while j < n:
+                    node = node.get(text[j])
+                    if node is None:
+                        break
+                    j += 1
+                    targets = node.get(_TARGETS)
+                    if targets is not None and _is_boundary(text, j):
+                        matched = targets
+                if matched:
+                    result |= matched
+            i = text.find("@", i + 1)
+        return result
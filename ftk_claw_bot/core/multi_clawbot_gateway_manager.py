@@ -1,13 +1,14 @@
 import subprocess
 import threading
-import time
-from typing import Optional, Callable, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, Iterable
 from enum import Enum
 
 from loguru import logger
 
 from .wsl_manager import WSLManager
 from .port_manager import PortManager
+from .gateway_supervisor import GatewaySupervisor
 
 
 class GatewayStatus(Enum):
@@ -23,9 +24,13 @@ class GatewayInstance:
         self.distro_name = distro_name
         self.port = port
         self.status = GatewayStatus.STOPPED
-        self.process: Optional[subprocess.Popen] = None
+        self.supervisor: Optional[GatewaySupervisor] = None
         self.status_callbacks: list[Callable] = []
 
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        return self.supervisor.process if self.supervisor else None
+
     def register_status_callback(self, callback: Callable):
         if callback not in self.status_callbacks:
             self.status_callbacks.append(callback)
@@ -49,9 +54,14 @@ class GatewayInstance:
 class MultiClawbotGatewayManager:
     def __init__(self, wsl_manager: WSLManager, port_manager: Optional[PortManager] = None):
         self._wsl_manager = wsl_manager
-        self._port_manager = port_manager or PortManager()
+        if port_manager is None:
+            from ..utils.user_data_dir import user_data
+            port_manager = PortManager(state_file=user_data.gateway_ports_file)
+        self._port_manager = port_manager
         self._gateways: Dict[str, GatewayInstance] = {}
+        self._supervisors: Dict[str, GatewaySupervisor] = {}
         self._global_status_callbacks: list[Callable] = []
+        self._lock = threading.Lock()
 
     @property
     def port_manager(self) -> PortManager:
@@ -85,26 +95,29 @@ class MultiClawbotGatewayManager:
         verbose: bool = False,
         no_guardian: bool = True
     ) -> bool:
-        if distro_name in self._gateways:
-            gateway = self._gateways[distro_name]
-            if gateway.status == GatewayStatus.RUNNING:
-                logger.warning(f"Gateway for {distro_name} already running on port {gateway.port}")
-                return True
-
-        if port is None:
-            port = self._port_manager.assign_port(distro_name)
-            if port is None:
-                logger.error(f"Failed to assign port for {distro_name}")
-                return False
-        else:
-            if not self._port_manager.reserve_port(distro_name, port):
-                logger.error(f"Failed to reserve port {port} for {distro_name}")
-                return False
+        with self._lock:
+            if distro_name in self._gateways:
+                gateway = self._gateways[distro_name]
+                if gateway.status in (GatewayStatus.RUNNING, GatewayStatus.STARTING):
+                    logger.warning(f"Gateway for {distro_name} already {gateway.status.value} on port {gateway.port}")
+                    return gateway.status == GatewayStatus.RUNNING
+                if gateway.supervisor:
+                    gateway.supervisor.stop()
 
-        gateway = GatewayInstance(distro_name, port)
-        self._gateways[distro_name] = gateway
+            if port is None:
+                port = self._port_manager.assign_port(distro_name)
+                if port is None:
+                    logger.error(f"Failed to assign port for {distro_name}")
+                    return False
+            else:
+                if not self._port_manager.reserve_port(distro_name, port):
+                    logger.error(f"Failed to reserve port {port} for {distro_name}")
+                    return False
+
+            gateway = GatewayInstance(distro_name, port)
+            gateway.set_status(GatewayStatus.STARTING)
+            self._gateways[distro_name] = gateway
 
-        gateway.set_status(GatewayStatus.STARTING)
         self._notify_global_status(distro_name, GatewayStatus.STARTING)
 
         distro = self._wsl_manager.get_distro(distro_name)
@@ -127,8 +140,8 @@ class MultiClawbotGatewayManager:
             f"clawbot gateway --port {port}" + (" --verbose" if verbose else "") + (" --no-guardian" if no_guardian else "")
         ]
 
-        try:
-            gateway.process = subprocess.Popen(
+        def launch() -> subprocess.Popen:
+            return subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
@@ -137,66 +150,67 @@ class MultiClawbotGatewayManager:
                 errors="replace"
             )
 
-            monitor_thread = threading.Thread(
-                target=self._monitor_gateway_process,
-                args=(distro_name,),
-                daemon=True
-            )
-            monitor_thread.start()
-
-            time.sleep(2)
-
-            if gateway.process.poll() is not None:
-                stdout, stderr = gateway.process.communicate()
-                logger.error(f"Gateway failed to start: {stderr}")
-                gateway.set_status(GatewayStatus.ERROR)
-                self._notify_global_status(distro_name, GatewayStatus.ERROR)
-                return False
-
-            gateway.set_status(GatewayStatus.RUNNING)
-            self._notify_global_status(distro_name, GatewayStatus.RUNNING)
-            logger.info(f"Clawbot gateway started for {distro_name} on port {port}")
-            return True
+        # 同一 distro 复用 supervisor，重启次数等统计跨多次启动累计
+        supervisor = self._supervisors.get(distro_name)
+        if supervisor is None:
+            supervisor = GatewaySupervisor(distro_name)
+            self._supervisors[distro_name] = supervisor
+        supervisor.set_state_callback(lambda state: self._on_supervisor_state(gateway, state))
+        gateway.supervisor = supervisor
 
-        except Exception as e:
-            logger.error(f"Failed to start gateway: {e}")
-            gateway.set_status(GatewayStatus.ERROR)
-            self._notify_global_status(distro_name, GatewayStatus.ERROR)
+        if not supervisor.start(launch, f"ws://localhost:{port}/ws"):
             return False
+        logger.info(f"Clawbot gateway started for {distro_name} on port {port}")
+        return True
 
-    def _monitor_gateway_process(self, distro_name: str):
-        gateway = self._gateways.get(distro_name)
-        if not gateway or not gateway.process:
+    def _on_supervisor_state(self, gateway: GatewayInstance, state: str):
+        status = GatewayStatus(state)
+        if self._gateways.get(gateway.distro_name) is not gateway or gateway.status == status:
             return
+        gateway.set_status(status)
+        self._notify_global_status(gateway.distro_name, status)
 
-        def read_output(pipe, log_type):
-            try:
-                for line in iter(pipe.readline, ""):
-                    if line:
-                        cleaned = line.replace("\x00", "").strip()
-                        if cleaned:
-                            logger.debug(f"[gateway:{distro_name}:{log_type}] {cleaned}")
-            except Exception:
-                pass
+    def start_gateways(
+        self,
+        distro_names: Iterable[str],
+        verbose: bool = False,
+        no_guardian: bool = True
+    ) -> Dict[str, bool]:
+        """并行启动多个 gateway，总耗时取决于最慢就绪的那个；端口一次性批量分配"""
+        distro_names = list(dict.fromkeys(distro_names))
+        if not distro_names:
+            return {}
+        with self._lock:
+            pending = [
+                name for name in distro_names
+                if not (name in self._gateways
+                        and self._gateways[name].status in (GatewayStatus.RUNNING, GatewayStatus.STARTING))
+            ]
+            ports = self._port_manager.assign_ports(pending)
+        results: Dict[str, bool] = {}
+        with ThreadPoolExecutor(max_workers=len(distro_names), thread_name_prefix="gateway-start") as pool:
+            futures = {}
+            for name in distro_names:
+                if name in ports and ports[name] is None:
+                    logger.error(f"Failed to assign port for {name}")
+                    results[name] = False
+                    continue
+                futures[name] = pool.submit(self.start_gateway, name, ports.get(name), verbose, no_guardian)
+            results.update({name: future.result() for name, future in futures.items()})
+        return {name: results[name] for name in distro_names}
+
+    def get_gateway_stats(self, distro_name: str) -> Optional[Dict]:
+        """运行时长、重启次数、启动到就绪耗时等"""
+        supervisor = self._supervisors.get(distro_name)
+        if supervisor is None:
+            return None
+        stats = supervisor.get_stats()
+        gateway = self._gateways.get(distro_name)
+        stats["port"] = gateway.port if gateway else None
+        return stats
 
-        stdout_thread = threading.Thread(
-            target=read_output,
-            args=(gateway.process.stdout, "stdout"),
-            daemon=True
-        )
-        stderr_thread = threading.Thread(
-            target=read_output,
-            args=(gateway.process.stderr, "stderr"),
-            daemon=True
-        )
-        stdout_thread.start()
-        stderr_thread.start()
-
-        gateway.process.wait()
-
-        if gateway.status == GatewayStatus.RUNNING:
-            gateway.set_status(GatewayStatus.STOPPED)
-            self._notify_global_status(distro_name, GatewayStatus.STOPPED)
+    def get_all_gateway_stats(self) -> Dict[str, Dict]:
+        return {name: self.get_gateway_stats(name) for name in list(self._supervisors)}
 
     def stop_gateway(self, distro_name: str) -> bool:
         gateway = self._gateways.get(distro_name)
@@ -204,7 +218,10 @@ class MultiClawbotGatewayManager:
             logger.warning(f"No gateway for {distro_name}")
             return True
 
-        if gateway.status != GatewayStatus.RUNNING:
+        if gateway.status not in (GatewayStatus.RUNNING, GatewayStatus.STARTING):
+            if gateway.supervisor:
+                # 可能正在等待崩溃后的重启
+                gateway.supervisor.stop()
             logger.warning(f"Gateway for {distro_name} not running")
             return True
 
@@ -212,13 +229,8 @@ class MultiClawbotGatewayManager:
         self._notify_global_status(distro_name, GatewayStatus.STOPPING)
 
         try:
-            if gateway.process:
-                gateway.process.terminate()
-                try:
-                    gateway.process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    gateway.process.kill()
-                    gateway.process.wait()
+            if gateway.supervisor:
+                gateway.supervisor.stop()
 
             self._wsl_manager.execute_command(
                 distro_name,
@@ -1,73 +1,285 @@
+import heapq
+import json
+import os
 import socket
-from typing import Dict, Optional, Set
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
 from loguru import logger
 
+CONFLICT_RETRY_SECONDS = 30.0  # 被其他进程占用的端口，隔这么久才重新探测
+
 
 class PortManager:
+    """
+    Gateway 端口分配
+
+    范围内未分配的端口放在空闲堆里，分配时从最小端口取，只对取出的端口做一次绑定探测；
+    已分配的端口不再探测。探测发现被其他进程占用的端口暂时移出，CONFLICT_RETRY_SECONDS 后再试。
+
+    分配结果按 key（distro）保存到 state_file，重启后同一 distro 优先拿回原来的端口。
+    release_port 只把端口标记为空闲可回收，映射仍然保留；空闲堆用完时才回收这些端口。
+    """
+
     DEFAULT_START_PORT = 18888
-    DEFAULT_END_PORT = 18890
+    DEFAULT_END_PORT = 18987
 
-    def __init__(self, start_port: int = DEFAULT_START_PORT, end_port: int = DEFAULT_END_PORT):
+    def __init__(self, start_port: int = DEFAULT_START_PORT, end_port: int = DEFAULT_END_PORT,
+                 state_file: Optional[Path | str] = None):
+        self._lock = threading.RLock()
+        self._state_file = Path(state_file) if state_file else None
+        self._assigned_ports: Dict[str, int] = {}  # key -> 端口（含已释放但保留的）
+        self._owners: Dict[int, str] = {}  # 端口 -> key
+        self._active: Set[str] = set()
+        self._conflicts: Dict[int, float] = {}  # 端口 -> 可重试时间
+        self._free: List[int] = []
+        self._probes = 0
         self._start_port = start_port
         self._end_port = end_port
-        self._assigned_ports: Dict[str, int] = {}
-        self._used_ports: Set[int] = set()
+        self._load()
+        self.set_port_range(start_port, end_port)
+
+    # ========================================
+    # 范围与持久化
+    # ========================================
+
+    @property
+    def port_range(self) -> tuple:
+        return self._start_port, self._end_port
+
+    def set_port_range(self, start_port: int, end_port: int):
+        """设置分配范围；已有的分配不受影响（范围外的端口只能通过 reserve_port 使用）"""
+        if not (0 < start_port <= end_port <= 65535):
+            raise ValueError(f"Invalid port range {start_port}-{end_port}")
+        with self._lock:
+            self._start_port = start_port
+            self._end_port = end_port
+            self._conflicts = {p: t for p, t in self._conflicts.items() if start_port <= p <= end_port}
+            self._free = [p for p in range(start_port, end_port + 1)
+                          if p not in self._owners and p not in self._conflicts]
+            heapq.heapify(self._free)
+
+    def _in_range(self, port: int) -> bool:
+        return self._start_port <= port <= self._end_port
+
+    def _load(self):
+        if not self._state_file or not self._state_file.exists():
+            return
+        try:
+            with open(self._state_file, "r", encoding="utf-8") as f:
+                ports = json.load(f).get("ports") or {}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Failed to load port assignments from {self._state_file}: {e}")
+            return
+        for key, port in ports.items():
+            if isinstance(port, int) and 0 < port <= 65535 and port not in self._owners:
+                self._assigned_ports[key] = port
+                self._owners[port] = key
+        if self._assigned_ports:
+            logger.info(f"Loaded {len(self._assigned_ports)} port assignments from {self._state_file}")
+
+    def _save(self):
+        if not self._state_file:
+            return
+        try:
+            self._state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._state_file.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"ports": self._assigned_ports}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self._state_file)
+        except OSError as e:
+            logger.error(f"Failed to save port assignments to {self._state_file}: {e}")
+
+    # ========================================
+    # 分配
+    # ========================================
 
     def is_port_available(self, port: int) -> bool:
+        self._probes += 1
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                if os.name != "nt":
+                    # 与服务端监听时一致：TIME_WAIT 中的旧连接不算占用（Windows 上此选项含义不同）
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
                 s.bind(('127.0.0.1', port))
                 return True
         except OSError:
             return False
 
+    def _mark_conflict(self, port: int):
+        self._conflicts[port] = time.monotonic() + CONFLICT_RETRY_SECONDS
+        logger.warning(f"Port {port} is held by another process")
+
+    def _retry_conflicts(self):
+        now = time.monotonic()
+        for port, retry_at in list(self._conflicts.items()):
+            if retry_at <= now:
+                del self._conflicts[port]
+                if port not in self._owners and self._in_range(port):
+                    heapq.heappush(self._free, port)
+
+    def _take_free_port(self) -> Optional[int]:
+        self._retry_conflicts()
+        while self._free:
+            port = heapq.heappop(self._free)
+            if port in self._owners or port in self._conflicts or not self._in_range(port):
+                continue
+            if self.is_port_available(port):
+                return port
+            self._mark_conflict(port)
+        return None
+
+    def _reclaim_released_port(self) -> Optional[int]:
+        """空闲堆用完时，回收已释放但仍保留映射的端口（端口号最小的优先）"""
+        for port in sorted(p for p, k in self._owners.items() if k not in self._active and self._in_range(p)):
+            if port in self._conflicts:
+                continue
+            if not self.is_port_available(port):
+                self._mark_conflict(port)
+                continue
+            key = self._owners.pop(port)
+            del self._assigned_ports[key]
+            logger.info(f"Reclaimed port {port} from released {key}")
+            return port
+        return None
+
+    def _assign(self, key: str) -> Optional[int]:
+        port = self._assigned_ports.get(key)
+        if port is not None:
+            if key in self._active:
+                return port
+            # 上次的端口：确认没有被其他进程占用再沿用
+            if port not in self._conflicts and self.is_port_available(port):
+                self._active.add(key)
+                logger.info(f"Assigned port {port} for {key} (kept)")
+                return port
+            self._mark_conflict(port)
+            self._drop(key)
+
+        port = self._take_free_port()
+        if port is None:
+            port = self._reclaim_released_port()
+        if port is None:
+            logger.error(f"No available ports in range {self._start_port}-{self._end_port}")
+            return None
+        self._assigned_ports[key] = port
+        self._owners[port] = key
+        self._active.add(key)
+        logger.info(f"Assigned port {port} for {key}")
+        return port
+
+    def _drop(self, key: str):
+        port = self._assigned_ports.pop(key, None)
+        self._active.discard(key)
+        if port is not None and self._owners.get(port) == key:
+            del self._owners[port]
+            if self._in_range(port) and port not in self._conflicts:
+                heapq.heappush(self._free, port)
+
     def find_available_port(self) -> Optional[int]:
-        for port in range(self._start_port, self._end_port + 1):
-            if port not in self._used_ports and self.is_port_available(port):
+        """返回下一个可分配的端口（不分配）"""
+        with self._lock:
+            port = self._take_free_port()
+            if port is not None:
+                heapq.heappush(self._free, port)
                 return port
         logger.error(f"No available ports in range {self._start_port}-{self._end_port}")
         return None
 
     def assign_port(self, key: str) -> Optional[int]:
-        if key in self._assigned_ports:
-            return self._assigned_ports[key]
+        with self._lock:
+            before = self._assigned_ports.get(key)
+            port = self._assign(key)
+            if port != before:
+                self._save()
+            return port
 
-        port = self.find_available_port()
-        if port:
+    def assign_ports(self, keys: Iterable[str]) -> Dict[str, Optional[int]]:
+        """批量分配（一次加锁、一次落盘），已有分配的 key 优先保留原端口"""
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            before = dict(self._assigned_ports)
+            # 先处理已有分配的 key，避免它们的端口被新 key 回收
+            ordered = sorted(keys, key=lambda k: k not in self._assigned_ports)
+            result = {key: self._assign(key) for key in ordered}
+            if self._assigned_ports != before:
+                self._save()
+        return {key: result[key] for key in keys}
+
+    def reserve_port(self, key: str, port: int) -> bool:
+        """为 key 指定端口；端口正被其他 key 使用或被其他进程占用时失败"""
+        with self._lock:
+            owner = self._owners.get(port)
+            if owner == key and key in self._active:
+                return True
+            if owner is not None and owner != key and owner in self._active:
+                logger.warning(f"Port {port} is already in use by {owner}")
+                return False
+            if not self.is_port_available(port):
+                self._mark_conflict(port)
+                return False
+            self._conflicts.pop(port, None)
+
+            if owner is not None and owner != key:
+                logger.info(f"Port {port} taken over from released {owner}")
+                self._drop(owner)
+            if self._assigned_ports.get(key) != port:
+                self._drop(key)
             self._assigned_ports[key] = port
-            self._used_ports.add(port)
-            logger.info(f"Assigned port {port} for {key}")
-        return port
+            self._owners[port] = key
+            self._active.add(key)
+            self._save()
+        logger.info(f"Reserved port {port} for {key}")
+        return True
 
     def release_port(self, key: str) -> bool:
-        if key in self._assigned_ports:
-            port = self._assigned_ports.pop(key)
-            self._used_ports.discard(port)
-            logger.info(f"Released port {port} from {key}")
-            return True
-        return False
+        """标记端口不再使用；映射保留，下次 assign_port 优先拿回同一端口"""
+        with self._lock:
+            if key not in self._active:
+                return False
+            self._active.discard(key)
+            port = self._assigned_ports[key]
+        logger.info(f"Released port {port} from {key}")
+        return True
+
+    def forget_port(self, key: str) -> bool:
+        """删除 key 的分配记录，端口回到空闲池"""
+        with self._lock:
+            if key not in self._assigned_ports:
+                return False
+            port = self._assigned_ports[key]
+            self._drop(key)
+            self._save()
+        logger.info(f"Forgot port {port} for {key}")
+        return True
 
     def get_assigned_port(self, key: str) -> Optional[int]:
-        return self._assigned_ports.get(key)
+        with self._lock:
+            return self._assigned_ports.get(key)
 
     def get_all_assigned_ports(self) -> Dict[str, int]:
-        return self._assigned_ports.copy()
+        """所有正在使用的分配"""
+        with self._lock:
+            return {key: port for key, port in self._assigned_ports.items() if key in self._active}
 
-    def reserve_port(self, key: str, port: int) -> bool:
-        if port in self._used_ports:
-            logger.warning(f"Port {port} is already in use")
-            return False
-        
-        if key in self._assigned_ports:
-            old_port = self._assigned_ports[key]
-            self._used_ports.discard(old_port)
-        
-        self._assigned_ports[key] = port
-        self._used_ports.add(port)
-        logger.info(f"Reserved port {port} for {key}")
-        return True
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "range": [self._start_port, self._end_port],
+                "active": len(self._active),
+                "kept": len(self._assigned_ports) - len(self._active),
+                "free": sum(1 for p in set(self._free) if p not in self._owners and p not in self._conflicts),
+                "conflicts": sorted(self._conflicts),
+                "probes": self._probes,
+            }
 
     def reset(self):
-        self._assigned_ports.clear()
-        self._used_ports.clear()
+        with self._lock:
+            self._assigned_ports.clear()
+            self._owners.clear()
+            self._active.clear()
+            self._conflicts.clear()
+            self.set_port_range(self._start_port, self._end_port)
+            self._save()
         logger.info("Port manager reset")
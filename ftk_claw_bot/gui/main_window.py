@@ -19,10 +19,13 @@ from PyQt6.QtGui import QIcon, QAction, QFont, QPixmap, QColor, QPainter
 from ..core import (
     WSLManager, ClawbotController, ConfigManager,
     ClawbotGatewayManager, BridgeManager, GatewayStatus,
-    GroupChatManager
+    GroupChatManager, close_chat_history_store
 )
 from ..core.config_sync_manager import ConfigSyncManager
-from ..services import WindowsBridge, MonitorService, ClawbotChatClient, ConnectionStatus, init_wsl_state_service
+from ..services import (
+    WindowsBridge, MonitorService, ClawbotChatClient, ConnectionStatus, init_wsl_state_service,
+    get_chat_connection_hub
+)
 from ..utils import make_thread_safe, I18nManager, tr
 from ..utils.crash_handler import set_crash_context
 from ..constants import Bridge, VERSION
@@ -71,8 +74,27 @@ def _get_app_icon() -> QIcon:
     return QIcon(pixmap)
 
 
+class GatewayStartWorker(QThread):
+    """后台线程启动 gateway 并等待就绪（start_gateway 最长会阻塞到就绪超时）"""
+    result_ready = pyqtSignal(bool)
+
+    def __init__(self, gateway_manager, distro_name: str):
+        super().__init__()
+        self._gateway_manager = gateway_manager
+        self._distro_name = distro_name
+
+    def run(self):
+        try:
+            ok = self._gateway_manager.start_gateway(self._distro_name)
+        except Exception as e:
+            logger.error(f"Gateway 启动异常: {e}")
+            ok = False
+        self.result_ready.emit(ok)
+
+
 class MainWindow(QMainWindow):
     _chat_message_signal = pyqtSignal(str, object)
+    _chat_delta_signal = pyqtSignal(object, str, str)
     
     def __init__(
         self,
@@ -88,6 +110,11 @@ class MainWindow(QMainWindow):
         _debug_log("[MainWindow] super().__init__() 完成")
         
         self._chat_message_signal.connect(self._handle_chat_message_on_main_thread)
+        self._chat_delta_signal.connect(self._handle_chat_delta_on_main_thread)
+        # 所有 bot 的入站消息都经由连接 hub 汇总到这里，再通过信号转到主线程
+        chat_hub = get_chat_connection_hub()
+        chat_hub.set_message_handler(self._on_chat_message_received)
+        chat_hub.set_delta_handler(self._chat_delta_signal.emit)
         
         self.setWindowIcon(_get_app_icon())
         
@@ -99,6 +126,8 @@ class MainWindow(QMainWindow):
             self._monitor_service = monitor_service
             self._windows_bridge = windows_bridge
             self._gateway_manager: Optional[ClawbotGatewayManager] = None
+            self._gateway_start_worker: Optional[GatewayStartWorker] = None
+            self._gateway_start_callbacks: list = []
             self._bridge_manager: Optional[BridgeManager] = None
             self._chat_clients: dict[str, ClawbotChatClient] = {}
             self._client_count_timer = QTimer()
@@ -132,6 +161,8 @@ class MainWindow(QMainWindow):
             self._monitor_service = MonitorService(self._wsl_manager, self._clawbot_controller)
 
             self._gateway_manager: Optional[ClawbotGatewayManager] = None
+            self._gateway_start_worker: Optional[GatewayStartWorker] = None
+            self._gateway_start_callbacks: list = []
             self._bridge_manager: Optional[BridgeManager] = None
             self._chat_clients: dict[str, ClawbotChatClient] = {}
             self._client_count_timer = QTimer()
@@ -688,23 +719,48 @@ class MainWindow(QMainWindow):
             self.chat_panel.set_connection_status(False)
             return
         
-        if self._gateway_manager and valid_bots:
-            first_bot = valid_bots[0]
-            first_config = first_bot["config"]
-            if self._gateway_manager.status != GatewayStatus.RUNNING:
-                logger.info("Gateway 未运行，正在启动...")
-                self._gateway_manager._port = first_config.gateway_port
-                if not self._gateway_manager.start_gateway(first_config.distro_name):
-                    logger.error("Gateway 启动失败")
-                    self.chat_panel.show_error("无法启动 gateway 服务")
-                    self.chat_panel.set_connection_status(False)
-                    return
-                logger.info("Gateway 启动成功，等待服务就绪...")
-                import time
-                time.sleep(2)
-            else:
-                logger.info("Gateway 已在运行")
-        
+        def on_gateway_started(ok: bool):
+            if not ok:
+                self.chat_panel.show_error("无法启动 gateway 服务")
+                self.chat_panel.set_connection_status(False)
+                return
+            self._connect_valid_bots(valid_bots)
+
+        self._ensure_gateway_started(valid_bots[0]["config"], on_gateway_started)
+
+    def _ensure_gateway_started(self, config, on_done):
+        """gateway 未运行时在后台线程启动，完成后在主线程回调 on_done(ok)；启动中再次请求会合并等待"""
+        if self._gateway_manager.status == GatewayStatus.RUNNING:
+            logger.info("Gateway 已在运行")
+            on_done(True)
+            return
+
+        self._gateway_start_callbacks.append(on_done)
+        if self._gateway_start_worker is not None:
+            logger.info("Gateway 正在启动，等待结果...")
+            return
+
+        logger.info("Gateway 未运行，正在启动...")
+        self._gateway_manager._port = config.gateway_port
+        worker = GatewayStartWorker(self._gateway_manager, config.distro_name)
+        worker.result_ready.connect(self._on_gateway_start_finished)
+        self._gateway_start_worker = worker
+        worker.start()
+
+    def _on_gateway_start_finished(self, ok: bool):
+        if ok:
+            logger.info("Gateway 启动成功，服务已就绪")
+        else:
+            logger.error("Gateway 启动失败")
+        worker, self._gateway_start_worker = self._gateway_start_worker, None
+        if worker is not None:
+            worker.wait()
+            worker.deleteLater()
+        callbacks, self._gateway_start_callbacks = self._gateway_start_callbacks, []
+        for callback in callbacks:
+            callback(ok)
+
+    def _connect_valid_bots(self, valid_bots: list):
         # 开始连接每个有效的 bot
         connected_count = 0
         connected_info = []
@@ -725,16 +781,10 @@ class MainWindow(QMainWindow):
             gateway_url = f"ws://{wsl_ip}:{config.gateway_port}/ws"
             logger.info(f"开始连接到 {clawbot_name}: {gateway_url}")
             
-            # 使用闭包创建专用的消息回调，绑定 clawbot_name
-            def create_message_callback(name):
-                def callback(message):
-                    self._on_chat_message_received(message, name)
-                return callback
-            
             chat_client = ClawbotChatClient(
                 gateway_url,
-                on_message=create_message_callback(clawbot_name),
-                on_status_changed=self._on_chat_status_changed
+                on_status_changed=self._on_chat_status_changed,
+                name=clawbot_name
             )
             
             if chat_client.connect():
@@ -792,33 +842,32 @@ class MainWindow(QMainWindow):
             self.chat_panel.set_connection_status(clawbot_name, True, f"{wsl_ip}:{config.gateway_port}")
             return
         
-        if self._gateway_manager:
-            if self._gateway_manager.status != GatewayStatus.RUNNING:
-                logger.info("Gateway 未运行，正在启动...")
-                self._gateway_manager._port = config.gateway_port
-                if not self._gateway_manager.start_gateway(config.distro_name):
-                    logger.error("Gateway 启动失败")
-                    self.chat_panel.show_error(f"无法启动 {clawbot_name} 的 gateway 服务")
-                    self.chat_panel.set_connection_status(clawbot_name, False)
-                    return
-                logger.info("Gateway 启动成功，等待服务就绪...")
-                import time
-                time.sleep(2)
-            else:
-                logger.info("Gateway 已在运行")
-        
+        if not self._gateway_manager:
+            self._connect_single_bot(clawbot_name, config, wsl_ip)
+            return
+
+        def on_gateway_started(ok: bool):
+            if not ok:
+                self.chat_panel.show_error(f"无法启动 {clawbot_name} 的 gateway 服务")
+                self.chat_panel.set_connection_status(clawbot_name, False)
+                return
+            self._connect_single_bot(clawbot_name, config, wsl_ip)
+
+        self._ensure_gateway_started(config, on_gateway_started)
+
+    def _connect_single_bot(self, clawbot_name: str, config, wsl_ip: str):
+        if clawbot_name in self._chat_clients:
+            logger.info(f"{clawbot_name} 已经连接，跳过")
+            self.chat_panel.set_connection_status(clawbot_name, True, f"{wsl_ip}:{config.gateway_port}")
+            return
+
         gateway_url = f"ws://{wsl_ip}:{config.gateway_port}/ws"
         logger.info(f"开始连接到 {clawbot_name}: {gateway_url}")
         
-        def create_message_callback(name):
-            def callback(message):
-                self._on_chat_message_received(message, name)
-            return callback
-        
         chat_client = ClawbotChatClient(
             gateway_url,
-            on_message=create_message_callback(clawbot_name),
-            on_status_changed=self._on_chat_status_changed
+            on_status_changed=self._on_chat_status_changed,
+            name=clawbot_name
         )
         
         if chat_client.connect():
@@ -942,6 +991,12 @@ class MainWindow(QMainWindow):
                 "bot": clawbot_name
             })
     
+    def _handle_chat_delta_on_main_thread(self, clawbot_name: Optional[str], message_id: str, delta: str):
+        try:
+            self.chat_panel.append_stream_delta(clawbot_name, message_id, delta)
+        except Exception as e:
+            logger.error(f"[MainWindow.Chat] 处理流式增量异常: {type(e).__name__}: {e}")
+    
     def _on_group_chat_message_to_bot(self, bot_name: str, trigger_reason: str, messages: list):
         logger.info(f"[MainWindow.GroupChat] 发送消息给 {bot_name}, 原因: {trigger_reason}, 消息数: {len(messages)}")
         
@@ -1094,9 +1149,15 @@ class MainWindow(QMainWindow):
             except Exception:
                 pass
         self._chat_clients.clear()
+        get_chat_connection_hub().shutdown()
+        self._group_chat_manager.shutdown()
+        close_chat_history_store()
 
         if self._gateway_manager:
             self._gateway_manager.stop_gateway()
+        if self._gateway_start_worker is not None:
+            # stop_gateway 会让就绪等待提前结束
+            self._gateway_start_worker.wait(5000)
         
         if hasattr(self, '_wsl_state_service') and self._wsl_state_service:
             self._wsl_state_service.stop_monitoring()
@@ -16,10 +16,21 @@ from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize, QThread
 from PyQt6.QtGui import QFont, QColor, QTextCursor, QTextCharFormat, QCursor
 
 from ..mixins import WSLStateAwareMixin
+from ...core.chat_history_store import GROUP_CONVERSATION, bot_conversation, get_chat_history_store
 from ...utils.async_ops import AsyncOperation, AsyncResult
 from ...utils.i18n import tr
 
 
+STREAM_REPAINT_INTERVAL_MS = 33  # 流式输出合并增量后再插入，最多约 30fps
+HISTORY_PAGE_SIZE = 50  # 打开面板/滚动到顶部时每次加载的历史条数
+MAX_RENDERED_MESSAGES = 300  # 文本框中最多保留的消息数，超出后从顶部移除（可滚动重新加载）
+
+
+def _document_length(text: str) -> int:
+    """文本在 QTextDocument 中占用的位置数（按 UTF-16 计）"""
+    return len(text.encode("utf-16-le")) // 2
+
+
 def _get_thread_info() -> str:
     return f"T:{threading.current_thread().ident}:{threading.current_thread().name[:10]}"
 
@@ -36,6 +47,30 @@ class ChatMessage:
         self.clawbot_name = clawbot_name
         self.timestamp = timestamp or datetime.now().strftime("%H:%M")
         self.message_type = message_type
+        self.message_id: Optional[int] = None  # 聊天记录中的 id
+        self.doc_length: Optional[int] = None  # 在文本框中占用的位置数，流式输出未结束时为 None
+    
+    @classmethod
+    def from_record(cls, record: Dict) -> "ChatMessage":
+        """由聊天记录中的一行构造"""
+        sent_at = datetime.fromtimestamp(record["timestamp"])
+        fmt = "%H:%M" if sent_at.date() == datetime.now().date() else "%m-%d %H:%M"
+        message = cls(record["role"], record["content"], record["name"],
+                      sent_at.strftime(fmt), record["message_type"])
+        message.message_id = record["id"]
+        return message
+
+
+class _StreamBlock:
+    """正在流式输出的消息块：cursor 停在已输出内容的末尾，新增量从这里插入"""
+
+    def __init__(self, message: ChatMessage, cursor: QTextCursor):
+        self.message = message
+        self.cursor = cursor
+        self.pending: List[str] = []
+        self.length = 0
+        self.header_length = 0
+        self.started = time.perf_counter()
 
 
 class SelectedClawbotTag(QWidget):
@@ -408,7 +443,8 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
         ("#a371f7", "#2a1a3a"),
     ]
     
-    def __init__(self, config_manager=None, clawbot_controller=None, wsl_manager=None, parent=None):
+    def __init__(self, config_manager=None, clawbot_controller=None, wsl_manager=None, parent=None,
+                 history_store=None):
         super().__init__(parent)
         WSLStateAwareMixin._init_wsl_state_aware(self)
         self._config_manager = config_manager
@@ -421,10 +457,20 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
         self._connection_status = {}
         self._connected_bot_info = {}
         self._bot_color_map = {}
+        self._streams: Dict[str, _StreamBlock] = {}  # 消息 id -> 流式消息块
+        self._stream_by_bot: Dict[str, str] = {}  # bot 名 -> 正在流式输出的消息 id
+        self._last_stream_flush = 0.0
+        self._stream_timer = QTimer(self)
+        self._stream_timer.setSingleShot(True)
+        self._stream_timer.timeout.connect(self._flush_stream_deltas)
+        self._history = history_store if history_store is not None else self._open_history_store()
+        self._history_exhausted = self._history is None
+        self._loading_history = False
         
         self._init_ui()
         self._start_timer()
         self._load_clawbots()
+        self._load_recent_history()
     
     def _init_ui(self):
         main_layout = QHBoxLayout(self)
@@ -584,6 +630,7 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                 padding: 12px;
             }
         """)
+        self.chat_text.verticalScrollBar().valueChanged.connect(self._on_chat_scrolled)
         layout.addWidget(self.chat_text, 1)
         
         input_layout = QVBoxLayout()
@@ -798,6 +845,7 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
         if self._wsl_manager:
             self._wsl_manager.list_distros()
         
+        to_probe = {}
         for config_name, card in self._clawbot_cards.items():
             wsl_status = "stopped"
             if card.config and self._wsl_manager:
@@ -814,14 +862,12 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                     clawbot_status = status.value
                 
                 if clawbot_status != "running" and card.config:
-                    is_connected = self._clawbot_controller.check_gateway_connectivity(
-                        card.config.distro_name,
-                        card.config.gateway_port
-                    )
-                    if is_connected:
-                        clawbot_status = "running"
+                    to_probe[config_name] = card
             
             card.set_clawbot_status(clawbot_status)
+        
+        for config_name in self._probe_gateways(to_probe):
+            self._clawbot_cards[config_name].set_clawbot_status("running")
     
     def _refresh_clawbot_status_async(self):
         """异步刷新 Clawbot 状态，避免阻塞主线程"""
@@ -830,10 +876,11 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
         
         def refresh_operation():
             results = {}
+            to_probe = {}
             if self._wsl_manager:
                 self._wsl_manager.list_distros()
             
-            for config_name, card in self._clawbot_cards.items():
+            for config_name, card in list(self._clawbot_cards.items()):
                 wsl_status = "stopped"
                 if card.config and self._wsl_manager:
                     distro = self._wsl_manager.get_distro(card.config.distro_name)
@@ -847,18 +894,17 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                         clawbot_status = status.value
                     
                     if clawbot_status != "running" and card.config:
-                        is_connected = self._clawbot_controller.check_gateway_connectivity(
-                            card.config.distro_name,
-                            card.config.gateway_port
-                        )
-                        if is_connected:
-                            clawbot_status = "running"
+                        to_probe[config_name] = card
                 
                 results[config_name] = {
                     "wsl_status": wsl_status,
                     "clawbot_status": clawbot_status
                 }
             
+            # 所有卡片的探测并发执行，耗时约等于一次探测
+            for config_name in self._probe_gateways(to_probe):
+                results[config_name]["clawbot_status"] = "running"
+            
             return results
         
         def on_result(results):
@@ -895,6 +941,7 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
     
     def _update_cards_wsl_status(self, distros: List[Dict]):
         distro_status = {d["name"]: d.get("is_running", False) for d in distros}
+        to_probe = {}
         for config_name, card in self._clawbot_cards.items():
             if card.config:
                 distro_name = card.config.distro_name
@@ -908,14 +955,20 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                         clawbot_status = status.value
                     
                     if clawbot_status != "running" and card.config:
-                        is_connected = self._clawbot_controller.check_gateway_connectivity(
-                            card.config.distro_name,
-                            card.config.gateway_port
-                        )
-                        if is_connected:
-                            clawbot_status = "running"
+                        to_probe[config_name] = card
                 
                 card.set_clawbot_status(clawbot_status)
+        
+        for config_name in self._probe_gateways(to_probe):
+            self._clawbot_cards[config_name].set_clawbot_status("running")
+    
+    def _probe_gateways(self, cards: Dict) -> Set[str]:
+        """并发探测这些卡片对应的 gateway，返回可连通的配置名"""
+        if not cards or not self._clawbot_controller:
+            return set()
+        targets = {name: (card.config.distro_name, card.config.gateway_port) for name, card in cards.items()}
+        results = self._clawbot_controller.check_gateways_connectivity(targets.values())
+        return {name for name, target in targets.items() if results.get(target)}
     
     def _select_all(self):
         for name, card in self._clawbot_cards.items():
@@ -990,9 +1043,17 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                     f"主线程={_is_main_thread()}")
         
         try:
+            stream_id = self._stream_by_bot.get(clawbot_name or "") if role == "assistant" else None
+            if stream_id is not None:
+                # 流式回复的完整内容：收尾已有的消息块，不再追加新块
+                self._finish_stream(stream_id, content)
+                return
+            
             message = ChatMessage(role, content, clawbot_name)
+            self._record_message(message)
             self._messages.append(message)
             self._append_message(message)
+            self._trim_rendered_messages()
             
             elapsed = (time.perf_counter() - start_time) * 1000
             logger.debug(f"[ChatPanel] 消息添加完成, 总消息数: {len(self._messages)}, 耗时: {elapsed:.2f}ms")
@@ -1008,40 +1069,7 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
         try:
             cursor = self.chat_text.textCursor()
             cursor.movePosition(QTextCursor.MoveOperation.End)
-            
-            if message.role == "user":
-                role_text = tr("chat.role.you", "你")
-                role_color = QColor("#58a6ff")
-                bg_color = QColor("#1f3a5f")
-            elif message.role == "assistant":
-                role_text = message.clawbot_name or tr("chat.role.ai", "AI")
-                if message.clawbot_name:
-                    if message.clawbot_name not in self._bot_color_map:
-                        color_idx = len(self._bot_color_map) % len(self._BOT_COLORS)
-                        self._bot_color_map[message.clawbot_name] = self._BOT_COLORS[color_idx]
-                    role_color = QColor(self._bot_color_map[message.clawbot_name][0])
-                    bg_color = QColor(self._bot_color_map[message.clawbot_name][1])
-                else:
-                    role_color = QColor("#3fb950")
-                    bg_color = QColor("#1a3a2f")
-            else:
-                role_text = message.role
-                role_color = QColor("#8b949e")
-                bg_color = QColor("#2d333b")
-            
-            format_text = QTextCharFormat()
-            format_text.setBackground(bg_color)
-            format_text.setForeground(role_color)
-            format_text.setFontWeight(QFont.Weight.Bold)
-            cursor.insertText(f"[{role_text}] ", format_text)
-            
-            format_time = QTextCharFormat()
-            format_time.setForeground(QColor("#8b949e"))
-            format_time.setFontPointSize(9)
-            cursor.insertText(f"{message.timestamp}\n", format_time)
-            
-            self._insert_content_with_highlights(cursor, message.content)
-            cursor.insertText("\n\n")
+            self._render_message(cursor, message)
             
             scrollbar = self.chat_text.verticalScrollBar()
             scrollbar.setValue(scrollbar.maximum())
@@ -1053,13 +1081,270 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
             logger.error(f"[ChatPanel] 堆栈跟踪:\n{traceback.format_exc()}")
             raise
     
+    def _render_message(self, cursor, message: ChatMessage):
+        """在 cursor 处插入完整消息，并记录其占用的位置数"""
+        start = cursor.position()
+        self._insert_message_header(cursor, message)
+        self._insert_content_with_highlights(cursor, message.content)
+        cursor.insertText("\n\n")
+        message.doc_length = cursor.position() - start
+    
+    def _insert_message_header(self, cursor, message: ChatMessage):
+        if message.role == "user":
+            role_text = tr("chat.role.you", "你")
+            role_color = QColor("#58a6ff")
+            bg_color = QColor("#1f3a5f")
+        elif message.role == "assistant":
+            role_text = message.clawbot_name or tr("chat.role.ai", "AI")
+            if message.clawbot_name:
+                if message.clawbot_name not in self._bot_color_map:
+                    color_idx = len(self._bot_color_map) % len(self._BOT_COLORS)
+                    self._bot_color_map[message.clawbot_name] = self._BOT_COLORS[color_idx]
+                role_color = QColor(self._bot_color_map[message.clawbot_name][0])
+                bg_color = QColor(self._bot_color_map[message.clawbot_name][1])
+            else:
+                role_color = QColor("#3fb950")
+                bg_color = QColor("#1a3a2f")
+        else:
+            role_text = message.role
+            role_color = QColor("#8b949e")
+            bg_color = QColor("#2d333b")
+        
+        format_text = QTextCharFormat()
+        format_text.setBackground(bg_color)
+        format_text.setForeground(role_color)
+        format_text.setFontWeight(QFont.Weight.Bold)
+        cursor.insertText(f"[{role_text}] ", format_text)
+        
+        format_time = QTextCharFormat()
+        format_time.setForeground(QColor("#8b949e"))
+        format_time.setFontPointSize(9)
+        cursor.insertText(f"{message.timestamp}\n", format_time)
+    
+    def append_stream_delta(self, clawbot_name: Optional[str], message_id: str, delta: str):
+        """追加流式回复的增量；首个增量立即显示，之后按 STREAM_REPAINT_INTERVAL_MS 合并插入"""
+        block = self._streams.get(message_id)
+        if block is None:
+            message = ChatMessage("assistant", "", clawbot_name)
+            if self._history is not None:
+                message.message_id = self._history.reserve_id()
+            self._messages.append(message)
+            
+            cursor = self.chat_text.textCursor()
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            start = cursor.position()
+            self._insert_message_header(cursor, message)
+            cursor.insertText("\n\n")
+            cursor.movePosition(QTextCursor.MoveOperation.PreviousCharacter,
+                                QTextCursor.MoveMode.MoveAnchor, 2)
+            
+            block = _StreamBlock(message, cursor)
+            block.header_length = cursor.position() - start
+            self._streams[message_id] = block
+            previous = self._stream_by_bot.get(clawbot_name or "")
+            if previous is not None and previous != message_id:
+                self._finish_stream(previous, None)
+            self._stream_by_bot[clawbot_name or ""] = message_id
+            self._trim_rendered_messages()
+            logger.debug(f"[ChatPanel] 开始流式消息: bot={clawbot_name}, id={message_id}")
+        
+        block.pending.append(delta)
+        if self._stream_timer.isActive():
+            return
+        wait_ms = STREAM_REPAINT_INTERVAL_MS - (time.perf_counter() - self._last_stream_flush) * 1000
+        if wait_ms <= 0:
+            self._flush_stream_deltas()
+        else:
+            self._stream_timer.start(int(wait_ms) + 1)
+    
+    def _flush_stream_deltas(self):
+        self._last_stream_flush = time.perf_counter()
+        scrollbar = self.chat_text.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        
+        format_normal = QTextCharFormat()
+        format_normal.setForeground(QColor("#c9d1d9"))
+        for block in self._streams.values():
+            if not block.pending:
+                continue
+            text = "".join(block.pending)
+            block.pending.clear()
+            block.cursor.insertText(text, format_normal)
+            block.length += _document_length(text)
+            block.message.content += text
+        
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+    
+    def _finish_stream(self, message_id: str, content: Optional[str]):
+        """结束流式消息块；content 与已显示内容不同或含 @ 提及时按完整内容重新渲染"""
+        block = self._streams.pop(message_id, None)
+        if block is None:
+            return
+        bot_key = block.message.clawbot_name or ""
+        if self._stream_by_bot.get(bot_key) == message_id:
+            del self._stream_by_bot[bot_key]
+        
+        self._flush_stream_deltas()
+        content_length = block.length
+        if content is not None and (content != block.message.content or "@" in content):
+            cursor = QTextCursor(block.cursor)
+            cursor.setPosition(block.cursor.position() - block.length, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+            start = cursor.position()
+            self._insert_content_with_highlights(cursor, content)
+            content_length = cursor.position() - start
+            block.message.content = content
+        block.message.doc_length = block.header_length + content_length + 2
+        self._record_message(block.message)
+        
+        elapsed = (time.perf_counter() - block.started) * 1000
+        logger.debug(f"[ChatPanel] 流式消息结束: id={message_id}, 长度={len(block.message.content)}, "
+                    f"耗时={elapsed:.0f}ms")
+    
+    def _reset_streams(self):
+        self._stream_timer.stop()
+        self._streams.clear()
+        self._stream_by_bot.clear()
+    
+    # ========================================
+    # 聊天记录
+    # ========================================
+    
+    @staticmethod
+    def _open_history_store():
+        try:
+            return get_chat_history_store()
+        except Exception as e:
+            logger.warning(f"[ChatPanel] 聊天记录不可用: {e}")
+            return None
+    
+    def _history_conversations(self, message: ChatMessage) -> List[str]:
+        """消息所属的会话：群聊模式下归入群聊，另外归入发送目标或回复的 bot"""
+        conversations = [GROUP_CONVERSATION] if self.is_group_chat_enabled() else []
+        if message.role == "user":
+            conversations.extend(bot_conversation(name) for name in sorted(self._selected_clawbots))
+        elif message.clawbot_name:
+            conversations.append(bot_conversation(message.clawbot_name))
+        return conversations
+    
+    def _record_message(self, message: ChatMessage):
+        if self._history is None:
+            return
+        try:
+            message.message_id = self._history.append(
+                message.role, message.content, message.clawbot_name,
+                self._history_conversations(message), message_type=message.message_type,
+                message_id=message.message_id,
+            )
+        except Exception as e:
+            logger.error(f"[ChatPanel] 写入聊天记录失败: {e}")
+    
+    def _load_recent_history(self):
+        """打开面板时只渲染最近一页记录，更早的在滚动到顶部时加载"""
+        if self._history is None:
+            return
+        start_time = time.perf_counter()
+        try:
+            records = self._history.load_page(limit=HISTORY_PAGE_SIZE)
+        except Exception as e:
+            logger.error(f"[ChatPanel] 读取聊天记录失败: {e}")
+            self._history_exhausted = True
+            return
+        self._history_exhausted = len(records) < HISTORY_PAGE_SIZE
+        if not records:
+            return
+        
+        cursor = self.chat_text.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        self._loading_history = True
+        try:
+            for record in records:
+                message = ChatMessage.from_record(record)
+                self._render_message(cursor, message)
+                self._messages.append(message)
+            scrollbar = self.chat_text.verticalScrollBar()
+            scrollbar.setValue(scrollbar.maximum())
+        finally:
+            self._loading_history = False
+        
+        elapsed = (time.perf_counter() - start_time) * 1000
+        logger.info(f"[ChatPanel] 已加载最近 {len(records)} 条聊天记录, 耗时: {elapsed:.1f}ms")
+    
+    def _on_chat_scrolled(self, value: int):
+        if self._loading_history or self._history_exhausted:
+            return
+        scrollbar = self.chat_text.verticalScrollBar()
+        if value == scrollbar.minimum() and scrollbar.maximum() > scrollbar.minimum():
+            self._load_older_history()
+    
+    def _load_older_history(self):
+        """在顶部插入更早的一页记录，保持当前可见内容不跳动"""
+        oldest = self._messages[0].message_id if self._messages else None
+        if oldest is None:
+            self._history_exhausted = True
+            return
+        try:
+            records = self._history.load_page(before_id=oldest, limit=HISTORY_PAGE_SIZE)
+        except Exception as e:
+            logger.error(f"[ChatPanel] 读取聊天记录失败: {e}")
+            return
+        if len(records) < HISTORY_PAGE_SIZE:
+            self._history_exhausted = True
+        if not records:
+            return
+        
+        scrollbar = self.chat_text.verticalScrollBar()
+        distance_from_bottom = scrollbar.maximum() - scrollbar.value()
+        cursor = QTextCursor(self.chat_text.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        messages = [ChatMessage.from_record(record) for record in records]
+        self._loading_history = True
+        try:
+            for message in messages:
+                self._render_message(cursor, message)
+            self._messages[:0] = messages
+            scrollbar.setValue(scrollbar.maximum() - distance_from_bottom)
+        finally:
+            self._loading_history = False
+        logger.debug(f"[ChatPanel] 加载更早的 {len(records)} 条聊天记录, 当前显示 {len(self._messages)} 条")
+    
+    def _trim_rendered_messages(self):
+        """显示的消息超过上限时从顶部批量移除（留出一页余量，避免每条消息都触发）"""
+        if len(self._messages) <= MAX_RENDERED_MESSAGES + HISTORY_PAGE_SIZE:
+            return
+        remove_count = 0
+        length = 0
+        for message in self._messages[:len(self._messages) - MAX_RENDERED_MESSAGES]:
+            if message.doc_length is None:
+                break  # 流式输出中的消息之后的内容不动
+            remove_count += 1
+            length += message.doc_length
+        if not remove_count:
+            return
+        
+        scrollbar = self.chat_text.verticalScrollBar()
+        distance_from_bottom = scrollbar.maximum() - scrollbar.value()
+        cursor = QTextCursor(self.chat_text.document())
+        cursor.setPosition(0)
+        cursor.setPosition(length, QTextCursor.MoveMode.KeepAnchor)
+        self._loading_history = True
+        try:
+            cursor.removeSelectedText()
+            del self._messages[:remove_count]
+            scrollbar.setValue(scrollbar.maximum() - distance_from_bottom)
+        finally:
+            self._loading_history = False
+        self._history_exhausted = self._history is None
+        logger.debug(f"[ChatPanel] 移除顶部 {remove_count} 条消息, 当前显示 {len(self._messages)} 条")
+    
     def _insert_content_with_highlights(self, cursor, content: str):
         import re
         
         format_normal = QTextCharFormat()
         format_normal.setForeground(QColor("#c9d1d9"))
         
-        pattern = r'(@\w+)'
+        pattern = r'(@\w+(?:[-.]\w+)*)'
         parts = re.split(pattern, content)
         
         for part in parts:
@@ -1081,13 +1366,15 @@ class ChatPanel(QWidget, WSLStateAwareMixin):
                 cursor.insertText(part, format_normal)
     
     def _clear_clicked(self):
-        self._messages.clear()
-        self.chat_text.clear()
+        self.clear_messages()
         self.clear_clicked.emit()
     
     def clear_messages(self):
+        """只清空显示，不删除聊天记录（清空后滚动到顶部也不再加载更早的记录）"""
+        self._reset_streams()
         self._messages.clear()
         self.chat_text.clear()
+        self._history_exhausted = True
     
     def keyPressEvent(self, event):
         modifiers = event.modifiers()
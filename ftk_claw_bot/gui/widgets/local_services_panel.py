@@ -90,11 +90,15 @@ class ServiceStartWorker(QThread):
             self.status_changed.emit(self._service.id, "error", info.error or "启动失败")
             return
         
+        wait_started = getattr(self._service, "wait_started", None)
         for _ in range(60):
             if self._service.check_started():
                 self.status_changed.emit(self._service.id, "running", "")
                 return
-            time.sleep(1)
+            if wait_started is not None:
+                wait_started(1)
+            else:
+                time.sleep(1)
         
         info = self._service.get_status()
         self.status_changed.emit(self._service.id, "error", info.error or "启动超时")
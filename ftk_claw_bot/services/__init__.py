@@ -2,6 +2,7 @@ from .ipc_server import IPCServer
 from .windows_bridge import WindowsBridge, WindowsAutomation
 from .monitor_service import MonitorService
 from .clawbot_chat_client import ClawbotChatClient, ConnectionStatus
+from .chat_connection_hub import ChatConnectionHub, get_chat_connection_hub
 from .wsl_state_service import WSLStateService, init_wsl_state_service, get_wsl_state_service
 from .action_router import ActionRouter
 from .web_agent_executor import WebAgentExecutor
@@ -14,8 +15,10 @@ from .service_registry import (
 
 from .embedding import register_embedding_service, EmbeddingService
 from . import clawbot_upgrader
+from .workspace_indexer import WorkspaceIndexer, register_workspace_indexer_service
 
 register_embedding_service()
+register_workspace_indexer_service()
 
 __all__ = [
     "IPCServer",
@@ -24,6 +27,8 @@ __all__ = [
     "MonitorService",
     "ClawbotChatClient",
     "ConnectionStatus",
+    "ChatConnectionHub",
+    "get_chat_connection_hub",
     "WSLStateService",
     "init_wsl_state_service",
     "get_wsl_state_service",
@@ -37,6 +42,8 @@ __all__ = [
     "WebAgentExecutor",
     "PlaywrightWebAutomation",
     "clawbot_upgrader",
+    "WorkspaceIndexer",
+    "register_workspace_indexer_service",
     "AppWhitelistManager",
     "AppInfo",
     "whitelist_manager",
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import random
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from loguru import logger
+
+
+class ChatConnectionHub:
+    """所有 gateway WebSocket 连接共用的事件循环
+
+    每个 ClawbotChatClient 只是挂在这个循环上的一组协程，不再各自持有
+    事件循环和线程。重连由 hub 统一调度（指数退避 + 随机抖动，避免多个
+    bot 同时断线后同时重连），入站消息汇总到同一个处理函数。
+    """
+
+    RECONNECT_BASE_DELAY = 5
+    MAX_RECONNECT_DELAY = 60
+    RECONNECT_JITTER = 0.5  # 实际延迟在 [delay * (1 - JITTER), delay] 内随机
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._clients: Dict[int, Any] = {}
+        self._reconnect_tasks: Dict[int, asyncio.Task] = {}
+        self._message_handler: Optional[Callable[[str, Optional[str]], None]] = None
+        self._delta_handler: Optional[Callable[[Optional[str], str, str], None]] = None
+        self._delivered = 0
+        self._reconnects = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """事件循环，第一次访问时启动循环线程"""
+        with self._lock:
+            if self._loop is None or not self._thread or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run_loop, args=(self._loop, ready),
+                    name="ChatConnectionHub", daemon=True
+                )
+                self._thread.start()
+                ready.wait(5)
+            return self._loop
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        logger.debug("[ChatHub] 事件循环线程启动")
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+            logger.debug("[ChatHub] 事件循环线程结束")
+
+    def run(self, coro: Coroutine) -> Future:
+        """在 hub 循环中执行协程（可从任意线程调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # ========================================
+    # 连接登记与重连调度
+    # ========================================
+
+    def register(self, client):
+        with self._lock:
+            self._clients[id(client)] = client
+
+    def unregister(self, client):
+        with self._lock:
+            self._clients.pop(id(client), None)
+        task = self._reconnect_tasks.pop(id(client), None)
+        if task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+
+    def reconnect_delay(self, attempt: int) -> float:
+        """第 attempt 次重连（从 1 开始）的等待时间"""
+        delay = min(self.RECONNECT_BASE_DELAY * (2 ** (attempt - 1)), self.MAX_RECONNECT_DELAY)
+        return delay * (1 - random.random() * self.RECONNECT_JITTER)
+
+    def schedule_reconnect(self, client, attempt: int, reconnect: Callable[[], Coroutine]) -> bool:
+        """在 hub 循环中调用：安排一次重连，同一连接同时只保留一个待执行的重连"""
+        key = id(client)
+        pending = self._reconnect_tasks.get(key)
+        if pending is not None and not pending.done():
+            return False
+        delay = self.reconnect_delay(attempt)
+        logger.info(f"[ChatHub] 计划重连 {getattr(client, 'name', None) or key}: 第 {attempt} 次, 延迟 {delay:.1f}s")
+
+        async def run():
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                # 先移除登记，重连失败时才能安排下一次
+                if self._reconnect_tasks.get(key) is task:
+                    del self._reconnect_tasks[key]
+            self._reconnects += 1
+            await reconnect()
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._reconnect_tasks[key] = task
+        return True
+
+    # ========================================
+    # 入站消息汇总
+    # ========================================
+
+    def set_message_handler(self, handler: Optional[Callable[[str, Optional[str]], None]]):
+        """设置统一的入站消息处理函数 handler(content, bot_name)，在 hub 线程中调用"""
+        self._message_handler = handler
+
+    def set_delta_handler(self, handler: Optional[Callable[[Optional[str], str, str], None]]):
+        """设置统一的流式增量处理函数 handler(bot_name, message_id, delta)，在 hub 线程中调用"""
+        self._delta_handler = handler
+
+    def deliver_delta(self, client, message_id: str, delta: str) -> bool:
+        callback = getattr(client, "_on_delta", None)
+        handler = self._delta_handler
+        if callback is None and handler is None:
+            return False
+        try:
+            if callback is not None:
+                callback(message_id, delta)
+            else:
+                handler(getattr(client, "name", None), message_id, delta)
+        except Exception as e:
+            logger.error(f"[ChatHub] 增量回调异常: {type(e).__name__}: {e}")
+        return True
+
+    def deliver(self, client, content: str) -> bool:
+        """把连接收到的消息交给客户端自己的回调，没有时交给 hub 的处理函数"""
+        callback = getattr(client, "_on_message", None)
+        handler = self._message_handler
+        if callback is None and handler is None:
+            return False
+        self._delivered += 1
+        try:
+            if callback is not None:
+                callback(content)
+            else:
+                handler(content, getattr(client, "name", None))
+        except Exception as e:
+            logger.error(f"[ChatHub] 消息回调异常: {type(e).__name__}: {e}")
+            logger.error(f"[ChatHub] 堆栈跟踪:\n{traceback.format_exc()}")
+        return True
+
+    # ========================================
+    # 状态
+    # ========================================
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            clients = list(self._clients.values())
+        return {
+            "loop_running": bool(self._loop and self._loop.is_running()),
+            "connections": len(clients),
+            "pending_reconnects": sum(1 for t in list(self._reconnect_tasks.values()) if not t.done()),
+            "reconnects": self._reconnects,
+            "delivered": self._delivered,
+            "clients": [client.get_stats() for client in clients],
+        }
+
+    def shutdown(self, timeout: float = 5):
+        """断开所有连接并停止循环线程"""
+        with self._lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception as e:
+                logger.error(f"[ChatHub] 断开连接异常: {e}")
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+
+
+_hub: Optional[ChatConnectionHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_chat_connection_hub() -> ChatConnectionHub:
+    """进程内共享的连接 hub"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = ChatConnectionHub()
+        return _hub
@@ -6,12 +6,13 @@ import uuid
 import time
 import traceback
 from datetime import datetime
-from typing import Optional, Callable
+from typing import Optional, Callable, Dict, List, Tuple
 from enum import Enum
-from queue import Queue
 
 from loguru import logger
 
+from .chat_connection_hub import ChatConnectionHub, get_chat_connection_hub
+
 try:
     import websockets
     from websockets.client import WebSocketClientProtocol
@@ -34,10 +35,14 @@ def _get_thread_id() -> str:
 
 
 class ClawbotChatClient:
-    DEFAULT_RECONNECT_DELAY = 5
-    MAX_RECONNECT_DELAY = 60
+    """单个 gateway 的 WebSocket 连接，运行在共享的 ChatConnectionHub 事件循环上"""
+
     PING_INTERVAL = 30
     MESSAGE_TIMEOUT = 30
+    SEND_COALESCE_MAX = 16  # 合并突发消息时单帧最多包含的消息数
+    # 流式输出：增量帧 {"type": "delta", "id": ..., "delta": ...}，以结束帧或同 id 的完整消息收尾
+    DELTA_TYPES = ("delta", "stream", "chunk")
+    STREAM_END_TYPES = ("done", "end", "stream_end")
 
     def __init__(
         self,
@@ -45,8 +50,23 @@ class ClawbotChatClient:
         on_message: Optional[Callable[[str], None]] = None,
         on_status_changed: Optional[Callable[[ConnectionStatus], None]] = None,
         reconnect: bool = True,
-        max_reconnect_attempts: int = 3
+        max_reconnect_attempts: int = 3,
+        coalesce_burst: bool = False,
+        name: Optional[str] = None,
+        hub: Optional[ChatConnectionHub] = None,
+        on_delta: Optional[Callable[[str, str], None]] = None
     ):
+        """coalesce_burst 为 True 时，发送队列中积压的多条消息会合并为一帧
+        （内容以空行连接），只适用于纯文本聊天消息。
+
+        未设置 on_message 时，收到的消息交给 hub 的统一处理函数，并附带 name。
+        流式回复的每个增量通过 on_delta(message_id, delta)（或 hub 的增量处理函数）
+        送出，结束后完整内容仍按普通消息送出一次。
+        """
+        self.name = name
+        self._on_delta = on_delta
+        self._streams: Dict[str, List[str]] = {}  # 消息 id -> 已收到的增量
+        self._hub = hub or get_chat_connection_hub()
         self._gateway_url = gateway_url
         self._on_message = on_message
         self._on_status_changed = on_status_changed
@@ -59,15 +79,21 @@ class ClawbotChatClient:
         self._running = False
         
         self._loop: Optional[asyncio.AbstractEventLoop] = None
-        self._loop_thread: Optional[threading.Thread] = None
         
-        self._send_queue = Queue()
+        # 发送队列在 connect() 中随事件循环创建，元素为 (入队时间, 消息体)
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._unsent: Optional[Tuple[float, str]] = None  # 发送失败、等待重连后重发的帧
+        self._connection_tasks: list = []
+        self._coalesce_burst = coalesce_burst
         
         self._lock = threading.Lock()
         
         self._message_count = 0
         self._error_count = 0
         self._last_message_time = None
+        self._sent_count = 0
+        self._sent_frames = 0
+        self._send_latency_total = 0.0
         
         logger.info(f"[ChatClient] 初始化完成, URL: {gateway_url}, 线程: {_get_thread_id()}")
 
@@ -109,8 +135,7 @@ class ClawbotChatClient:
             "websocket_exists": self._websocket is not None,
             "loop_exists": self._loop is not None,
             "loop_running": self._loop.is_running() if self._loop else False,
-            "thread_alive": self._loop_thread.is_alive() if self._loop_thread else False,
-            "send_queue_size": self._send_queue.qsize(),
+            "send_queue_size": self._send_queue.qsize() if self._send_queue else 0,
             "message_count": self._message_count,
             "error_count": self._error_count,
             "reconnect_attempts": self._reconnect_attempts
@@ -138,32 +163,13 @@ class ClawbotChatClient:
         self._running = True
 
         try:
-            logger.debug(f"[ChatClient] 创建新事件循环, 当前线程: {_get_thread_id()}")
-            self._loop = asyncio.new_event_loop()
-            
-            self._loop_thread = threading.Thread(
-                target=self._run_event_loop,
-                daemon=True,
-                name=f"ChatClient-{self._gateway_url.split('//')[1].split('/')[0]}"
-            )
-            
-            logger.debug(f"[ChatClient] 启动事件循环线程: {self._loop_thread.name}")
-            self._loop_thread.start()
-            
-            logger.debug("[ChatClient] 等待事件循环线程就绪...")
-            time.sleep(0.1)
-            
-            if not self._loop_thread.is_alive():
-                logger.error("[ChatClient] 事件循环线程启动失败")
-                self._set_status(ConnectionStatus.ERROR)
-                self._running = False
-                return False
+            self._loop = self._hub.loop
+            self._send_queue = asyncio.Queue()
+            self._unsent = None
+            self._hub.register(self)
             
             logger.debug("[ChatClient] 开始异步连接...")
-            future = asyncio.run_coroutine_threadsafe(
-                self._async_connect(),
-                self._loop
-            )
+            future = self._hub.run(self._async_connect())
             
             success = future.result(timeout=30)
             logger.info(f"[ChatClient] 连接完成，结果: {success}, 上下文: {self._get_connection_context()}")
@@ -185,30 +191,6 @@ class ClawbotChatClient:
             self._running = False
             return False
 
-    def _run_event_loop(self):
-        thread_id = _get_thread_id()
-        logger.debug(f"[ChatClient.EventLoop] 事件循环线程启动: {thread_id}")
-        
-        asyncio.set_event_loop(self._loop)
-        
-        iteration = 0
-        while self._running:
-            iteration += 1
-            try:
-                logger.debug(f"[ChatClient.EventLoop] 开始运行事件循环 (迭代: {iteration})")
-                self._loop.run_forever()
-                logger.debug(f"[ChatClient.EventLoop] 事件循环正常退出 (迭代: {iteration})")
-            except Exception as e:
-                self._error_count += 1
-                logger.error(f"[ChatClient.EventLoop] 事件循环异常 (迭代: {iteration}): {type(e).__name__}: {e}")
-                logger.error(f"[ChatClient.EventLoop] 堆栈跟踪:\n{traceback.format_exc()}")
-                
-                if self._running:
-                    logger.info("[ChatClient.EventLoop] 尝试恢复事件循环...")
-                    time.sleep(1)
-                    
-        logger.debug(f"[ChatClient.EventLoop] 事件循环线程结束: {thread_id}")
-
     async def _async_connect(self) -> bool:
         logger.info(f"[ChatClient.Async] 开始异步连接到: {self._gateway_url}")
         logger.debug(f"[ChatClient.Async] 连接参数: ping_interval={self.PING_INTERVAL}, "
@@ -237,10 +219,10 @@ class ClawbotChatClient:
 
             receive_task = asyncio.create_task(self._receive_loop())
             send_task = asyncio.create_task(self._send_loop())
-            ping_task = asyncio.create_task(self._ping_loop())
+            self._connection_tasks = [send_task]
             
             logger.debug(f"[ChatClient.Async] 已启动任务: receive={receive_task.get_name()}, "
-                        f"send={send_task.get_name()}, ping={ping_task.get_name()}")
+                        f"send={send_task.get_name()}")
 
             logger.info(f"[ChatClient.Async] 成功连接到 {self._gateway_url}")
             return True
@@ -251,16 +233,16 @@ class ClawbotChatClient:
             logger.error("[ChatClient.Async] 请确认 clawbot gateway 是否正在运行，端口是否正确")
             logger.error(f"[ChatClient.Async] 上下文: {self._get_connection_context()}")
             self._set_status(ConnectionStatus.ERROR)
-            if self._reconnect and self._reconnect_attempts < self._max_reconnect_attempts:
-                asyncio.create_task(self._schedule_reconnect())
+            if self._reconnect_attempts < self._max_reconnect_attempts:
+                self._request_reconnect()
             return False
         except asyncio.TimeoutError as e:
             self._error_count += 1
             logger.error(f"[ChatClient.Async] ❌ 连接超时: {e}")
             logger.error(f"[ChatClient.Async] 上下文: {self._get_connection_context()}")
             self._set_status(ConnectionStatus.ERROR)
-            if self._reconnect and self._reconnect_attempts < self._max_reconnect_attempts:
-                asyncio.create_task(self._schedule_reconnect())
+            if self._reconnect_attempts < self._max_reconnect_attempts:
+                self._request_reconnect()
             return False
         except Exception as e:
             self._error_count += 1
@@ -268,8 +250,8 @@ class ClawbotChatClient:
             logger.error(f"[ChatClient.Async] 堆栈跟踪:\n{traceback.format_exc()}")
             logger.error(f"[ChatClient.Async] 上下文: {self._get_connection_context()}")
             self._set_status(ConnectionStatus.ERROR)
-            if self._reconnect and self._reconnect_attempts < self._max_reconnect_attempts:
-                asyncio.create_task(self._schedule_reconnect())
+            if self._reconnect_attempts < self._max_reconnect_attempts:
+                self._request_reconnect()
             return False
 
     async def _receive_loop(self):
@@ -294,7 +276,7 @@ class ClawbotChatClient:
                 logger.debug(f"[ChatClient.RX] 收到消息 #{message_count} "
                            f"(长度: {len(message)}, 接收耗时: {receive_elapsed:.2f}ms)")
 
-                if message and self._on_message:
+                if message:
                     callback_start = time.perf_counter()
                     try:
                         data = json.loads(message)
@@ -304,30 +286,22 @@ class ClawbotChatClient:
                             logger.debug("[ChatClient.RX] 收到 ping 消息，忽略")
                             continue
                         
+                        if self._handle_stream_frame(data, msg_type):
+                            continue
+                        
                         content = data.get("content", data.get("message", str(message)))
                         content_preview = content[:100] + "..." if len(content) > 100 else content
                         logger.debug(f"[ChatClient.RX] 提取内容 (类型: {msg_type}, "
                                    f"长度: {len(content)}, 预览: {content_preview})")
                         
-                        try:
-                            self._on_message(content)
-                            callback_elapsed = (time.perf_counter() - callback_start) * 1000
-                            logger.debug(f"[ChatClient.RX] 消息回调完成, 耗时: {callback_elapsed:.2f}ms")
-                        except Exception as callback_error:
-                            self._error_count += 1
-                            logger.error(f"[ChatClient.RX] 消息回调异常: {type(callback_error).__name__}: {callback_error}")
-                            logger.error(f"[ChatClient.RX] 消息内容预览: {content_preview}")
-                            logger.error(f"[ChatClient.RX] 堆栈跟踪:\n{traceback.format_exc()}")
+                        self._hub.deliver(self, content)
+                        callback_elapsed = (time.perf_counter() - callback_start) * 1000
+                        logger.debug(f"[ChatClient.RX] 消息回调完成, 耗时: {callback_elapsed:.2f}ms")
                             
                     except json.JSONDecodeError as e:
                         logger.warning(f"[ChatClient.RX] JSON 解析失败: {e}, "
                                      f"原始消息前100字符: {message[:100]}")
-                        if self._on_message:
-                            try:
-                                self._on_message(str(message))
-                            except Exception as callback_error:
-                                self._error_count += 1
-                                logger.error(f"[ChatClient.RX] 原始消息回调异常: {callback_error}")
+                        self._hub.deliver(self, str(message))
 
             except asyncio.TimeoutError:
                 logger.debug("[ChatClient.RX] 接收超时，继续等待...")
@@ -360,9 +334,54 @@ class ClawbotChatClient:
 
         logger.debug(f"[ChatClient.RX] 接收循环结束, 共处理 {message_count} 条消息, "
                    f"线程: {_get_thread_id()}")
+        self._cancel_connection_tasks()
         if self._running and self._reconnect:
             logger.info("[ChatClient.RX] 触发重连...")
-            asyncio.create_task(self._schedule_reconnect())
+            self._request_reconnect()
+
+    def _handle_stream_frame(self, data: dict, msg_type: Optional[str]) -> bool:
+        """处理流式增量 / 结束帧，返回 True 表示该帧已处理"""
+        message_id = str(data.get("id") or data.get("message_id") or "")
+        if msg_type in self.DELTA_TYPES:
+            delta = data.get("delta", data.get("content")) or ""
+            self._streams.setdefault(message_id, []).append(delta)
+            if delta:
+                self._hub.deliver_delta(self, message_id, delta)
+            if not data.get("done"):
+                return True
+            content = "".join(self._streams.pop(message_id, []))
+        elif msg_type in self.STREAM_END_TYPES:
+            parts = self._streams.pop(message_id, [])
+            content = data.get("content") or "".join(parts)
+        elif message_id and message_id in self._streams:
+            # 同 id 的完整消息作为流的结尾
+            self._streams.pop(message_id)
+            return False
+        else:
+            return False
+        
+        logger.debug(f"[ChatClient.RX] 流式消息结束 (ID: {message_id}, 长度: {len(content)})")
+        if content:
+            self._hub.deliver(self, content)
+        return True
+
+    def _cancel_connection_tasks(self):
+        """结束当前连接的发送任务，重连时会重新创建"""
+        for task in self._connection_tasks:
+            if not task.done():
+                task.cancel()
+        self._connection_tasks = []
+        self._streams.clear()
+
+    def _coalesce(self, payload: dict) -> Tuple[dict, int]:
+        """把队列中已积压的消息与当前消息合并为一帧"""
+        contents = [payload["content"]]
+        while len(contents) < self.SEND_COALESCE_MAX and not self._send_queue.empty():
+            _, queued = self._send_queue.get_nowait()
+            contents.append(queued["content"])
+        if len(contents) == 1:
+            return payload, 1
+        return {**payload, "content": "\n\n".join(contents)}, len(contents)
 
     async def _send_loop(self):
         logger.debug(f"[ChatClient.TX] 发送循环已启动, 线程: {_get_thread_id()}")
@@ -373,35 +392,43 @@ class ClawbotChatClient:
                 if not self._websocket:
                     logger.warning("[ChatClient.TX] WebSocket 已断开，退出发送循环")
                     break
-                    
-                if not self._send_queue.empty():
-                    queue_size = self._send_queue.qsize()
-                    message = self._send_queue.get_nowait()
-                    
-                    send_start = time.perf_counter()
-                    try:
-                        await self._websocket.send(message)
-                        send_elapsed = (time.perf_counter() - send_start) * 1000
-                        sent_count += 1
-                        
-                        logger.debug(f"[ChatClient.TX] 消息已发送 #{sent_count} "
-                                   f"(长度: {len(message)}, 耗时: {send_elapsed:.2f}ms, "
-                                   f"队列剩余: {queue_size - 1})")
-                    except websockets.exceptions.ConnectionClosed as e:
-                        logger.warning(f"[ChatClient.TX] 发送时连接已关闭: code={e.code}")
-                        self._send_queue.put(message)
-                        break
-                    except Exception as send_error:
-                        self._error_count += 1
-                        if hasattr(send_error, 'code'):
-                            logger.warning(f"[ChatClient.TX] 发送时连接已关闭: code={send_error.code}")
-                        else:
-                            logger.error(f"[ChatClient.TX] 发送失败: {type(send_error).__name__}: {send_error}")
-                            logger.error(f"[ChatClient.TX] 堆栈跟踪:\n{traceback.format_exc()}")
-                        self._send_queue.put(message)
-                        break
+                
+                if self._unsent is not None:
+                    enqueued_at, message = self._unsent
+                    self._unsent = None
+                    merged = 1
                 else:
-                    await asyncio.sleep(0.01)
+                    # 直接等待队列，空闲时不产生任何唤醒
+                    enqueued_at, payload = await self._send_queue.get()
+                    merged = 1
+                    if self._coalesce_burst:
+                        payload, merged = self._coalesce(payload)
+                    message = json.dumps(payload)
+                
+                try:
+                    await self._websocket.send(message)
+                    latency = (time.perf_counter() - enqueued_at) * 1000
+                    sent_count += 1
+                    self._sent_count += merged
+                    self._sent_frames += 1
+                    self._send_latency_total += latency
+                    
+                    logger.debug(f"[ChatClient.TX] 消息已发送 #{sent_count} "
+                               f"(长度: {len(message)}, 合并: {merged}, 入队到发出: {latency:.2f}ms, "
+                               f"队列剩余: {self._send_queue.qsize()})")
+                except websockets.exceptions.ConnectionClosed as e:
+                    logger.warning(f"[ChatClient.TX] 发送时连接已关闭: code={e.code}")
+                    self._unsent = (enqueued_at, message)
+                    break
+                except Exception as send_error:
+                    self._error_count += 1
+                    if hasattr(send_error, 'code'):
+                        logger.warning(f"[ChatClient.TX] 发送时连接已关闭: code={send_error.code}")
+                    else:
+                        logger.error(f"[ChatClient.TX] 发送失败: {type(send_error).__name__}: {send_error}")
+                        logger.error(f"[ChatClient.TX] 堆栈跟踪:\n{traceback.format_exc()}")
+                    self._unsent = (enqueued_at, message)
+                    break
             except asyncio.CancelledError:
                 logger.debug("[ChatClient.TX] 发送循环被取消")
                 break
@@ -411,54 +438,24 @@ class ClawbotChatClient:
                 logger.error(f"[ChatClient.TX] 堆栈跟踪:\n{traceback.format_exc()}")
                 break
 
-        logger.debug(f"[ChatClient.TX] 发送循环结束, 共发送 {sent_count} 条消息, "
+        logger.debug(f"[ChatClient.TX] 发送循环结束, 共发送 {sent_count} 帧, "
                    f"线程: {_get_thread_id()}")
 
-    async def _ping_loop(self):
-        logger.debug(f"[ChatClient.Ping] ping 循环已启动, 间隔: {self.PING_INTERVAL}s")
-        ping_count = 0
-        
-        while self._running and self._websocket:
-            try:
-                await asyncio.sleep(self.PING_INTERVAL)
-                if self._websocket and self._running:
-                    ping_start = time.perf_counter()
-                    await self._websocket.ping()
-                    ping_elapsed = (time.perf_counter() - ping_start) * 1000
-                    ping_count += 1
-                    logger.debug(f"[ChatClient.Ping] ping #{ping_count} 完成, 耗时: {ping_elapsed:.2f}ms")
-            except websockets.exceptions.ConnectionClosed as e:
-                logger.warning(f"[ChatClient.Ping] ping 时连接已关闭: code={e.code}")
-                break
-            except asyncio.CancelledError:
-                logger.debug("[ChatClient.Ping] ping 循环被取消")
-                break
-            except Exception as e:
-                self._error_count += 1
-                logger.error(f"[ChatClient.Ping] ping 异常: {type(e).__name__}: {e}")
-                break
-                
-        logger.debug(f"[ChatClient.Ping] ping 循环结束, 共发送 {ping_count} 次")
-
-    async def _schedule_reconnect(self):
+    def _request_reconnect(self):
+        """在 hub 循环中调用：由 hub 按退避 + 抖动安排下一次重连"""
+        if not self._running or not self._reconnect:
+            return
         if self._reconnect_attempts >= self._max_reconnect_attempts:
             logger.error(f"[ChatClient.Reconnect] 达到最大重连次数 {self._max_reconnect_attempts}")
             self._set_status(ConnectionStatus.ERROR)
             return
 
-        self._set_status(ConnectionStatus.RECONNECTING)
-        self._reconnect_attempts += 1
-
-        delay = min(
-            self.DEFAULT_RECONNECT_DELAY * (2 ** (self._reconnect_attempts - 1)),
-            self.MAX_RECONNECT_DELAY
-        )
-
-        logger.info(f"[ChatClient.Reconnect] 计划重连 (尝试 {self._reconnect_attempts}/{self._max_reconnect_attempts}), "
-                   f"延迟: {delay}s, 上下文: {self._get_connection_context()}")
-
-        await asyncio.sleep(delay)
-        await self._async_connect()
+        attempt = self._reconnect_attempts + 1
+        if self._hub.schedule_reconnect(self, attempt, self._async_connect):
+            self._reconnect_attempts = attempt
+            self._set_status(ConnectionStatus.RECONNECTING)
+            logger.info(f"[ChatClient.Reconnect] 已安排重连 (尝试 {attempt}/{self._max_reconnect_attempts}), "
+                       f"上下文: {self._get_connection_context()}")
 
     def send_message(self, message: str) -> bool:
         logger.debug(f"[ChatClient.TX] 发送消息请求 (长度: {len(message)}), 线程: {_get_thread_id()}")
@@ -480,12 +477,12 @@ class ClawbotChatClient:
                 "timestamp": time.time()
             }
             
-            message_json = json.dumps(payload)
-            queue_size = self._send_queue.qsize()
-            self._send_queue.put(message_json)
+            # asyncio.Queue 不是线程安全的，交给事件循环线程入队
+            self._loop.call_soon_threadsafe(
+                self._send_queue.put_nowait, (time.perf_counter(), payload)
+            )
             
-            logger.debug(f"[ChatClient.TX] 消息已加入发送队列 (ID: {payload['id']}, "
-                        f"队列大小: {queue_size + 1})")
+            logger.debug(f"[ChatClient.TX] 消息已加入发送队列 (ID: {payload['id']})")
             return True
 
         except Exception as e:
@@ -502,7 +499,9 @@ class ClawbotChatClient:
         
         self._running = False
         self._reconnect = False
+        self._hub.unregister(self)
 
+        # hub 的事件循环由所有连接共用，这里只关闭本连接
         if self._loop and self._loop.is_running():
             try:
                 logger.debug("[ChatClient] 正在关闭 WebSocket...")
@@ -514,17 +513,6 @@ class ClawbotChatClient:
                 logger.debug("[ChatClient] WebSocket 已关闭")
             except Exception as e:
                 logger.error(f"[ChatClient] 关闭 WebSocket 异常: {type(e).__name__}: {e}")
-            
-            logger.debug("[ChatClient] 正在停止事件循环...")
-            self._loop.call_soon_threadsafe(self._loop.stop)
-            
-        if self._loop_thread and self._loop_thread.is_alive():
-            logger.debug(f"[ChatClient] 等待事件循环线程结束 (线程: {self._loop_thread.name})...")
-            self._loop_thread.join(timeout=3)
-            if self._loop_thread.is_alive():
-                logger.warning("[ChatClient] 事件循环线程未能在超时内结束")
-            else:
-                logger.debug("[ChatClient] 事件循环线程已结束")
 
         self._set_status(ConnectionStatus.DISCONNECTED)
         self._websocket = None
@@ -533,6 +521,7 @@ class ClawbotChatClient:
                    f"错误数={self._error_count}")
 
     async def _async_disconnect(self):
+        self._cancel_connection_tasks()
         if self._websocket:
             try:
                 await self._websocket.close()
@@ -545,17 +534,23 @@ class ClawbotChatClient:
         logger.debug(f"[ChatClient] 设置消息回调: {callback.__name__ if hasattr(callback, '__name__') else 'lambda'}")
         self._on_message = callback
 
+    def set_on_delta(self, callback: Callable[[str, str], None]):
+        self._on_delta = callback
+
     def set_on_status_changed(self, callback: Callable[[ConnectionStatus], None]):
         logger.debug(f"[ChatClient] 设置状态回调: {callback.__name__ if hasattr(callback, '__name__') else 'lambda'}")
         self._on_status_changed = callback
         
     def get_stats(self) -> dict:
         return {
+            "name": self.name,
             "gateway_url": self._gateway_url,
             "status": self._status.value,
             "message_count": self._message_count,
             "error_count": self._error_count,
             "last_message_time": self._last_message_time,
             "reconnect_attempts": self._reconnect_attempts,
-            "send_queue_size": self._send_queue.qsize()
+            "send_queue_size": self._send_queue.qsize() if self._send_queue else 0,
+            "sent_count": self._sent_count,
+            "avg_send_latency_ms": self._send_latency_total / self._sent_frames if self._sent_frames else 0.0
         }
@@ -1,6 +1,11 @@
 from .service import EmbeddingService, register_embedding_service
 from .embedder import Embedder
 from .server import create_app, run_server
+from .batcher import MicroBatcher
+from .cache import EmbeddingCache
+from .tokenizer import load_tokenizer
+from .vector_index import VectorStore, Collection
+from .output import decode_embeddings
 
 __all__ = [
     "EmbeddingService",
@@ -8,4 +13,10 @@ __all__ = [
     "Embedder",
     "create_app",
     "run_server",
+    "MicroBatcher",
+    "EmbeddingCache",
+    "load_tokenizer",
+    "VectorStore",
+    "Collection",
+    "decode_embeddings",
 ]
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingRequest:
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """请求微批处理器
+    
+    并发的 /embed 请求先进入 asyncio 队列，后台 worker 在 max_wait_ms 内
+    尽量合并到 max_batch_size 条文本，在线程池中执行一次推理，再把结果
+    按请求拆分返回。推理不在事件循环线程中执行。
+    """
+    
+    LATENCY_WINDOW = 2048  # 用于计算分位数的最近请求数
+    
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        self._embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._owns_executor = executor is None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        
+        self._requests = 0
+        self._texts = 0
+        self._batches = 0
+        self._latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self._queue_waits: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+    
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._worker is None:
+            return
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+    
+    async def submit(self, texts: List[str]) -> np.ndarray:
+        """提交一组文本，返回对应的 (len(texts), dim) 向量数组"""
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher 未启动")
+        request = _PendingRequest(texts=list(texts), future=asyncio.get_running_loop().create_future())
+        await self._queue.put(request)
+        try:
+            return await request.future
+        finally:
+            self._latencies.append(time.perf_counter() - request.enqueued_at)
+    
+    async def _collect(self, first: _PendingRequest) -> tuple:
+        """以 first 为首收集一批请求，返回 (批次, 是否收到停止信号)"""
+        loop = asyncio.get_running_loop()
+        batch = [first]
+        count = len(first.texts)
+        deadline = loop.time() + self.max_wait
+        
+        while count < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            count += len(item.texts)
+        return batch, False
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            
+            batch, stopping = await self._collect(first)
+            started = time.perf_counter()
+            for request in batch:
+                self._queue_waits.append(started - request.enqueued_at)
+            
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self._embed_fn, texts)
+            except Exception as e:
+                logger.error(f"批量嵌入失败: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            
+            offset = 0
+            for request in batch:
+                n = len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(embeddings[offset:offset + n])
+                offset += n
+            
+            self._batches += 1
+            self._requests += len(batch)
+            self._texts += len(texts)
+    
+    def stats(self) -> dict:
+        """吞吐与延迟统计（延迟单位毫秒，基于最近 LATENCY_WINDOW 个请求）"""
+        def percentile(values, q):
+            if not values:
+                return 0.0
+            return float(np.percentile(np.fromiter(values, dtype=np.float64), q) * 1000)
+        
+        return {
+            "requests": self._requests,
+            "texts": self._texts,
+            "batches": self._batches,
+            "avg_batch_texts": self._texts / self._batches if self._batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "latency_p50_ms": percentile(self._latencies, 50),
+            "latency_p99_ms": percentile(self._latencies, 99),
+            "queue_wait_p99_ms": percentile(self._queue_waits, 99),
+        }
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 20  # sha1 digest
+META_INTERVAL = 2.0  # meta.json 最多每隔这么久写一次（秒）
+
+
+class _DiskTier:
+    """磁盘缓存层：环形缓冲区，向量与 key 分别保存在两个 memmap 文件中
+    
+    文件按需倍增到 capacity 条，写满后覆盖最旧的条目。meta.json 记录模型、
+    维度、容量和写入位置；模型或维度变化时整体重建。put_many 只标记 dirty，
+    meta.json 由调用方通过 flush / write_meta 择机写入。
+    """
+    
+    INITIAL_ROWS = 1024
+    
+    def __init__(self, directory: str, model_id: str, dimension: int, capacity: int):
+        self.directory = directory
+        self.model_id = model_id
+        self.dimension = dimension
+        self.capacity = capacity
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.bin")
+        self.count = 0  # 已写入的条目数（不超过 capacity）
+        self.next_slot = 0
+        self.rows = 0  # 文件当前可容纳的条目数
+        self.vectors: Optional[np.memmap] = None
+        self.keys: Optional[np.memmap] = None
+        self.slots: Dict[bytes, int] = {}
+        self.dirty = False
+        self._open()
+    
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = None
+        if os.path.exists(self._meta_path):
+            try:
+                with open(self._meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+        
+        reuse = (
+            meta is not None
+            and meta.get("model_id") == self.model_id
+            and meta.get("dimension") == self.dimension
+            and meta.get("capacity") == self.capacity
+            and os.path.exists(self._vectors_path)
+            and os.path.exists(self._keys_path)
+        )
+        if reuse:
+            self.count = int(meta.get("count", 0))
+            self.next_slot = int(meta.get("next_slot", 0))
+            self._map(int(meta.get("rows", self.count)) or self.INITIAL_ROWS)
+            for slot in range(self.count):
+                self.slots[self.keys[slot].tobytes()] = slot
+            logger.info(f"磁盘向量缓存已加载: {self.count} 条")
+        else:
+            for path in (self._vectors_path, self._keys_path):
+                with open(path, "wb"):
+                    pass
+            self._map(min(self.INITIAL_ROWS, self.capacity))
+            self.write_meta()
+    
+    def _map(self, rows: int):
+        """把两个文件扩展到 rows 条并重新映射"""
+        # 先释放旧映射，Windows 上不能调整已映射文件的大小
+        self.vectors = None
+        self.keys = None
+        for path, row_bytes in ((self._vectors_path, self.dimension * 4), (self._keys_path, KEY_SIZE)):
+            size = rows * row_bytes
+            if os.path.getsize(path) < size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dimension))
+        self.keys = np.memmap(self._keys_path, dtype=np.uint8, mode="r+", shape=(rows, KEY_SIZE))
+        self.rows = rows
+    
+    def meta(self) -> dict:
+        return {
+            "model_id": self.model_id,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+            "count": self.count,
+            "next_slot": self.next_slot,
+            "rows": self.rows,
+        }
+    
+    def write_meta(self, meta: Optional[dict] = None):
+        """写入 meta.json；meta 为调用方在锁内取得的快照时，可以在锁外调用"""
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta or self.meta(), f)
+        os.replace(tmp_path, self._meta_path)
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        return np.array(self.vectors[slot])
+    
+    def put_many(self, items: List[tuple]):
+        for key, vector in items:
+            if key in self.slots:
+                continue
+            slot = self.next_slot
+            if slot >= self.rows:
+                self.flush()
+                self._map(min(self.rows * 2, self.capacity))
+            if self.count == self.capacity:
+                # 覆盖最旧的条目
+                self.slots.pop(self.keys[slot].tobytes(), None)
+            else:
+                self.count += 1
+            self.vectors[slot] = vector
+            self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self.slots[key] = slot
+            self.next_slot = (slot + 1) % self.capacity
+            self.dirty = True
+    
+    def flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        if self.dirty:
+            self.dirty = False
+            self.write_meta()
+    
+    @property
+    def nbytes(self) -> int:
+        return self.count * (self.dimension * 4 + KEY_SIZE)
+
+
+class EmbeddingCache:
+    """内容寻址的向量缓存
+    
+    key 为 sha1(模型标识 + NFC 规范化文本)。内存层是按字节数限制的 LRU，
+    可选的磁盘层使用 memmap 文件，服务重启后仍然有效；磁盘命中会提升到内存层。
+    
+    put_many 只同步写内存层，磁盘层由后台线程攒批写入，meta.json 最多每
+    META_INTERVAL 秒写一次，调用方（通常在事件循环中）不会被磁盘 IO 阻塞。
+    
+    内存层由 _lock 保护，磁盘层由单独的 _disk_lock 保护；get_many 不等待
+    磁盘锁，写入线程正在写盘（含文件扩容重映射）时磁盘层查询按未命中处理。
+    """
+    
+    def __init__(self, model_id: str, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_capacity: int = 200_000):
+        self.model_id = model_id
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_capacity = disk_capacity
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional[_DiskTier] = None
+        self._lock = threading.Lock()  # 保护内存层与统计
+        self._disk_lock = threading.Lock()  # 保护 _disk
+        self._disk_cond = threading.Condition()  # 保护 _disk_queue
+        self._disk_queue: List[tuple] = []
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._disk_writes = 0
+        
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+    
+    def key(self, text: str) -> bytes:
+        normalized = unicodedata.normalize("NFC", text)
+        return hashlib.sha1(f"{self.model_id}\0{normalized}".encode("utf-8")).digest()
+    
+    def _ensure_disk(self, dimension: int) -> Optional[_DiskTier]:
+        if self._disk is None and self.disk_dir:
+            try:
+                self._disk = _DiskTier(self.disk_dir, self.model_id, dimension, self.disk_capacity)
+            except Exception as e:
+                logger.warning(f"磁盘向量缓存不可用，仅使用内存缓存: {e}")
+                self.disk_dir = None
+        return self._disk
+    
+    def open_disk(self, dimension: int):
+        """按模型维度打开磁盘层（启动时调用，以便重启后立即命中）"""
+        with self._disk_lock:
+            self._ensure_disk(dimension)
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """按顺序查询缓存，未命中的位置为 None"""
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    results[i] = vector
+                else:
+                    missing.append(i)
+        
+        found = []
+        if missing and self._disk is not None and self._disk_lock.acquire(blocking=False):
+            try:
+                for i in missing:
+                    vector = self._disk.get(keys[i])
+                    if vector is not None:
+                        results[i] = vector
+                        found.append((keys[i], vector))
+            finally:
+                self._disk_lock.release()
+        
+        if missing:
+            with self._lock:
+                for key, vector in found:
+                    self._remember(key, vector)
+                self._disk_hits += len(found)
+                self._misses += len(missing) - len(found)
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """写入缓存：内存层立即写入，磁盘层交给后台线程"""
+        if not texts:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        items = [(self.key(text), vectors[i].copy()) for i, text in enumerate(texts)]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+        if not self.disk_dir:
+            return
+        with self._disk_cond:
+            if self._closed:
+                return
+            self._disk_queue.extend(items)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="EmbeddingCacheWriter", daemon=True)
+                self._writer.start()
+            self._disk_cond.notify()
+    
+    def _take_disk_queue(self) -> List[tuple]:
+        with self._disk_cond:
+            batch, self._disk_queue = self._disk_queue, []
+        return batch
+    
+    def _write_disk(self, batch: List[tuple]):
+        if not batch:
+            return
+        dimension = batch[0][1].shape[0]
+        with self._disk_lock:
+            disk = self._ensure_disk(dimension)
+            if disk is not None and disk.dimension == dimension:
+                disk.put_many(batch)
+                self._disk_writes += 1
+    
+    def _write_meta(self):
+        with self._disk_lock:
+            disk = self._disk
+            if disk is None or not disk.dirty:
+                return
+            disk.dirty = False
+            meta = disk.meta()
+        try:
+            disk.write_meta(meta)
+        except OSError as e:
+            logger.warning(f"写入磁盘向量缓存 meta 失败: {e}")
+    
+    def _writer_loop(self):
+        last_meta = time.monotonic()
+        while True:
+            with self._disk_cond:
+                # 有数据立即写；空闲时最多等 META_INTERVAL，把落后的 meta 补上
+                self._disk_cond.wait_for(lambda: self._disk_queue or self._closed, META_INTERVAL)
+                closed = self._closed
+            batch = self._take_disk_queue()
+            try:
+                self._write_disk(batch)
+            except Exception as e:
+                logger.warning(f"写入磁盘向量缓存失败 ({len(batch)} 条): {e}")
+            now = time.monotonic()
+            if closed or not batch or now - last_meta >= META_INTERVAL:
+                self._write_meta()
+                last_meta = now
+            if closed:
+                return
+    
+    def flush(self):
+        """把排队的条目写入磁盘层并落盘（阻塞，不要在事件循环中频繁调用）"""
+        self._write_disk(self._take_disk_queue())
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.flush()
+    
+    def close(self):
+        """停止写入线程并落盘"""
+        with self._disk_cond:
+            self._closed = True
+            self._disk_cond.notify_all()
+            writer = self._writer
+        if writer is not None:
+            writer.join(5)
+        self.flush()
+    
+    def stats(self) -> dict:
+        disk = self._disk
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            hits = self._memory_hits + self._disk_hits
+            return {
+                "lookups": lookups,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": disk.count if disk is not None else 0,
+                "disk_pending": len(self._disk_queue),
+                "disk_writes": self._disk_writes,
+                "disk_bytes": disk.nbytes if disk is not None else 0,
+            }
@@ -1,122 +1,352 @@
 # -*- coding: utf-8 -*-
 import os
+import hashlib
 import logging
-from typing import Optional
+import platform
+import queue
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import numpy as np
 
+from .tokenizer import load_tokenizer
+
 logger = logging.getLogger(__name__)
 
 
+def _available_cores() -> List[int]:
+    """当前进程可用的逻辑 CPU（0 起始编号）"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _split_cores(cores: List[int], parts: int) -> List[List[int]]:
+    """把核心列表尽量平均地切成 parts 份互不相交的集合"""
+    parts = max(1, min(parts, len(cores)))
+    size, extra = divmod(len(cores), parts)
+    result = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        result.append(cores[start:end])
+        start = end
+    return result
+
+
+class _SessionPool:
+    """多个 InferenceSession 的分发器：空闲会话放在队列中，调用方借用后归还"""
+    
+    def __init__(self, sessions: list):
+        self.sessions = sessions
+        self._idle: "queue.Queue" = queue.Queue()
+        for session in sessions:
+            self._idle.put(session)
+    
+    def __len__(self) -> int:
+        return len(self.sessions)
+    
+    def run(self, ort_inputs: dict):
+        session = self._idle.get()
+        try:
+            return session.run(None, ort_inputs)
+        finally:
+            self._idle.put(session)
+
+
 class Embedder:
-    """Embedding 模型包装器"""
+    """Embedding 模型包装器
     
-    def __init__(self, model_path: str, dimension: Optional[int] = None):
+    输入按 token 长度排序后分批，每批只 padding 到批内最长序列，
+    输出再按原顺序还原。num_sessions > 1 时创建多个会话，各自绑定到
+    互不相交的 CPU 核心集合，一次调用内的多个批次并发执行。
+    """
+    
+    MAX_LENGTH = 512
+    MAX_BATCH_SIZE = 64
+    MAX_BATCH_TOKENS = 8192  # 每批 padding 后的 token 总数上限
+    DEFAULT_PAST_SHAPE = (8, 128)  # past_key_values 的 (num_heads, head_dim) 默认值
+    WARMUP_LENGTHS = (16, 64, 256, 512)
+    
+    def __init__(self, model_path: str, dimension: Optional[int] = None,
+                 max_batch_size: Optional[int] = None, max_batch_tokens: Optional[int] = None,
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+                 execution_mode: str = "sequential", enable_cpu_mem_arena: bool = True,
+                 enable_mem_pattern: bool = True, num_sessions: int = 1, pin_cores: bool = True,
+                 optimized_model_dir: Optional[str] = None):
+        """
+        Args:
+            intra_op_threads: 每个会话的算子内线程数；为空时单会话交给 ORT 决定，
+                多会话时取分到的核心数
+            inter_op_threads: 算子间线程数（仅 parallel 执行模式有效）
+            execution_mode: "sequential" 或 "parallel"
+            enable_cpu_mem_arena / enable_mem_pattern: ORT 内存分配选项，
+                动态 padding 下输入形状多变，关闭 mem_pattern 可减少重新规划
+            num_sessions: 会话数量
+            pin_cores: 多会话时把每个会话的线程绑定到各自的核心集合
+            optimized_model_dir: 图优化后模型的缓存目录，之后的启动直接加载优化结果
+        """
+        if execution_mode not in ("sequential", "parallel"):
+            raise ValueError(f"无效的执行模式: {execution_mode}")
         self.model_path = model_path
         self.dimension = dimension
+        self.max_batch_size = max_batch_size or self.MAX_BATCH_SIZE
+        self.max_batch_tokens = max_batch_tokens or self.MAX_BATCH_TOKENS
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.execution_mode = execution_mode
+        self.enable_cpu_mem_arena = enable_cpu_mem_arena
+        self.enable_mem_pattern = enable_mem_pattern
+        self.num_sessions = max(1, num_sessions)
+        self.pin_cores = pin_cores
+        self.optimized_model_dir = optimized_model_dir
+        self.load_timings: Dict[str, Any] = {}  # 加载各阶段耗时（秒）
         self._session = None
+        self._pool: Optional[_SessionPool] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._load_lock = threading.Lock()
         self._tokenizer = None
+        self._tokenizer_name = "basic"
+        # 输入元数据，加载模型时计算一次
+        self._needs_position_ids = False
+        self._past_names: List[str] = []
+        self._past_shape = self.DEFAULT_PAST_SHAPE
+        self._position_base = np.arange(self.MAX_LENGTH, dtype=np.int64)[None, :]
+        self._past_zeros: Dict[int, np.ndarray] = {}
+    
+    @property
+    def model_id(self) -> str:
+        """模型标识（模型目录名 + 分词器），用于缓存键，分词方式变化时缓存自动失效"""
+        return f"{os.path.basename(os.path.normpath(self.model_path))}:{self._tokenizer_name}"
+    
+    def _optimized_model_path(self, onnx_path: str) -> Optional[str]:
+        """优化后模型的缓存路径；源模型、ORT 版本或 CPU 架构变化时路径随之变化"""
+        if not self.optimized_model_dir:
+            return None
+        import onnxruntime as ort
+        stat = os.stat(onnx_path)
+        key = hashlib.sha1(
+            f"{os.path.abspath(onnx_path)}|{stat.st_size}|{stat.st_mtime_ns}|"
+            f"{ort.__version__}|{platform.machine()}".encode("utf-8")
+        ).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(onnx_path))[0]
+        return os.path.join(self.optimized_model_dir, f"{name}.{key}.opt.onnx")
+    
+    def _session_options(self, cores: Optional[List[int]] = None, optimized: bool = False):
+        import onnxruntime as ort
+        sess_options = ort.SessionOptions()
+        # 已优化过的模型不再重复做图优化
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_DISABLE_ALL if optimized
+            else ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        sess_options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if self.execution_mode == "parallel"
+            else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        sess_options.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+        sess_options.enable_mem_pattern = self.enable_mem_pattern
+        if self.inter_op_threads:
+            sess_options.inter_op_num_threads = self.inter_op_threads
+        
+        intra_threads = self.intra_op_threads
+        if cores is not None:
+            intra_threads = min(intra_threads or len(cores), len(cores))
+            if self.pin_cores and intra_threads > 1:
+                # 第一个算子内线程是调用线程本身，其余 intra_threads - 1 个线程各绑定一个核心
+                # （ORT 的逻辑处理器编号从 1 开始）
+                affinities = ";".join(str(core + 1) for core in cores[1:intra_threads])
+                sess_options.add_session_config_entry("session.intra_op_thread_affinities", affinities)
+        if intra_threads:
+            sess_options.intra_op_num_threads = intra_threads
+        return sess_options
     
     def _load_model(self):
         if self._session is not None:
             return
         
-        onnx_path = os.path.join(self.model_path, "model_int8.onnx")
-        
-        if not os.path.exists(onnx_path):
-            raise FileNotFoundError(f"模型文件不存在: {onnx_path}")
-        
-        logger.info(f"加载 ONNX 模型: {onnx_path}")
-        
-        self._tokenizer = self._create_basic_tokenizer()
-        logger.info("基础分词器初始化完成")
-        
+        with self._load_lock:
+            if self._session is not None:
+                return
+            
+            onnx_path = os.path.join(self.model_path, "model_int8.onnx")
+            
+            if not os.path.exists(onnx_path):
+                raise FileNotFoundError(f"模型文件不存在: {onnx_path}")
+            
+            logger.info(f"加载 ONNX 模型: {onnx_path}")
+            
+            started = time.perf_counter()
+            self._tokenizer = load_tokenizer(self.model_path)
+            self._tokenizer_name = self._tokenizer.name
+            self.load_timings["tokenizer"] = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            sessions = self._create_sessions(onnx_path)
+            self.load_timings["sessions"] = time.perf_counter() - started
+            
+            self._inspect_inputs(sessions[0])
+            self._pool = _SessionPool(sessions)
+            if len(sessions) > 1:
+                self._executor = ThreadPoolExecutor(max_workers=len(sessions), thread_name_prefix="ort")
+            logger.info(f"ONNX 模型加载完成: {onnx_path}")
+            
+            if self.dimension is None:
+                output_dim = sessions[0].get_outputs()[0].shape[-1]
+                self.dimension = output_dim if isinstance(output_dim, int) else 1024
+            self._session = sessions[0]
+    
+    def _create_sessions(self, onnx_path: str) -> list:
         import onnxruntime as ort
-        sess_options = ort.SessionOptions()
-        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        
-        self._session = ort.InferenceSession(onnx_path, sess_options)
-        logger.info(f"ONNX 模型加载完成: {onnx_path}")
+        core_sets: List[Optional[List[int]]] = [None]
+        if self.num_sessions > 1:
+            core_sets = _split_cores(_available_cores(), self.num_sessions)
+            logger.info(f"创建 {len(core_sets)} 个 ONNX 会话，核心分配: {core_sets}")
         
-        if self.dimension is None:
-            self.dimension = 1024
-    
-    def _create_basic_tokenizer(self):
-        class BasicTokenizer:
-            def __init__(self):
-                self.max_length = 512
+        cached_path = self._optimized_model_path(onnx_path)
+        self.load_timings["optimized_model_cached"] = bool(cached_path and os.path.exists(cached_path))
+        sessions = []
+        for cores in core_sets:
+            if cached_path and os.path.exists(cached_path):
+                try:
+                    sessions.append(ort.InferenceSession(cached_path, self._session_options(cores, optimized=True)))
+                    continue
+                except Exception as e:
+                    logger.warning(f"加载优化模型缓存失败，回退到原始模型: {e}")
+                    cached_path = None
             
-            def __call__(self, texts, padding=True, truncation=True, max_length=512, return_tensors="np"):
-                tokenized = []
-                attention_masks = []
-                
-                for text in texts:
-                    chars = list(text)[:max_length-2]
-                    
-                    token_ids = [0]
-                    for char in chars:
-                        char_id = ord(char) % 256 + 4
-                        token_ids.append(char_id)
-                    token_ids.append(1)
-                    
-                    if len(token_ids) < max_length:
-                        token_ids += [2] * (max_length - len(token_ids))
-                    else:
-                        token_ids = token_ids[:max_length]
-                    
-                    attention_mask = [1] * (len(chars) + 2)
-                    if len(attention_mask) < max_length:
-                        attention_mask += [0] * (max_length - len(attention_mask))
-                    else:
-                        attention_mask = attention_mask[:max_length]
-                    
-                    tokenized.append(token_ids)
-                    attention_masks.append(attention_mask)
-                
-                return {
-                    "input_ids": np.array(tokenized, dtype=np.int64),
-                    "attention_mask": np.array(attention_masks, dtype=np.int64)
-                }
-        
-        return BasicTokenizer()
+            sess_options = self._session_options(cores)
+            tmp_path = None
+            if cached_path:
+                os.makedirs(self.optimized_model_dir, exist_ok=True)
+                tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+                sess_options.optimized_model_filepath = tmp_path
+            sessions.append(ort.InferenceSession(onnx_path, sess_options))
+            if tmp_path and os.path.exists(tmp_path):
+                os.replace(tmp_path, cached_path)
+                logger.info(f"优化后的模型已缓存: {cached_path}")
+        return sessions
     
-    def embed(self, texts: list) -> list:
+    def warmup(self, lengths: Optional[tuple] = None, batch_size: int = 4) -> float:
+        """用几种典型长度各跑一次推理（每个会话都跑），返回耗时（秒）"""
+        self._load_model()
+        started = time.perf_counter()
+        for length in lengths or self.WARMUP_LENGTHS:
+            length = min(length, self.MAX_LENGTH)
+            sequence = self._tokenizer.encode_batch(["warm up " * length], max_length=length)[0]
+            input_ids, attention_mask = self._tokenizer.pad([sequence] * batch_size)
+            ort_inputs = self._build_inputs(input_ids, attention_mask)
+            for session in self._pool.sessions:
+                session.run(None, ort_inputs)
+        elapsed = time.perf_counter() - started
+        self.load_timings["warmup"] = elapsed
+        return elapsed
+    
+    def _inspect_inputs(self, session):
+        """记录模型需要的附加输入，避免每批重复查询"""
+        inputs = session.get_inputs()
+        names = [inp.name for inp in inputs]
+        self._needs_position_ids = "position_ids" in names
+        self._past_names = [name for name in names if name.startswith("past_key_values.")]
+        for inp in inputs:
+            if inp.name in self._past_names:
+                # 形状形如 [batch, num_heads, past_len, head_dim]
+                heads, head_dim = inp.shape[1], inp.shape[3]
+                if isinstance(heads, int) and isinstance(head_dim, int):
+                    self._past_shape = (heads, head_dim)
+                break
+    
+    def _past_zero(self, batch_size: int) -> np.ndarray:
+        """past_len 为 0 的空张量，按 batch 大小缓存（不占数据内存，可在多个输入间共用）"""
+        zeros = self._past_zeros.get(batch_size)
+        if zeros is None:
+            heads, head_dim = self._past_shape
+            zeros = np.zeros((batch_size, heads, 0, head_dim), dtype=np.float32)
+            self._past_zeros[batch_size] = zeros
+        return zeros
+    
+    def _plan_batches(self, order: List[int], lengths: List[int]) -> List[List[int]]:
+        """
+        按长度升序把文本分批：每批 padding 后的 token 数不超过
+        max_batch_tokens，条数不超过 max_batch_size。多会话时批次
+        至少拆成会话数份，让每个会话都有活干。
+        """
+        max_batch_size = self.max_batch_size
+        if self._pool is not None and len(self._pool) > 1:
+            max_batch_size = min(max_batch_size, max(1, -(-len(order) // len(self._pool))))
+        
+        batches = []
+        batch: List[int] = []
+        for index in order:
+            length = lengths[index]
+            # 已按长度升序排列，加入后整批会 padding 到当前长度
+            if batch and (len(batch) >= max_batch_size
+                          or (len(batch) + 1) * length > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(index)
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def embed_array(self, texts: list) -> np.ndarray:
+        """批量向量化，返回 (len(texts), dimension) 的 float32 数组，顺序与输入一致"""
         self._load_model()
         
-        inputs = self._tokenizer(
-            texts, padding=True, truncation=True, max_length=512, return_tensors="np"
-        )
+        sequences = self._tokenizer.encode_batch(texts, max_length=self.MAX_LENGTH)
+        lengths = [len(seq) for seq in sequences]
+        order = sorted(range(len(sequences)), key=lengths.__getitem__)
+        
+        batches = self._plan_batches(order, lengths)
+        
+        def run(batch: List[int]) -> np.ndarray:
+            input_ids, attention_mask = self._tokenizer.pad([sequences[i] for i in batch])
+            return self._run_batch(input_ids, attention_mask)
         
-        input_ids = inputs['input_ids'].astype(np.int64)
-        attention_mask = inputs['attention_mask'].astype(np.int64)
+        if self._executor is not None and len(batches) > 1:
+            outputs = self._executor.map(run, batches)
+        else:
+            outputs = map(run, batches)
         
+        result: Optional[np.ndarray] = None
+        for batch, embeddings in zip(batches, outputs):
+            if result is None:
+                result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            result[batch] = embeddings
+        
+        if result is None:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return result
+    
+    def embed(self, texts: list) -> list:
+        return self.embed_array(texts).tolist()
+    
+    def _build_inputs(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> dict:
         ort_inputs = {
             'input_ids': input_ids,
             'attention_mask': attention_mask
         }
         
-        input_names = [inp.name for inp in self._session.get_inputs()]
         batch_size, seq_length = input_ids.shape
         
-        if 'position_ids' in input_names:
-            position_ids = np.arange(seq_length, dtype=np.int64)[None, :]
-            position_ids = np.broadcast_to(position_ids, (batch_size, seq_length))
-            ort_inputs['position_ids'] = position_ids
-        
-        has_past = any('past_key_values' in name for name in input_names)
-        if has_past:
-            for i in range(32):
-                key_name = f'past_key_values.{i}.key'
-                value_name = f'past_key_values.{i}.value'
-                if key_name in input_names and value_name in input_names:
-                    ort_inputs[key_name] = np.zeros((batch_size, 8, 0, 128), dtype=np.float32)
-                    ort_inputs[value_name] = np.zeros((batch_size, 8, 0, 128), dtype=np.float32)
-        
-        outputs = self._session.run(None, ort_inputs)
+        if self._needs_position_ids:
+            ort_inputs['position_ids'] = np.broadcast_to(
+                self._position_base[:, :seq_length], (batch_size, seq_length)
+            )
+        
+        if self._past_names:
+            zeros = self._past_zero(batch_size)
+            for name in self._past_names:
+                ort_inputs[name] = zeros
+        return ort_inputs
+    
+    def _run_batch(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        outputs = self._pool.run(self._build_inputs(input_ids, attention_mask))
         token_embeddings = outputs[0]
         
         attention_mask_expanded = np.expand_dims(attention_mask, -1).astype(np.float32)
-        attention_mask_expanded = np.broadcast_to(attention_mask_expanded, token_embeddings.shape)
         
         sum_embeddings = np.sum(token_embeddings * attention_mask_expanded, axis=1)
         sum_mask = np.clip(attention_mask_expanded.sum(axis=1), a_min=1e-9, a_max=None)
@@ -125,7 +355,7 @@ class Embedder:
         norms = np.linalg.norm(sentence_embeddings, axis=1, keepdims=True)
         sentence_embeddings = sentence_embeddings / np.maximum(norms, 1e-9)
         
-        return sentence_embeddings.tolist()
+        return sentence_embeddings.astype(np.float32, copy=False)
     
     def get_dimension(self) -> int:
         self._load_model()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import base64
+from typing import Optional
+
+import numpy as np
+
+# 输出数据类型 -> 小端 numpy dtype
+OUTPUT_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+# int8 量化比例：向量已 L2 归一化，每个分量都在 [-1, 1] 内
+INT8_SCALE = 127.0
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+def truncate_dimensions(vectors: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """截取前 dimensions 维并重新 L2 归一化（Matryoshka 表示）"""
+    if dimensions is None or dimensions >= vectors.shape[1]:
+        return vectors
+    if dimensions <= 0:
+        raise ValueError("dimensions 必须大于 0")
+    truncated = vectors[:, :dimensions]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-9)
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """转换为输出数据类型；int8 按 INT8_SCALE 对称量化"""
+    target = OUTPUT_DTYPES.get(dtype)
+    if target is None:
+        raise ValueError(f"不支持的数据类型: {dtype}，可选: {', '.join(OUTPUT_DTYPES)}")
+    if dtype == "int8":
+        return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(target)
+    return np.ascontiguousarray(vectors, dtype=target)
+
+
+def prepare_embeddings(vectors: np.ndarray, dimensions: Optional[int] = None,
+                       dtype: str = "float32") -> np.ndarray:
+    return quantize(truncate_dimensions(vectors, dimensions), dtype)
+
+
+def encode_base64(vectors: np.ndarray) -> str:
+    """把整批向量的小端字节（行优先）编码为一个 base64 字符串"""
+    return base64.b64encode(np.ascontiguousarray(vectors).tobytes()).decode("ascii")
+
+
+def decode_embeddings(data: bytes, count: int, dtype: str = "float32") -> np.ndarray:
+    """客户端解码二进制 / base64 响应，int8 会还原为 float32"""
+    vectors = np.frombuffer(data, dtype=OUTPUT_DTYPES[dtype]).reshape(count, -1)
+    if dtype == "int8":
+        return vectors.astype(np.float32) / INT8_SCALE
+    return vectors.astype(np.float32)
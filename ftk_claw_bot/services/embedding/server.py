@@ -1,16 +1,51 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import functools
+import ipaddress
 import logging
 import sys
 import os
+import threading
+import time
 from contextlib import asynccontextmanager
-from typing import Optional, TYPE_CHECKING
+from typing import Any, Dict, List, Literal, Optional, Union, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .embedder import Embedder
+    from .batcher import MicroBatcher
+    from .cache import EmbeddingCache
+    from .vector_index import VectorStore
 
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
 
+from .output import BINARY_MEDIA_TYPE, INT8_SCALE, encode_base64, prepare_embeddings
+from .streaming import (
+    iter_file_items, iter_request_items, resolve_workspace_path, stream_embeddings
+)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """边读请求体边输出的流式响应
+    
+    StreamingResponse 在 ASGI 2.4 以下会并发监听断线，监听任务会取走
+    请求体消息，导致生成器读不到输入；这里只输出，断线由读取请求体时的
+    ClientDisconnect 发现。
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
 logging.basicConfig(
     level=logging.INFO,
     format='[EMBEDDING_SERVER] %(asctime)s - %(levelname)s - %(message)s',
@@ -19,6 +54,22 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def require_loopback(request: Request):
+    """只允许本机客户端调用
+
+    服务监听 0.0.0.0 供 WSL 中的 clawbot 访问 /embed；读取工作空间文件和
+    修改向量集合的接口只对本机开放。
+    """
+    host = request.client.host if request.client else ""
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = host == "localhost"
+    if not loopback:
+        logger.warning(f"拒绝非本机请求: {request.method} {request.url.path} from {host}")
+        raise HTTPException(status_code=403, detail="仅允许本机访问")
+
+
 class HealthResponse(BaseModel):
     status: str
     model: str
@@ -28,29 +79,110 @@ class HealthResponse(BaseModel):
 
 class EmbedRequest(BaseModel):
     texts: list[str]
+    dimensions: Optional[int] = None  # 截取前 N 维并重新归一化
+    dtype: Literal["float32", "float16", "int8"] = "float32"
+    encoding: Literal["float", "base64"] = "float"
 
 
 class EmbedResponse(BaseModel):
-    embeddings: list[list[float]]
+    embeddings: Union[list[list[int]], list[list[float]], str]
     dimension: int
+    dtype: str = "float32"
+    encoding: str = "float"
+    scale: Optional[float] = None  # int8 时的量化比例，原值 = 整数 / scale
+
+
+class EmbedFileRequest(BaseModel):
+    path: str
+    format: Optional[Literal["lines", "ndjson"]] = None  # 默认按扩展名判断
+    dimensions: Optional[int] = None
+    dtype: Literal["float32", "float16", "int8"] = "float32"
+    encoding: Literal["float", "base64"] = "float"
+
+
+class CollectionCreateRequest(BaseModel):
+    name: str
+    dimension: Optional[int] = None
+
+
+class CollectionUpsertRequest(BaseModel):
+    ids: list[str]
+    texts: Optional[list[str]] = None
+    vectors: Optional[list[list[float]]] = None
+    metadata: Optional[list[Optional[Dict[str, Any]]]] = None
 
 
-def create_app(model_path: str, port: int = 18765) -> FastAPI:
-    logger.info(f"create_app() called with model_path={model_path}, port={port}")
+class CollectionDeleteRequest(BaseModel):
+    ids: list[str]
+
+
+class CollectionQueryRequest(BaseModel):
+    texts: Optional[list[str]] = None
+    vectors: Optional[list[list[float]]] = None
+    top_k: int = 10
+    where: Optional[Dict[str, Any]] = None
+    nprobe: Optional[int] = None
+    exact: bool = False
+
+
+def create_app(model_path: str, port: int = 18765, max_batch_size: int = 64,
+               max_wait_ms: float = 5.0, cache_dir: Optional[str] = None,
+               cache_memory_mb: int = 64, collections_dir: Optional[str] = None,
+               embedder_options: Optional[Dict[str, Any]] = None, warmup: bool = True,
+               startup_phases: Optional[Dict[str, Any]] = None,
+               allowed_roots: Optional[List[str]] = None) -> FastAPI:
+    """
+    embedder_options 原样传给 Embedder（线程数、执行模式、会话数等 ORT 调优参数）；
+    warmup 为 True 时启动阶段先跑一轮预热推理；startup_phases 若提供，
+    启动各阶段耗时（秒）会写入其中；allowed_roots 为 /embed/file 可读取的目录。
+    """
+    phases = startup_phases if startup_phases is not None else {}
+    logger.info(f"create_app() called with model_path={model_path}, port={port}, "
+                f"cache_dir={cache_dir}, collections_dir={collections_dir}")
     
     embedder: Optional['Embedder'] = None
+    batcher: Optional['MicroBatcher'] = None
+    cache: Optional['EmbeddingCache'] = None
+    store: Optional['VectorStore'] = None
     
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        nonlocal embedder
+        nonlocal embedder, batcher, cache, store
         
         logger.info(f"lifespan: 开始加载嵌入模型: {model_path}")
         
         try:
             from .embedder import Embedder
-            embedder = Embedder(model_path=model_path)
+            from .batcher import MicroBatcher
+            from .cache import EmbeddingCache
+            from .vector_index import VectorStore
+            started = time.perf_counter()
+            embedder = Embedder(model_path=model_path, **(embedder_options or {}))
             logger.info(f"lifespan: 嵌入服务启动成功，维度: {embedder.get_dimension()}")
+            phases["model_load"] = time.perf_counter() - started
+            
+            if warmup:
+                phases["warmup"] = embedder.warmup()
+                logger.info(f"lifespan: 预热完成，耗时 {phases['warmup']:.2f}s")
+            
+            batcher = MicroBatcher(embedder.embed_array, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            await batcher.start()
+            
+            started = time.perf_counter()
+            cache = EmbeddingCache(
+                embedder.model_id,
+                max_memory_bytes=cache_memory_mb * 1024 * 1024,
+                disk_dir=cache_dir,
+            )
+            if cache_dir:
+                cache.open_disk(embedder.get_dimension())
+            store = VectorStore(collections_dir)
+            phases["storage_open"] = time.perf_counter() - started
+            phases["tokenizer"] = embedder.load_timings.get("tokenizer")
+            phases["sessions"] = embedder.load_timings.get("sessions")
+            phases["optimized_model_cached"] = embedder.load_timings.get("optimized_model_cached")
         except Exception as e:
+            phases["error"] = str(e)
             logger.error(f"lifespan: 加载模型失败: {e}")
             import traceback
             traceback.print_exc()
@@ -58,6 +190,9 @@ def create_app(model_path: str, port: int = 18765) -> FastAPI:
         
         yield
         
+        await batcher.stop()
+        cache.close()
+        store.close()
         logger.info("lifespan: 嵌入服务停止")
     
     app = FastAPI(
@@ -79,30 +214,229 @@ def create_app(model_path: str, port: int = 18765) -> FastAPI:
             dimension=embedder.get_dimension()
         )
     
+    async def embed_texts(texts: list[str]) -> np.ndarray:
+        """先查缓存，只把未命中（去重后）的文本送去推理"""
+        cached = cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        
+        computed = {}
+        if missing:
+            vectors = await batcher.submit(missing)
+            cache.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+        
+        return np.stack([
+            vector if vector is not None else computed[text]
+            for text, vector in zip(texts, cached)
+        ])
+    
     @app.post("/embed", response_model=EmbedResponse)
-    async def embed(request: EmbedRequest):
-        if embedder is None:
+    async def embed(request: EmbedRequest, http_request: Request):
+        """
+        向量化文本
+        
+        Accept 为 application/octet-stream 时返回行优先的小端原始字节，
+        形状与类型放在 X-Embedding-* 响应头中；encoding=base64 时返回
+        同样字节的 base64 字符串。
+        """
+        if embedder is None or batcher is None:
             raise HTTPException(status_code=503, detail="服务未初始化")
         
         if not request.texts:
             raise HTTPException(status_code=400, detail="未提供文本")
         
+        if request.dimensions is not None and request.dimensions <= 0:
+            raise HTTPException(status_code=400, detail="dimensions 必须大于 0")
+        
         try:
-            embeddings = embedder.embed(request.texts)
-            return EmbedResponse(
-                embeddings=embeddings,
-                dimension=embedder.get_dimension()
-            )
+            embeddings = await embed_texts(request.texts)
+            vectors = prepare_embeddings(embeddings, request.dimensions, request.dtype)
         except Exception as e:
             logger.error(f"嵌入失败: {e}")
             raise HTTPException(status_code=500, detail=str(e))
+        
+        scale = INT8_SCALE if request.dtype == "int8" else None
+        
+        if BINARY_MEDIA_TYPE in http_request.headers.get("accept", ""):
+            headers = {
+                "X-Embedding-Count": str(vectors.shape[0]),
+                "X-Embedding-Dimension": str(vectors.shape[1]),
+                "X-Embedding-Dtype": request.dtype,
+            }
+            if scale is not None:
+                headers["X-Embedding-Scale"] = str(scale)
+            return Response(content=vectors.tobytes(), media_type=BINARY_MEDIA_TYPE, headers=headers)
+        
+        return EmbedResponse(
+            embeddings=encode_base64(vectors) if request.encoding == "base64" else vectors.tolist(),
+            dimension=vectors.shape[1],
+            dtype=request.dtype,
+            encoding=request.encoding,
+            scale=scale
+        )
+    
+    def check_output_options(dimensions: Optional[int]):
+        if embedder is None or batcher is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        if dimensions is not None and dimensions <= 0:
+            raise HTTPException(status_code=400, detail="dimensions 必须大于 0")
+    
+    @app.post("/embed/stream")
+    async def embed_stream(request: Request, dimensions: Optional[int] = None,
+                           dtype: Literal["float32", "float16", "int8"] = "float32",
+                           encoding: Literal["float", "base64"] = "float"):
+        """
+        流式向量化：请求体为 NDJSON（每行一个字符串或 {"id", "text"} 对象），
+        响应为 NDJSON，每批完成后立即输出
+        
+        服务端只缓冲少量批次，客户端需要边发送边读取响应；不能同时收发的
+        客户端应分段请求，或把文件放到工作空间后使用 /embed/file。
+        """
+        check_output_options(dimensions)
+        return _DuplexStreamingResponse(
+            stream_embeddings(iter_request_items(request.stream()), embed_texts, dimensions, dtype, encoding),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    
+    @app.post("/embed/file", dependencies=[Depends(require_loopback)])
+    async def embed_file(request: EmbedFileRequest):
+        """流式向量化工作空间内的文件：纯文本按行，.jsonl/.ndjson 按 NDJSON 解析"""
+        check_output_options(request.dimensions)
+        try:
+            path = resolve_workspace_path(request.path, allowed_roots or [])
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        
+        file_format = request.format
+        if file_format is None:
+            file_format = "ndjson" if path.lower().endswith((".jsonl", ".ndjson")) else "lines"
+        items = iter_file_items(path, ndjson=file_format == "ndjson")
+        return StreamingResponse(
+            stream_embeddings(items, embed_texts, request.dimensions, request.dtype, request.encoding),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    
+    @app.get("/stats")
+    async def stats():
+        if batcher is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        
+        return {"batcher": batcher.stats(), "cache": cache.stats(), "collections": store.list()}
+    
+    async def run_index(fn, *args, **kwargs):
+        """在线程池中执行索引操作，KeyError/ValueError 转换为 404/400"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]) if e.args else str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    def get_collection(name: str):
+        if store is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        try:
+            return store.get(name)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+    
+    async def resolve_vectors(texts: Optional[List[str]], vectors: Optional[List[List[float]]]) -> np.ndarray:
+        if (texts is None) == (vectors is None):
+            raise HTTPException(status_code=400, detail="texts 与 vectors 必须且只能提供一个")
+        if texts is not None:
+            if not texts:
+                raise HTTPException(status_code=400, detail="未提供文本")
+            return await embed_texts(texts)
+        if not vectors:
+            raise HTTPException(status_code=400, detail="未提供向量")
+        return np.asarray(vectors, dtype=np.float32)
+    
+    @app.get("/collections")
+    async def list_collections():
+        if store is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        return {"collections": store.list()}
+    
+    @app.post("/collections", dependencies=[Depends(require_loopback)])
+    async def create_collection(request: CollectionCreateRequest):
+        if store is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        dimension = request.dimension or embedder.get_dimension()
+        collection = await run_index(store.create, request.name, dimension)
+        return collection.stats()
+    
+    @app.get("/collections/{name}")
+    async def get_collection_stats(name: str):
+        return get_collection(name).stats()
+    
+    @app.delete("/collections/{name}", dependencies=[Depends(require_loopback)])
+    async def drop_collection(name: str):
+        if store is None:
+            raise HTTPException(status_code=503, detail="服务未初始化")
+        if not await run_index(store.drop, name):
+            raise HTTPException(status_code=404, detail=f"集合不存在: {name}")
+        return {"success": True}
+    
+    @app.post("/collections/{name}/upsert", dependencies=[Depends(require_loopback)])
+    async def upsert_items(name: str, request: CollectionUpsertRequest):
+        collection = get_collection(name)
+        vectors = await resolve_vectors(request.texts, request.vectors)
+        count = await run_index(collection.upsert, request.ids, vectors, request.metadata)
+        return {"upserted": count, "count": len(collection)}
+    
+    @app.post("/collections/{name}/delete", dependencies=[Depends(require_loopback)])
+    async def delete_items(name: str, request: CollectionDeleteRequest):
+        collection = get_collection(name)
+        count = await run_index(collection.delete, request.ids)
+        return {"deleted": count, "count": len(collection)}
+    
+    @app.post("/collections/{name}/query")
+    async def query_items(name: str, request: CollectionQueryRequest):
+        collection = get_collection(name)
+        if request.top_k <= 0:
+            raise HTTPException(status_code=400, detail="top_k 必须大于 0")
+        queries = await resolve_vectors(request.texts, request.vectors)
+        results = await run_index(
+            collection.search, queries, request.top_k,
+            where=request.where, nprobe=request.nprobe, exact=request.exact
+        )
+        return {"results": results}
     
     logger.info("create_app() 完成，返回 FastAPI app")
     return app
 
 
-def run_server(model_path: str, port: int):
-    """运行服务器（在独立进程中调用）"""
+def _signal_when_started(server, ready_conn, phases: Dict[str, Any], started: float):
+    """等待 uvicorn 完成启动（端口已监听）后通过管道通知父进程"""
+    while not server.started and not server.should_exit:
+        time.sleep(0.02)
+    if server.started:
+        phases["server_start"] = time.perf_counter() - started
+        _send_ready(ready_conn, {"ready": True, "phases": phases})
+
+
+def _send_ready(ready_conn, message: Dict[str, Any]):
+    if ready_conn is None:
+        return
+    try:
+        ready_conn.send(message)
+        ready_conn.close()
+    except (OSError, ValueError):
+        pass
+
+
+def run_server(model_path: str, port: int, cache_dir: Optional[str] = None,
+               collections_dir: Optional[str] = None,
+               embedder_options: Optional[Dict[str, Any]] = None, ready_conn=None,
+               allowed_roots: Optional[List[str]] = None):
+    """运行服务器（在独立进程中调用）
+    
+    ready_conn 为 multiprocessing 管道的发送端：端口开始监听后发送
+    {"ready": True, "phases": {...}}，启动失败时发送 {"ready": False, "error": ...}。
+    """
     print("[EMBEDDING_SERVER] run_server() 开始执行")
     print(f"[EMBEDDING_SERVER] PID: {os.getpid()}")
     print(f"[EMBEDDING_SERVER] model_path: {model_path}")
@@ -111,6 +445,9 @@ def run_server(model_path: str, port: int):
     print(f"[EMBEDDING_SERVER] 工作目录: {os.getcwd()}")
     sys.stdout.flush()
     
+    started = time.perf_counter()
+    phases: Dict[str, Any] = {}
+    server = None
     try:
         import uvicorn
         print("[EMBEDDING_SERVER] uvicorn 导入成功")
@@ -119,7 +456,10 @@ def run_server(model_path: str, port: int):
         print("[EMBEDDING_SERVER] 创建 FastAPI app...")
         sys.stdout.flush()
         
-        app = create_app(model_path, port)
+        app = create_app(model_path, port, cache_dir=cache_dir, collections_dir=collections_dir,
+                         embedder_options=embedder_options, startup_phases=phases,
+                         allowed_roots=allowed_roots)
+        phases["create_app"] = time.perf_counter() - started
         
         print("[EMBEDDING_SERVER] 启动 uvicorn 服务器...")
         sys.stdout.flush()
@@ -130,11 +470,21 @@ def run_server(model_path: str, port: int):
             port=port,
             log_level="info"
         ))
+        threading.Thread(
+            target=_signal_when_started,
+            args=(server, ready_conn, phases, started),
+            daemon=True
+        ).start()
         server.run()
         
     except Exception as e:
+        phases.setdefault("error", str(e))
         print(f"[EMBEDDING_SERVER] 错误: {e}")
         import traceback
         traceback.print_exc()
         sys.stdout.flush()
         raise
+    finally:
+        # uvicorn 启动失败时可能直接 sys.exit，在这里统一通知父进程
+        if server is None or not server.started:
+            _send_ready(ready_conn, {"ready": False, "error": phases.get("error") or "服务启动失败"})
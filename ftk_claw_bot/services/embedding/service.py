@@ -2,6 +2,7 @@
 import os
 import sys
 import threading
+import time
 import multiprocessing
 import requests
 from pathlib import Path
@@ -39,8 +40,11 @@ def _get_model_path() -> Optional[str]:
     return None
 
 
-def _run_server_process(model_path: str, port: int):
-    """在独立进程中运行服务器"""
+def _run_server_process(model_path: str, port: int, cache_dir: Optional[str] = None,
+                        collections_dir: Optional[str] = None,
+                        embedder_options: Optional[Dict[str, Any]] = None, ready_conn=None,
+                        allowed_roots: Optional[list] = None):
+    """在独立进程中运行服务器，就绪或失败时通过 ready_conn 通知父进程"""
     print("[EMBEDDING_PROCESS] 开始执行 _run_server_process")
     print(f"[EMBEDDING_PROCESS] PID: {os.getpid()}")
     print(f"[EMBEDDING_PROCESS] model_path: {model_path}")
@@ -54,9 +58,16 @@ def _run_server_process(model_path: str, port: int):
         print("[EMBEDDING_PROCESS] 导入 run_server 成功")
         sys.stdout.flush()
         
-        run_server(model_path, port)
+        run_server(model_path, port, cache_dir=cache_dir, collections_dir=collections_dir,
+                   embedder_options=embedder_options, ready_conn=ready_conn,
+                   allowed_roots=allowed_roots)
         
     except Exception as e:
+        if ready_conn is not None:
+            try:
+                ready_conn.send({"ready": False, "error": str(e)})
+            except (OSError, ValueError):
+                pass
         print(f"[EMBEDDING_PROCESS] 错误: {e}")
         import traceback
         traceback.print_exc()
@@ -69,10 +80,14 @@ class EmbeddingService(LocalService):
     
     def __init__(self, port: int = 18765):
         self._port = port
+        self._embedder_options: Dict[str, Any] = {}
+        self._allowed_roots: list = []  # /embed/file 额外允许读取的目录（默认只允许用户工作空间）
         self._status = ServiceStatus.STOPPED
         self._error: Optional[str] = None
         self._process: Optional[multiprocessing.Process] = None
         self._start_lock = threading.Lock()
+        self._ready_event = threading.Event()
+        self._startup_timings: Dict[str, Any] = {}
         logger.info(f"[EMBEDDING] EmbeddingService 初始化，port={port}")
     
     @property
@@ -116,14 +131,35 @@ class EmbeddingService(LocalService):
                     logger.error("[EMBEDDING] 服务启动失败: 模型文件不存在")
                     return False
                 
-                logger.info(f"[EMBEDDING] 启动服务，端口: {self._port}, 模型: {model_path}")
+                from ftk_claw_bot.utils.user_data_dir import user_data
+                cache_dir = str(user_data.embedding_cache)
+                collections_dir = str(user_data.embedding_collections)
+                embedder_options = {"optimized_model_dir": str(user_data.embedding_optimized)}
+                embedder_options.update(self._embedder_options)
+                allowed_roots = [str(user_data.workspace)] + list(self._allowed_roots)
+                
+                logger.info(f"[EMBEDDING] 启动服务，端口: {self._port}, 模型: {model_path}, 缓存: {cache_dir}")
                 
+                self._ready_event.clear()
+                self._startup_timings = {}
+                started = time.perf_counter()
+                ready_recv, ready_send = multiprocessing.Pipe(duplex=False)
                 self._process = multiprocessing.Process(
                     target=_run_server_process,
-                    args=(model_path, self._port),
+                    args=(model_path, self._port, cache_dir, collections_dir, embedder_options, ready_send,
+                          allowed_roots),
                     daemon=True
                 )
                 self._process.start()
+                # 父进程不再持有发送端，子进程退出后 recv 会收到 EOF
+                ready_send.close()
+                
+                threading.Thread(
+                    target=self._wait_ready,
+                    args=(self._process, ready_recv, started),
+                    name="embedding-ready",
+                    daemon=True
+                ).start()
                 
                 logger.info(f"[EMBEDDING] 进程已启动，PID: {self._process.pid}")
                 return True
@@ -134,18 +170,46 @@ class EmbeddingService(LocalService):
                 logger.exception(f"[EMBEDDING] 服务启动异常: {e}")
                 return False
     
+    def _wait_ready(self, process: multiprocessing.Process, ready_recv, started: float):
+        """等待子进程通过管道报告就绪或失败"""
+        message: Dict[str, Any] = {"ready": False, "error": "进程已退出"}
+        try:
+            while True:
+                if ready_recv.poll(0.5):
+                    message = ready_recv.recv()
+                    break
+                if not process.is_alive():
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            ready_recv.close()
+        
+        with self._start_lock:
+            if process is not self._process:
+                return  # 服务已被停止或重启
+            if message.get("ready"):
+                timings = dict(message.get("phases") or {})
+                timings["total"] = time.perf_counter() - started
+                self._startup_timings = timings
+                self._status = ServiceStatus.RUNNING
+                logger.info(f"[EMBEDDING] 服务已就绪，端口: {self._port}, 耗时: {timings['total']:.2f}s")
+            else:
+                self._status = ServiceStatus.ERROR
+                self._error = message.get("error") or "启动失败"
+                logger.error(f"[EMBEDDING] 服务启动失败: {self._error}")
+        self._ready_event.set()
+    
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """阻塞等待启动结果（就绪或失败），返回是否已就绪"""
+        self._ready_event.wait(timeout)
+        return self._status == ServiceStatus.RUNNING
+    
     def check_started(self) -> bool:
-        """检查服务是否已启动"""
+        """检查服务是否已启动（由就绪管道更新状态，不做 HTTP 轮询）"""
         if self._status == ServiceStatus.RUNNING:
             return True
         
-        if self._health_check():
-            with self._start_lock:
-                if self._status != ServiceStatus.RUNNING:
-                    self._status = ServiceStatus.RUNNING
-                    logger.info(f"[EMBEDDING] 服务已就绪，端口: {self._port}")
-            return True
-        
         if self._process and not self._process.is_alive():
             with self._start_lock:
                 if self._status != ServiceStatus.ERROR:
@@ -164,6 +228,8 @@ class EmbeddingService(LocalService):
                     self._process.kill()
             self._process = None
             self._status = ServiceStatus.STOPPED
+            self._startup_timings = {}
+            self._ready_event.set()
             logger.info("[EMBEDDING] 服务已停止")
         return True
     
@@ -174,15 +240,25 @@ class EmbeddingService(LocalService):
             description=self.description,
             status=self._status,
             port=self._port,
-            error=self._error
+            error=self._error,
+            details={"startup_timings": dict(self._startup_timings)} if self._startup_timings else {}
         )
     
     def get_config(self) -> Dict[str, Any]:
-        return {"port": self._port}
+        return {
+            "port": self._port,
+            "embedder_options": dict(self._embedder_options),
+            "allowed_roots": list(self._allowed_roots),
+        }
     
     def set_config(self, config: Dict[str, Any]) -> bool:
+        """embedder_options（ORT 线程数、会话数等）与 allowed_roots 在下次启动时生效"""
         if "port" in config and self._status == ServiceStatus.STOPPED:
             self._port = config["port"]
+        if "embedder_options" in config:
+            self._embedder_options = dict(config["embedder_options"] or {})
+        if "allowed_roots" in config:
+            self._allowed_roots = [str(root) for root in config["allowed_roots"] or []]
         return True
     
     def _health_check(self) -> bool:
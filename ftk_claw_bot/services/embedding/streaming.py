@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .output import encode_base64, prepare_embeddings
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 64  # 每批送去推理的文本数
+STREAM_MAX_INFLIGHT = 2  # 同时在推理中的批次数，超过后先把结果写给客户端
+MAX_LINE_BYTES = 1024 * 1024  # 单行输入上限，防止异常输入占满内存
+FILE_READ_LINES = 256  # 读文件时每次在线程池中读取的行数
+
+Item = Tuple[Any, str]
+
+
+class StreamInputError(ValueError):
+    """输入流中的某一行无法解析"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"第 {line} 行: {message}")
+        self.line = line
+
+
+def parse_item(line: str, line_no: int, ndjson: bool = True) -> Optional[Item]:
+    """解析一行输入，返回 (id, text)；空行返回 None
+
+    NDJSON 行可以是 JSON 字符串，或带 text（可选 id）字段的对象；
+    未给出 id 时使用行号。纯文本模式下整行即文本。
+    """
+    if not line.strip():
+        return None
+    if not ndjson:
+        return line_no, line.rstrip("\r\n")
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        raise StreamInputError(line_no, f"JSON 解析失败: {e}")
+    if isinstance(value, str):
+        return line_no, value
+    if isinstance(value, dict) and isinstance(value.get("text"), str):
+        return value.get("id", line_no), value["text"]
+    raise StreamInputError(line_no, "应为字符串或包含 text 字段的对象")
+
+
+async def iter_request_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Item]:
+    """把请求体字节流按行切分并解析为 (id, text)"""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline], buffer[newline + 1:]
+            line_no += 1
+            item = parse_item(line.decode("utf-8", errors="replace"), line_no)
+            if item is not None:
+                yield item
+        if len(buffer) > MAX_LINE_BYTES:
+            raise StreamInputError(line_no + 1, f"单行超过 {MAX_LINE_BYTES} 字节")
+    if buffer:
+        item = parse_item(buffer.decode("utf-8", errors="replace"), line_no + 1)
+        if item is not None:
+            yield item
+
+
+def resolve_workspace_path(path: str, allowed_roots: Sequence[str]) -> str:
+    """解析文件路径（含符号链接），必须位于某个允许的工作空间目录内"""
+    real_path = os.path.realpath(path)
+    for root in allowed_roots:
+        real_root = os.path.realpath(root)
+        try:
+            if os.path.commonpath([real_path, real_root]) == real_root:
+                if not os.path.isfile(real_path):
+                    raise FileNotFoundError(f"文件不存在: {path}")
+                return real_path
+        except ValueError:
+            # Windows 上不同盘符的路径无法比较
+            continue
+    raise PermissionError(f"路径不在允许的工作空间内: {path}")
+
+
+async def iter_file_items(path: str, ndjson: bool) -> AsyncIterator[Item]:
+    """在线程池中分块读取文件，逐行解析为 (id, text)"""
+    loop = asyncio.get_running_loop()
+
+    def read_lines(f) -> Tuple[List[str], bool]:
+        """读取最多 FILE_READ_LINES 行；遇到超长行时停止并返回 True"""
+        lines = []
+        for _ in range(FILE_READ_LINES):
+            line = f.readline(MAX_LINE_BYTES)
+            if not line:
+                break
+            # readline 达到上限时会截断，不能把同一行拆成多条
+            if len(line) >= MAX_LINE_BYTES and not line.endswith("\n") and f.read(1):
+                return lines, True
+            lines.append(line)
+        return lines, False
+
+    line_no = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            lines, too_long = await loop.run_in_executor(None, read_lines, f)
+            for line in lines:
+                line_no += 1
+                item = parse_item(line, line_no, ndjson)
+                if item is not None:
+                    yield item
+            if too_long:
+                raise StreamInputError(line_no + 1, f"单行超过 {MAX_LINE_BYTES} 字节")
+            if not lines:
+                break
+
+
+def _encode_lines(items: List[Item], vectors: np.ndarray, encoding: str) -> bytes:
+    lines = []
+    for (item_id, _), vector in zip(items, vectors):
+        embedding = encode_base64(vector) if encoding == "base64" else vector.tolist()
+        lines.append(json.dumps({"id": item_id, "embedding": embedding}, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def stream_embeddings(
+    items: AsyncIterator[Item],
+    embed_fn: Callable[[List[str]], Awaitable[np.ndarray]],
+    dimensions: Optional[int] = None,
+    dtype: str = "float32",
+    encoding: str = "float",
+    batch_size: int = STREAM_BATCH_SIZE,
+    max_inflight: int = STREAM_MAX_INFLIGHT,
+) -> AsyncIterator[bytes]:
+    """
+    逐批向量化并输出 NDJSON 行：{"id": ..., "embedding": ...}，最后一行为
+    {"done": true, "count": n}；输入出错时输出 {"error": ..., "line": n} 并结束。
+
+    生成器只在客户端读走结果后才继续读取输入，内存中最多保留
+    max_inflight + 1 批文本，慢客户端会通过 TCP 反压到输入端。
+    """
+    pending: deque = deque()
+    batch: List[Item] = []
+    count = 0
+
+    async def drain(task, batch_items):
+        vectors = prepare_embeddings(await task, dimensions, dtype)
+        return _encode_lines(batch_items, vectors, encoding)
+
+    def submit(batch_items: List[Item]):
+        pending.append((asyncio.ensure_future(embed_fn([text for _, text in batch_items])), batch_items))
+
+    try:
+        try:
+            async for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    submit(batch)
+                    batch = []
+                    if len(pending) >= max_inflight:
+                        task, batch_items = pending.popleft()
+                        yield await drain(task, batch_items)
+                        count += len(batch_items)
+        except StreamInputError as e:
+            logger.warning(f"流式嵌入输入错误: {e}")
+            if batch:
+                submit(batch)
+            while pending:
+                task, batch_items = pending.popleft()
+                yield await drain(task, batch_items)
+                count += len(batch_items)
+            yield (json.dumps({"error": str(e), "line": e.line, "count": count}, ensure_ascii=False) + "\n").encode("utf-8")
+            return
+
+        if batch:
+            submit(batch)
+        while pending:
+            task, batch_items = pending.popleft()
+            yield await drain(task, batch_items)
+            count += len(batch_items)
+        yield (json.dumps({"done": True, "count": count}) + "\n").encode("utf-8")
+    finally:
+        # 客户端断开时取消还未完成的批次
+        for task, _ in pending:
+            task.cancel()
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+import abc
+import itertools
+import json
+import logging
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import regex as _regex  # 支持 \p{L} 等 Unicode 属性，tokenizer.json 中的切分正则依赖它
+except ImportError:
+    _regex = None
+
+# 缺少 regex 模块时使用的近似切分规则（GPT-2 / Qwen 风格，用 [^\W\d_] 近似 \p{L}）
+_FALLBACK_SPLIT_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\w]?[^\W\d_]+|\d| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+
+
+class _PaddingMixin(abc.ABC):
+    """分词器基类：子类实现 encode_batch，padding 与 __call__ 共用"""
+
+    pad_id = 0
+
+    def pad(self, sequences, length: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """把多条 token 序列 padding 到同一长度，默认取批内最长序列
+
+        attention_mask 由长度向量一次广播得到，token 一次性写入掩码位置，不逐行切片赋值。
+        """
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        if length is None:
+            length = int(lengths.max()) if len(lengths) else 0
+        if len(lengths) and lengths.max() > length:
+            sequences = [seq[:length] for seq in sequences]
+            lengths = np.minimum(lengths, length)
+        mask = np.arange(length) < lengths[:, None]
+        input_ids = np.full((len(sequences), length), self.pad_id, dtype=np.int64)
+        input_ids[mask] = np.fromiter(itertools.chain.from_iterable(sequences), dtype=np.int64,
+                                      count=int(lengths.sum()))
+        return input_ids, mask.astype(np.int64)
+
+    @abc.abstractmethod
+    def encode_batch(self, texts, max_length: int = 512) -> List[List[int]]:
+        """编码一批文本（截断到 max_length，不做 padding）"""
+
+    def __call__(self, texts, padding=True, truncation=True, max_length=512, return_tensors="np"):
+        sequences = self.encode_batch(texts, max_length)
+        length = max_length if padding == "max_length" else None
+        input_ids, attention_mask = self.pad(sequences, length)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask
+        }
+
+
+class BasicTokenizer(_PaddingMixin):
+    """字符级占位分词器，仅在模型目录中没有 tokenizer.json 时使用"""
+
+    name = "basic"
+    bos_id = 0
+    eos_id = 1
+    pad_id = 2
+
+    def __init__(self):
+        self.max_length = 512
+
+    def encode(self, text: str, max_length: int = 512) -> list:
+        """编码单条文本（不做 padding）"""
+        token_ids = [self.bos_id]
+        token_ids.extend(ord(char) % 256 + 4 for char in text[:max_length - 2])
+        token_ids.append(self.eos_id)
+        return token_ids
+
+    def encode_batch(self, texts, max_length: int = 512) -> list:
+        return [self.encode(text, max_length) for text in texts]
+
+
+class FastTokenizer(_PaddingMixin):
+    """基于 tokenizers 库（Rust 实现）的分词器"""
+
+    name = "tokenizers"
+
+    def __init__(self, tokenizer_path: str, pad_id: int):
+        from tokenizers import Tokenizer
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.no_padding()
+        self._max_length: Optional[int] = None
+        self.pad_id = pad_id
+
+    def encode_batch(self, texts, max_length: int = 512) -> List[List[int]]:
+        if max_length != self._max_length:
+            self._tokenizer.enable_truncation(max_length)
+            self._max_length = max_length
+        return [encoding.ids for encoding in self._tokenizer.encode_batch(list(texts))]
+
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    """GPT-2 字节级 BPE 使用的 字节 -> 可见字符 映射"""
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + n)
+            n += 1
+    return dict(zip(bs, (chr(c) for c in cs)))
+
+
+class BPETokenizer(_PaddingMixin):
+    """纯 Python 的字节级 BPE 分词器，读取 tokenizer.json
+
+    支持 Qwen/GPT-2 风格的配置：NFC 规范化、正则切分 + ByteLevel 预分词、
+    added_tokens 特殊词，以及 TemplateProcessing 后处理。每个预分词片段的
+    BPE 结果按片段缓存，重复出现的词只合并一次。
+    """
+
+    name = "bpe"
+    WORD_CACHE_SIZE = 100_000
+
+    def __init__(self, tokenizer_path: str, pad_id: Optional[int] = None):
+        with open(tokenizer_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+
+        model = spec.get("model") or {}
+        if model.get("type", "BPE") != "BPE":
+            raise ValueError(f"不支持的分词模型类型: {model.get('type')}")
+
+        self.vocab: Dict[str, int] = model["vocab"]
+        self.unk_id = self.vocab.get(model["unk_token"]) if model.get("unk_token") else None
+        self.ranks: Dict[Tuple[str, str], int] = {}
+        for rank, merge in enumerate(model.get("merges", [])):
+            pair = tuple(merge.split(" ", 1)) if isinstance(merge, str) else tuple(merge)
+            self.ranks[pair] = rank
+
+        self.added_tokens: Dict[str, int] = {t["content"]: t["id"] for t in spec.get("added_tokens", [])}
+        self._special_split = None
+        if self.added_tokens:
+            alternatives = "|".join(re.escape(t) for t in sorted(self.added_tokens, key=len, reverse=True))
+            self._special_split = re.compile(f"({alternatives})")
+
+        self._normalize = self._find(spec.get("normalizer"), "NFC") is not None
+        self._split = self._compile_split(spec.get("pre_tokenizer"))
+        self._byte_encoder = _bytes_to_unicode()
+        self._prefix, self._suffix = self._parse_template(spec.get("post_processor"))
+        self._cache: Dict[str, Tuple[int, ...]] = {}
+
+        if pad_id is None:
+            padding = spec.get("padding") or {}
+            pad_id = padding.get("pad_id", self._suffix[-1] if self._suffix else 0)
+        self.pad_id = pad_id
+
+    @staticmethod
+    def _find(component: Optional[dict], type_name: str) -> Optional[dict]:
+        """在（可能嵌套的 Sequence）组件中查找指定类型"""
+        if not component:
+            return None
+        if component.get("type") == type_name:
+            return component
+        for key in ("normalizers", "pretokenizers", "processors"):
+            for child in component.get(key) or []:
+                found = BPETokenizer._find(child, type_name)
+                if found:
+                    return found
+        return None
+
+    def _compile_split(self, pre_tokenizer: Optional[dict]):
+        split = self._find(pre_tokenizer, "Split")
+        pattern = None
+        if split:
+            pattern = (split.get("pattern") or {}).get("Regex")
+        if pattern and _regex is not None:
+            return _regex.compile(pattern)
+        if pattern:
+            logger.info("未安装 regex 模块，使用近似的预分词规则")
+        return re.compile(_FALLBACK_SPLIT_PATTERN)
+
+    def _parse_template(self, post_processor: Optional[dict]) -> Tuple[List[int], List[int]]:
+        template = self._find(post_processor, "TemplateProcessing")
+        if not template:
+            return [], []
+        special_tokens = template.get("special_tokens") or {}
+        prefix: List[int] = []
+        suffix: List[int] = []
+        target = prefix
+        for piece in template.get("single") or []:
+            if "Sequence" in piece:
+                target = suffix
+            elif "SpecialToken" in piece:
+                token = piece["SpecialToken"]["id"]
+                ids = (special_tokens.get(token) or {}).get("ids")
+                target.extend(ids if ids else [self.added_tokens.get(token, self.vocab.get(token, 0))])
+        return prefix, suffix
+
+    def _bpe(self, word: str) -> Tuple[int, ...]:
+        """对一个预分词片段做 BPE 合并，结果带缓存"""
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+
+        parts = list(word)
+        ranks = self.ranks
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get((parts[i], parts[i + 1]))
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            first, second = parts[best_index], parts[best_index + 1]
+            merged = first + second
+            # 同一轮中合并所有相同的相邻对
+            new_parts = []
+            i = 0
+            while i < len(parts):
+                if i < len(parts) - 1 and parts[i] == first and parts[i + 1] == second:
+                    new_parts.append(merged)
+                    i += 2
+                else:
+                    new_parts.append(parts[i])
+                    i += 1
+            parts = new_parts
+
+        vocab = self.vocab
+        ids = []
+        for part in parts:
+            token_id = vocab.get(part, self.unk_id)
+            if token_id is not None:
+                ids.append(token_id)
+        result = tuple(ids)
+
+        if len(self._cache) >= self.WORD_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = result
+        return result
+
+    def _encode_text(self, text: str) -> List[int]:
+        byte_encoder = self._byte_encoder
+        ids: List[int] = []
+        for piece in self._split.findall(text):
+            if not piece:
+                continue
+            word = "".join(byte_encoder[b] for b in piece.encode("utf-8"))
+            ids.extend(self._bpe(word))
+        return ids
+
+    def encode(self, text: str, max_length: int = 512) -> List[int]:
+        if self._normalize:
+            text = unicodedata.normalize("NFC", text)
+
+        ids: List[int] = []
+        segments = self._special_split.split(text) if self._special_split else [text]
+        for segment in segments:
+            if not segment:
+                continue
+            special_id = self.added_tokens.get(segment)
+            if special_id is not None:
+                ids.append(special_id)
+            else:
+                ids.extend(self._encode_text(segment))
+
+        budget = max(0, max_length - len(self._prefix) - len(self._suffix))
+        return self._prefix + ids[:budget] + self._suffix
+
+    def encode_batch(self, texts, max_length: int = 512) -> List[List[int]]:
+        return [self.encode(text, max_length) for text in texts]
+
+
+def _find_tokenizer_file(model_path: str) -> Optional[str]:
+    for candidate in (
+        os.path.join(model_path, "tokenizer.json"),
+        os.path.join(model_path, "tokenizer", "tokenizer.json"),
+    ):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _configured_pad_id(tokenizer_path: str) -> Optional[int]:
+    """从 tokenizer_config.json 的 pad_token 与 tokenizer.json 的词表中确定 pad id"""
+    config_path = os.path.join(os.path.dirname(tokenizer_path), "tokenizer_config.json")
+    if not os.path.exists(config_path):
+        return None
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            pad_token = json.load(f).get("pad_token")
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content")
+        if not pad_token:
+            return None
+        with open(tokenizer_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        for token in spec.get("added_tokens", []):
+            if token.get("content") == pad_token:
+                return token["id"]
+        return (spec.get("model") or {}).get("vocab", {}).get(pad_token)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_tokenizer(model_path: str) -> _PaddingMixin:
+    """加载模型分词器
+
+    优先使用 tokenizers 库读取 tokenizer.json；未安装时使用纯 Python BPE；
+    模型目录中没有 tokenizer.json 时退回字符级的 BasicTokenizer。
+    """
+    tokenizer_path = _find_tokenizer_file(model_path)
+    if tokenizer_path is None:
+        logger.warning(f"未找到 tokenizer.json，使用基础分词器: {model_path}")
+        return BasicTokenizer()
+
+    pad_id = _configured_pad_id(tokenizer_path)
+    try:
+        tokenizer = FastTokenizer(tokenizer_path, pad_id=pad_id if pad_id is not None else 0)
+        logger.info(f"使用 tokenizers 分词器: {tokenizer_path}")
+        return tokenizer
+    except ImportError:
+        pass
+
+    tokenizer = BPETokenizer(tokenizer_path, pad_id=pad_id)
+    logger.info(f"使用纯 Python BPE 分词器: {tokenizer_path}")
+    return tokenizer
@@ -0,0 +1,518 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 首字符必须是字母或数字，排除 "."、".." 等会指向集合目录之外的名称
+_COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回每行得分最高的 k 个下标（降序）"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class _IVFIndex:
+    """倒排文件（IVF）近似索引
+
+    用 k-means 把向量划分到 nlist 个簇，查询时只对最近的 nprobe 个簇内的
+    向量做精确打分。索引只保存在内存中，加载集合后在第一次查询时训练。
+    """
+
+    TRAIN_ITERATIONS = 8
+    TRAIN_POINTS_PER_LIST = 32
+
+    def __init__(self, centroids: np.ndarray, rows: int):
+        self.centroids = centroids
+        self.assignments = np.full(rows, -1, dtype=np.int32)
+        self.trained_count = 0
+        self._lists: Optional[List[np.ndarray]] = None
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, seed: int = 0) -> "_IVFIndex":
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), nlist * cls.TRAIN_POINTS_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        nlist = min(nlist, sample_size)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(cls.TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            present = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = counts == 0
+            # 空簇重新从样本中随机取点
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize(sums)
+        return cls(centroids.astype(np.float32), 0)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def assign(self, rows: np.ndarray, vectors: np.ndarray):
+        if len(rows) == 0:
+            return
+        needed = int(rows.max()) + 1
+        if needed > len(self.assignments):
+            grown = np.full(max(needed, len(self.assignments) * 2), -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.assignments[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self._lists = None
+
+    def remove(self, rows: np.ndarray):
+        rows = rows[rows < len(self.assignments)]
+        self.assignments[rows] = -1
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(-1, self.nlist + 1))
+            # bounds[0]:bounds[1] 是未分配（-1）的行
+            self._lists = [order[bounds[i + 1]:bounds[i + 2]] for i in range(self.nlist)]
+        return self._lists
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = self._inverted_lists()
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([lists[i] for i in probes])
+
+
+class Collection:
+    """命名向量集合
+
+    向量保存在 vectors.f32（memmap，按需倍增），id 与元数据以追加日志形式
+    写入 records.jsonl，日志超过存活条目两倍时压缩重写。删除的行进入空闲
+    列表供后续复用。向量写入时做 L2 归一化，得分为余弦相似度。
+    条目数达到 ivf_threshold 后使用 IVF 近似检索，否则暴力矩阵乘。
+    """
+
+    INITIAL_ROWS = 1024
+    IVF_THRESHOLD = 20000
+
+    def __init__(self, name: str, dimension: int, directory: Optional[str] = None,
+                 ivf_threshold: Optional[int] = None):
+        self.name = name
+        self.dimension = dimension
+        self.directory = directory
+        self.ivf_threshold = ivf_threshold or self.IVF_THRESHOLD
+        self.rows = 0
+        self.high_water = 0  # 曾使用过的最大行号 + 1
+        self.vectors: Optional[np.ndarray] = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[dict]] = []
+        self.row_of: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._ivf: Optional[_IVFIndex] = None
+        self._log_entries = 0
+        self._log_file = None
+        self._lock = threading.RLock()
+
+        if directory:
+            self._vectors_path = os.path.join(directory, "vectors.f32")
+            self._records_path = os.path.join(directory, "records.jsonl")
+            self._meta_path = os.path.join(directory, "meta.json")
+            self._open()
+        else:
+            self._map(self.INITIAL_ROWS)
+
+    # ---------- 存储 ----------
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta and meta.get("dimension") != self.dimension:
+            raise ValueError(f"集合 {self.name} 维度为 {meta.get('dimension')}，与 {self.dimension} 不一致")
+
+        if meta is None or not os.path.exists(self._vectors_path):
+            with open(self._vectors_path, "wb"):
+                pass
+            self._map(self.INITIAL_ROWS)
+        else:
+            self._map(int(meta.get("rows", self.INITIAL_ROWS)))
+            self._replay()
+
+        self._write_meta()
+        self._log_file = open(self._records_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self._records_path):
+            return
+        with open(self._records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    continue
+                self._log_entries += 1
+                if record.get("op") == "put":
+                    self._place(record["id"], record["row"], record.get("metadata"))
+                elif record.get("op") == "del":
+                    self._unplace(record["id"])
+        self._free_rows = [row for row in range(self.high_water - 1, -1, -1) if not self.alive[row]]
+        logger.info(f"向量集合已加载: {self.name}, {len(self.row_of)} 条")
+
+    def _map(self, rows: int):
+        if self.directory:
+            # 先释放旧映射，Windows 上不能调整已映射文件的大小
+            self.vectors = None
+            size = rows * self.dimension * 4
+            if os.path.getsize(self._vectors_path) < size:
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(size)
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                     shape=(rows, self.dimension))
+        else:
+            grown = np.zeros((rows, self.dimension), dtype=np.float32)
+            if self.vectors is not None:
+                grown[:self.rows] = self.vectors
+            self.vectors = grown
+
+        alive = np.zeros(rows, dtype=bool)
+        alive[:len(self.alive)] = self.alive[:rows]
+        self.alive = alive
+        missing = rows - len(self.ids)
+        if missing > 0:
+            self.ids.extend([None] * missing)
+            self.metadata.extend([None] * missing)
+        self.rows = rows
+
+    def _write_meta(self):
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "dimension": self.dimension, "rows": self.rows}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _log(self, records: List[dict]):
+        if self._log_file is None:
+            return
+        self._log_file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        self._log_file.flush()
+        self._log_entries += len(records)
+        if self._log_entries > 2 * max(len(self.row_of), 1024):
+            self._compact_log()
+
+    def _compact_log(self):
+        """只保留存活条目重写记录日志"""
+        self._log_file.close()
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for item_id, row in self.row_of.items():
+                f.write(json.dumps({"op": "put", "id": item_id, "row": row,
+                                    "metadata": self.metadata[row]}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self._records_path)
+        self._log_entries = len(self.row_of)
+        self._log_file = open(self._records_path, "a", encoding="utf-8")
+
+    def _place(self, item_id: str, row: int, metadata: Optional[dict]):
+        old_row = self.row_of.get(item_id)
+        if old_row is not None and old_row != row:
+            self.alive[old_row] = False
+            self.ids[old_row] = None
+            self.metadata[old_row] = None
+        if row >= self.rows:
+            self._map(max(self.rows * 2, row + 1))
+        self.row_of[item_id] = row
+        self.ids[row] = item_id
+        self.metadata[row] = metadata
+        self.alive[row] = True
+        self.high_water = max(self.high_water, row + 1)
+
+    def _unplace(self, item_id: str) -> Optional[int]:
+        row = self.row_of.pop(item_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.ids[row] = None
+            self.metadata[row] = None
+        return row
+
+    def _allocate_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = self.high_water
+        if row >= self.rows:
+            if self.vectors is not None and isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+            self._map(self.rows * 2)
+            if self.directory:
+                self._write_meta()
+        self.high_water = row + 1
+        return row
+
+    # ---------- 写入 ----------
+
+    def upsert(self, ids: List[str], vectors, metadata: Optional[List[Optional[dict]]] = None) -> int:
+        """写入或覆盖条目，返回写入条数"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(f"向量维度应为 {self.dimension}，实际为 {vectors.shape}")
+        if len(ids) != len(vectors):
+            raise ValueError("ids 与向量数量不一致")
+        if metadata is not None and len(metadata) != len(ids):
+            raise ValueError("metadata 与 ids 数量不一致")
+        if len(set(ids)) != len(ids):
+            raise ValueError("ids 中存在重复")
+
+        vectors = _normalize(vectors)
+        with self._lock:
+            rows = []
+            for item_id in ids:
+                row = self.row_of.get(item_id)
+                rows.append(row if row is not None else self._allocate_row())
+            rows_array = np.asarray(rows, dtype=np.int64)
+            self.vectors[rows_array] = vectors
+            records = []
+            for index, (item_id, row) in enumerate(zip(ids, rows)):
+                item_metadata = metadata[index] if metadata is not None else None
+                self._place(item_id, row, item_metadata)
+                records.append({"op": "put", "id": item_id, "row": row, "metadata": item_metadata})
+            if self._ivf is not None:
+                self._ivf.assign(rows_array, vectors)
+            self._log(records)
+        return len(ids)
+
+    def delete(self, ids: List[str]) -> int:
+        """删除条目，返回实际删除条数"""
+        with self._lock:
+            removed = []
+            records = []
+            for item_id in ids:
+                row = self._unplace(item_id)
+                if row is not None:
+                    removed.append(row)
+                    self._free_rows.append(row)
+                    records.append({"op": "del", "id": item_id})
+            if removed and self._ivf is not None:
+                self._ivf.remove(np.asarray(removed, dtype=np.int64))
+            if records:
+                self._log(records)
+        return len(removed)
+
+    def get(self, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        with self._lock:
+            result = []
+            for item_id in ids:
+                row = self.row_of.get(item_id)
+                if row is None:
+                    result.append(None)
+                else:
+                    result.append({"id": item_id, "metadata": self.metadata[row]})
+            return result
+
+    # ---------- 检索 ----------
+
+    def _ensure_ivf(self) -> Optional[_IVFIndex]:
+        count = len(self.row_of)
+        if count < self.ivf_threshold:
+            self._ivf = None
+            return None
+        if self._ivf is None or count >= 2 * self._ivf.trained_count:
+            live_rows = np.flatnonzero(self.alive[:self.high_water])
+            live_vectors = np.asarray(self.vectors[live_rows])
+            nlist = int(min(4096, max(16, np.sqrt(count))))
+            logger.info(f"训练 IVF 索引: {self.name}, {count} 条, nlist={nlist}")
+            ivf = _IVFIndex.train(live_vectors, nlist)
+            ivf.assign(live_rows, live_vectors)
+            ivf.trained_count = count
+            self._ivf = ivf
+        return self._ivf
+
+    def _matches(self, row: int, where: Dict[str, Any]) -> bool:
+        item_metadata = self.metadata[row] or {}
+        return all(item_metadata.get(key) == value for key, value in where.items())
+
+    def search(self, queries, top_k: int = 10, where: Optional[Dict[str, Any]] = None,
+               nprobe: Optional[int] = None, exact: bool = False) -> List[List[Dict[str, Any]]]:
+        """检索最相似的 top_k 条
+
+        where 按元数据字段做等值过滤（过滤后走暴力检索）；exact=True 时即使
+        超过阈值也不使用 IVF。
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if queries.shape[1] != self.dimension:
+            raise ValueError(f"查询向量维度应为 {self.dimension}，实际为 {queries.shape[1]}")
+        queries = _normalize(queries)
+
+        with self._lock:
+            ivf = None if exact or where else self._ensure_ivf()
+            if ivf is not None:
+                probes = nprobe or max(8, ivf.nlist // 16)
+                return [self._rank(ivf.candidates(query, probes), query[None, :], top_k)[0]
+                        for query in queries]
+
+            if where:
+                rows = np.asarray([row for row in np.flatnonzero(self.alive[:self.high_water])
+                                   if self._matches(int(row), where)], dtype=np.int64)
+                return self._rank(rows, queries, top_k)
+            return self._rank_all(queries, top_k)
+
+    def _rank_all(self, queries: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        """暴力检索：对连续的前 high_water 行做矩阵乘，已删除的行置为 -inf"""
+        scores = queries @ self.vectors[:self.high_water].T
+        scores[:, ~self.alive[:self.high_water]] = -np.inf
+        best = _top_k(scores, min(top_k, len(self.row_of)))
+        return [
+            [{"id": self.ids[row], "score": float(scores[q, row]), "metadata": self.metadata[row]}
+             for row in best[q]]
+            for q in range(len(queries))
+        ]
+
+    def _rank(self, rows: np.ndarray, queries: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        if len(rows) == 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ np.asarray(self.vectors[rows]).T
+        best = _top_k(scores, top_k)
+        return [
+            [{"id": self.ids[rows[i]], "score": float(scores[q, i]), "metadata": self.metadata[rows[i]]}
+             for i in best[q]]
+            for q in range(len(queries))
+        ]
+
+    # ---------- 其他 ----------
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "dimension": self.dimension,
+                "count": len(self.row_of),
+                "index": "ivf" if self._ivf is not None else "flat",
+                "nlist": self._ivf.nlist if self._ivf is not None else 0,
+                "persistent": self.directory is not None,
+            }
+
+    def flush(self):
+        with self._lock:
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            self.vectors = None
+
+
+class VectorStore:
+    """按名称管理多个向量集合，directory 为空时只保存在内存中"""
+
+    def __init__(self, directory: Optional[str] = None, ivf_threshold: Optional[int] = None):
+        self.directory = directory
+        self.ivf_threshold = ivf_threshold
+        self._collections: Dict[str, Collection] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_existing()
+
+    def _load_existing(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not _COLLECTION_NAME_PATTERN.match(name):
+                continue
+            try:
+                directory = self._collection_dir(name)
+                meta_path = os.path.join(directory, "meta.json")
+                if not os.path.exists(meta_path):
+                    continue
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    dimension = int(json.load(f)["dimension"])
+                self._collections[name] = Collection(name, dimension, directory, self.ivf_threshold)
+            except Exception as e:
+                logger.error(f"加载向量集合失败: {name}, {e}")
+
+    @staticmethod
+    def _validate_name(name: str):
+        if not isinstance(name, str) or not _COLLECTION_NAME_PATTERN.match(name):
+            raise ValueError(f"无效的集合名称: {name}")
+
+    def _collection_dir(self, name: str) -> Optional[str]:
+        """集合目录；解析后不在 self.directory 之下时抛出 ValueError"""
+        if not self.directory:
+            return None
+        root = os.path.realpath(self.directory)
+        directory = os.path.realpath(os.path.join(root, name))
+        if os.path.dirname(directory) != root:
+            raise ValueError(f"无效的集合名称: {name}")
+        return directory
+
+    def create(self, name: str, dimension: int) -> Collection:
+        """创建集合；同名集合已存在且维度一致时直接返回"""
+        self._validate_name(name)
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is not None:
+                if collection.dimension != dimension:
+                    raise ValueError(f"集合 {name} 已存在，维度为 {collection.dimension}")
+                return collection
+            directory = self._collection_dir(name)
+            collection = Collection(name, dimension, directory, self.ivf_threshold)
+            self._collections[name] = collection
+            return collection
+
+    def get(self, name: str) -> Collection:
+        collection = self._collections.get(name)
+        if collection is None:
+            raise KeyError(f"集合不存在: {name}")
+        return collection
+
+    def drop(self, name: str) -> bool:
+        self._validate_name(name)
+        directory = self._collection_dir(name)
+        with self._lock:
+            collection = self._collections.pop(name, None)
+        if collection is None:
+            return False
+        collection.close()
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+        return True
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [collection.stats() for collection in list(self._collections.values())]
+
+    def flush(self):
+        for collection in list(self._collections.values()):
+            collection.flush()
+
+    def close(self):
+        for collection in list(self._collections.values()):
+            collection.close()
@@ -54,6 +54,8 @@ class IPCServer:
         self._handlers: Dict[str, Callable] = {}
         self._clients: list = []
         self._client_info: Dict[socket.socket, dict] = {}
+        self._session_clients: Dict[str, socket.socket] = {}
+        self._send_locks: Dict[socket.socket, threading.Lock] = {}
         self._lock = threading.Lock()
 
     def register_handler(self, action: str, handler: Callable):
@@ -97,6 +99,8 @@ class IPCServer:
                     pass
             self._clients.clear()
             self._client_info.clear()
+            self._session_clients.clear()
+            self._send_locks.clear()
 
         if self._socket:
             try:
@@ -118,6 +122,7 @@ class IPCServer:
                 logger.info(f"[IPC] 新客户端连接: {address}")
                 with self._lock:
                     self._clients.append(client_socket)
+                    self._send_locks[client_socket] = threading.Lock()
                     self._client_info[client_socket] = {
                         "address": address,
                         "distro_name": None,
@@ -159,7 +164,7 @@ class IPCServer:
                         line, buffer = buffer.split("\n", 1)
                         if line.strip():
                             response = self._process_message_with_client(line.strip(), client_socket)
-                            client_socket.sendall((response + "\n").encode("utf-8"))
+                            self._send(client_socket, response + "\n")
 
                 except socket.timeout:
                     continue
@@ -173,6 +178,9 @@ class IPCServer:
                     self._clients.remove(client_socket)
                 if client_socket in self._client_info:
                     del self._client_info[client_socket]
+                self._send_locks.pop(client_socket, None)
+                for sid in [s for s, c in self._session_clients.items() if c is client_socket]:
+                    del self._session_clients[sid]
             try:
                 client_socket.close()
             except Exception:
@@ -215,6 +223,8 @@ class IPCServer:
 
             if session_id:
                 params["_session_id"] = session_id
+                with self._lock:
+                    self._session_clients[session_id] = client_socket
 
             if action in self._handlers:
                 logger.debug(f"[IPC] Calling handler for action: {action}")
@@ -281,6 +291,35 @@ class IPCServer:
                 except Exception:
                     pass
 
+    def _send(self, client_socket: socket.socket, data: str) -> None:
+        """发送数据，同一连接上的响应与通知按行串行写出"""
+        with self._lock:
+            send_lock = self._send_locks.get(client_socket)
+        if send_lock is None:
+            client_socket.sendall(data.encode("utf-8"))
+            return
+        with send_lock:
+            client_socket.sendall(data.encode("utf-8"))
+
+    def notify_session(self, session_id: str, action: str, data: dict) -> bool:
+        """向发起该会话请求的客户端推送通知，用于在请求处理期间流式返回结果"""
+        with self._lock:
+            client_socket = self._session_clients.get(session_id)
+        if client_socket is None:
+            return False
+
+        notification = {
+            "type": "notification",
+            "action": action,
+            "session_id": session_id,
+            "data": data
+        }
+        try:
+            self._send(client_socket, json.dumps(notification) + "\n")
+            return True
+        except Exception:
+            return False
+
     def get_connected_clients_info(self) -> list:
         from loguru import logger
         with self._lock:
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from typing import Protocol, Dict, Any, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 
@@ -19,6 +19,7 @@ class ServiceInfo:
     status: ServiceStatus
     port: Optional[int] = None
     error: Optional[str] = None
+    details: Dict[str, Any] = field(default_factory=dict)
 
 
 class LocalService(Protocol):
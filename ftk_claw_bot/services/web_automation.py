@@ -5,8 +5,11 @@ import json
 import os
 import random
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
+from urllib.parse import urlparse
 
 from loguru import logger
 
@@ -41,6 +44,7 @@ class WebAutomation:
         self._lock = threading.Lock()
         self._headless = False  # 默认可见模式
         self._ai_snapshot_generator = None  # AI 快照生成器
+        self._load_profile: Optional[str] = None  # 会话默认页面加载策略
         
         from ftk_claw_bot.utils.user_data_dir import user_data
         self._sessions_dir = str(user_data.web_sessions)
@@ -70,10 +74,10 @@ class WebAutomation:
         asyncio.set_event_loop(self._loop)
         self._loop.run_forever()
 
-    def _run_async(self, coro):
+    def _run_async(self, coro, timeout: float = 120):
         self._ensure_loop()
         future = asyncio.run_coroutine_threadsafe(coro, self._loop)
-        return future.result(timeout=120)
+        return future.result(timeout=timeout)
 
     async def _get_session_manager(self):
         if self._session_manager is None:
@@ -88,14 +92,32 @@ class WebAutomation:
             session = await session_manager.get_session(self._session_id)
             if session:
                 from ftk_claw_bot.web_api_agent.core.web_agent import WebAgent
-                self._web_agent = WebAgent(session.page)
+                self._web_agent = WebAgent(session.page, load_profile=self._load_profile)
         return self._web_agent
 
-    def start(self, headless: bool = False, viewport: dict = None) -> bool:
+    def start(self, headless: bool = False, viewport: dict = None, load_profile: Optional[str] = None) -> bool:
+        """
+        启动浏览器会话。
+
+        Args:
+            headless: 是否无头模式
+            viewport: 视口大小
+            load_profile: 会话默认页面加载策略（full / fast / text-only），
+                为空时使用 web_api_agent 配置中的 LOAD_PROFILE
+        """
         if not PLAYWRIGHT_AVAILABLE:
             logger.error("[WebAutomation] Playwright not available")
             return False
 
+        from ftk_claw_bot.web_api_agent.core.load_profile import get_load_profile
+        try:
+            if load_profile:
+                get_load_profile(load_profile)
+        except ValueError as e:
+            logger.error(f"[WebAutomation] {e}")
+            return False
+        self._load_profile = load_profile
+
         from ftk_claw_bot.constants import WebAutomation as WebConfig
         viewport = viewport or {
             "width": WebConfig.VIEWPORT_WIDTH,
@@ -109,10 +131,10 @@ class WebAutomation:
             session = await session_manager.get_session(self._session_id)
             if session:
                 from ftk_claw_bot.web_api_agent.core.web_agent import WebAgent
-                self._web_agent = WebAgent(session.page)
+                self._web_agent = WebAgent(session.page, load_profile=self._load_profile)
                 self._started = True
                 self._headless = headless
-                logger.info(f"[WebAutomation] Started session: {self._session_id}")
+                logger.info(f"[WebAutomation] Started session: {self._session_id}, load_profile: {self._web_agent.load_profile.name}")
                 return True
             return False
 
@@ -139,35 +161,42 @@ class WebAutomation:
             logger.error(f"[WebAutomation] Failed to stop: {e}")
             return False
 
-    def navigate(self, url: str, wait_until: str = "domcontentloaded", timeout: int = 30000) -> dict:
+    def navigate(self, url: str, wait_until: str = "domcontentloaded", timeout: int = 30000,
+                 load_profile: Optional[str] = None) -> dict:
         if not self.is_started:
             return {"success": False, "error": "browser_not_started", "message": "Browser not started"}
 
         if not url.startswith(("http://", "https://")):
             return {"success": False, "error": "invalid_url", "message": "URL must start with http:// or https://"}
 
-        async def _navigate():
-            agent = await self._get_web_agent()
-            if agent is None:
-                return {"success": False, "error": "agent_not_available"}
-            
-            result = await agent.navigate(url)
-            return {
-                "success": not bool(result.get("error")),
-                "url": result.get("url", ""),
-                "title": result.get("title", ""),
-                "elements": result.get("elements", []),
-                "summary": result.get("summary", {}),
-                "error": result.get("error")
-            }
-
         try:
-            result = self._run_async(_navigate())
+            result = self._run_async(self._navigate(url, load_profile))
             return result
         except Exception as e:
             return {"success": False, "error": "navigation_failed", "message": str(e)}
 
-    def click(self, selector: str, timeout: int = 10000) -> dict:
+    async def _navigate(self, url: str, load_profile: Optional[str] = None,
+                        ssrf_resolve: Optional[bool] = None) -> dict:
+        """导航；ssrf_resolve 不为 None 时本次导航期间开启子请求 SSRF 检查"""
+        agent = await self._get_web_agent()
+        if agent is None:
+            return {"success": False, "error": "agent_not_available"}
+
+        if ssrf_resolve is None:
+            result = await agent.navigate(url, load_profile=load_profile)
+        else:
+            async with agent.ssrf_guard(resolve=ssrf_resolve):
+                result = await agent.navigate(url, load_profile=load_profile)
+        return {
+            "success": not bool(result.get("error")),
+            "url": result.get("url", ""),
+            "title": result.get("title", ""),
+            "elements": result.get("elements", []),
+            "summary": result.get("summary", {}),
+            "error": result.get("error")
+        }
+
+    def click(self, selector: str, timeout: int = 10000, load_profile: Optional[str] = None) -> dict:
         if not self.is_started:
             return {"success": False, "error": "browser_not_started"}
 
@@ -176,7 +205,7 @@ class WebAutomation:
             if agent is None:
                 return {"success": False, "error": "agent_not_available"}
             
-            result = await agent.click(selector)
+            result = await agent.click(selector, load_profile=load_profile)
             return {
                 "success": not bool(result.get("error")),
                 "error": result.get("error")
@@ -331,7 +360,8 @@ class WebAutomation:
         except Exception as e:
             return {"success": False, "error": "extract_failed", "message": str(e)}
 
-    def extract_data(self, selectors: List[Dict[str, str]]) -> dict:
+    def extract_data(self, selectors: List[Dict[str, str]], row_selector: Optional[str] = None,
+                     limit: Optional[int] = None) -> dict:
         if not self.is_started:
             return {"success": False, "error": "browser_not_started"}
 
@@ -340,6 +370,9 @@ class WebAutomation:
             if agent is None:
                 return {"success": False, "error": "agent_not_available"}
             
+            if row_selector:
+                records = await agent.extract_records(row_selector, selectors, limit)
+                return {"success": True, "data": records, "count": len(records)}
             data = await agent.extract_data(selectors)
             return {"success": True, "data": data}
 
@@ -348,6 +381,149 @@ class WebAutomation:
         except Exception as e:
             return {"success": False, "error": "extract_failed", "message": str(e)}
 
+    def crawl(self, urls: List[str], extract_config: Optional[dict] = None, concurrency: int = 4,
+              per_domain_concurrency: int = 2, load_profile: Optional[str] = None,
+              on_result: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        并发抓取多个 URL 并提取结构化数据。
+
+        页面在当前会话的浏览器上下文中打开（共享 Cookie），最多同时打开
+        concurrency 个页面并循环复用；同一域名最多 per_domain_concurrency 个
+        并发请求。每个 URL 都会经过 SSRFGuard 检查。
+
+        Args:
+            urls: 待抓取的 URL 列表
+            extract_config: 提取配置。包含 selectors 时按选择器提取
+                （可配合 row_selector / limit 按行提取），否则作为
+                extract_page_structure 的配置提取页面结构
+            concurrency: 全局并发页面数
+            per_domain_concurrency: 单个域名的并发数
+            load_profile: 页面加载策略，默认使用会话设置
+            on_result: 每个 URL 完成时回调，传入单条结果；在单独的线程中按完成顺序
+                依次调用（可以做阻塞 IO），全部回调结束后才返回。
+                设置后返回值中不再包含 results 列表
+
+        Returns:
+            {"success": True, "total": int, "succeeded": int, "failed": int,
+             "elapsed_ms": int, "results": [...]}
+        """
+        if not self.is_started:
+            return {"success": False, "error": "browser_not_started"}
+
+        extract_config = extract_config or {}
+        concurrency = max(1, int(concurrency))
+        per_domain_concurrency = max(1, int(per_domain_concurrency))
+
+        async def _crawl():
+            from ftk_claw_bot.web_api_agent.core.data_extractor import DataExtractor
+            from ftk_claw_bot.web_api_agent.core.ssrf_guard import SSRFGuard
+            from ftk_claw_bot.web_api_agent.core.web_agent import WebAgent
+
+            session_manager = await self._get_session_manager()
+            session = await session_manager.get_session(self._session_id)
+            if not session:
+                return {"success": False, "error": "session_not_found"}
+
+            global_slots = asyncio.Semaphore(concurrency)
+            domain_slots: Dict[str, asyncio.Semaphore] = {}
+            idle_agents: List[Any] = []
+            all_agents: List[Any] = []
+            results: List[dict] = []
+            callbacks: List[asyncio.Future] = []
+            started = time.monotonic()
+            loop = asyncio.get_running_loop()
+
+            async def _extract(page) -> Any:
+                selectors = extract_config.get("selectors")
+                if selectors:
+                    row_selector = extract_config.get("row_selector")
+                    if row_selector:
+                        return await DataExtractor.extract_records(
+                            page, row_selector, selectors, extract_config.get("limit"))
+                    return await DataExtractor.extract_by_selectors(page, selectors)
+                return await DataExtractor.extract_page_structure(page, extract_config)
+
+            # 回调可能做阻塞 IO（如 IPC 推送），放到单独线程，避免卡住浏览器事件循环
+            callback_executor = None
+            if on_result is not None:
+                callback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crawl-result")
+
+            def _notify(item: dict):
+                try:
+                    on_result(item)
+                except Exception as e:
+                    logger.warning(f"[WebAutomation] crawl result callback failed: {e}")
+
+            async def _crawl_one(index: int, url: str):
+                item = {"index": index, "url": url}
+                item_started = time.monotonic()
+
+                is_safe, error = await SSRFGuard.is_safe_url_async(url, resolve=True)
+                if not is_safe:
+                    item.update({"success": False, "error": "ssrf_blocked", "message": error})
+                else:
+                    domain = (urlparse(url).hostname or "").lower()
+                    domain_slot = domain_slots.setdefault(domain, asyncio.Semaphore(per_domain_concurrency))
+                    # 先占域名名额，避免排队等待同域名时占住全局名额
+                    async with domain_slot, global_slots:
+                        agent = idle_agents.pop() if idle_agents else None
+                        try:
+                            if agent is None:
+                                new_agent = WebAgent(await session.context.new_page(), load_profile=self._load_profile)
+                                all_agents.append(new_agent)
+                                # 防护开启成功后才放入复用池
+                                await new_agent.enable_ssrf_guard(resolve=True)
+                                agent = new_agent
+                            await agent.goto(url, load_profile)
+                            item.update({
+                                "success": True,
+                                "final_url": agent.page.url,
+                                "title": await agent.page.title(),
+                                "data": await _extract(agent.page),
+                            })
+                        except Exception as e:
+                            item.update({"success": False, "error": "crawl_failed", "message": str(e)})
+                        finally:
+                            if agent is not None:
+                                idle_agents.append(agent)
+
+                item["elapsed_ms"] = int((time.monotonic() - item_started) * 1000)
+                if on_result is not None:
+                    callbacks.append(loop.run_in_executor(callback_executor, _notify, item))
+                results.append(item)
+
+            try:
+                await asyncio.gather(*(_crawl_one(i, url) for i, url in enumerate(urls)))
+                if callbacks:
+                    await asyncio.gather(*callbacks)
+            finally:
+                if callback_executor is not None:
+                    callback_executor.shutdown(wait=False)
+                for agent in all_agents:
+                    try:
+                        await agent.page.close()
+                    except Exception:
+                        pass
+
+            succeeded = sum(1 for r in results if r["success"])
+            summary = {
+                "success": True,
+                "total": len(results),
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "elapsed_ms": int((time.monotonic() - started) * 1000),
+            }
+            if on_result is None:
+                summary["results"] = sorted(results, key=lambda r: r["index"])
+            return summary
+
+        # 每批 concurrency 个页面按 60 秒估算整体超时
+        batches = -(-len(urls) // concurrency) if urls else 1
+        try:
+            return self._run_async(_crawl(), timeout=max(120, batches * 60))
+        except Exception as e:
+            return {"success": False, "error": "crawl_failed", "message": str(e)}
+
     def get_cookies(self) -> dict:
         if not self.is_started:
             return {"success": False, "error": "browser_not_started"}
@@ -769,32 +945,45 @@ class WebAutomation:
             self._ai_snapshot_generator = AISnapshotGenerator()
         return self._ai_snapshot_generator
 
-    async def navigate_safe(self, url: str, wait_until: str = "domcontentloaded", timeout: int = 30000) -> dict:
+    def navigate_safe(self, url: str, wait_until: str = "domcontentloaded", timeout: int = 30000,
+                      load_profile: Optional[str] = None, resolve: bool = True) -> dict:
         """
         安全导航，带 SSRF 防护。
+
+        目标 URL 先经过 SSRFGuard 检查（resolve=True 时解析域名并校验所有地址），
+        导航期间页面发出的所有子请求也会在请求路由中逐个检查；
+        导航结束后恢复会话原来的防护状态，不影响之后的普通操作。
         """
         if not self.is_started:
             return {"success": False, "error": "browser_not_started"}
         
         from ftk_claw_bot.web_api_agent.core.ssrf_guard import SSRFGuard
         
-        is_safe, error = SSRFGuard.is_safe_url(url)
+        is_safe, error = SSRFGuard.is_safe_url(url, resolve=resolve)
         if not is_safe:
             return {"success": False, "error": "ssrf_blocked", "message": error}
-        
-        return self.navigate(url, wait_until=wait_until, timeout=timeout)
 
-    def ai_snapshot(self) -> dict:
+        try:
+            return self._run_async(self._navigate(url, load_profile, ssrf_resolve=resolve))
+        except Exception as e:
+            return {"success": False, "error": "navigation_failed", "message": str(e)}
+
+    def ai_snapshot(self, diff: bool = False) -> dict:
         """
         生成 AI 友好的页面快照，包含结构化的元素引用。
         
+        同一页面的连续快照中 ref 保持稳定；diff=True 时只返回
+        自上次快照以来新增或变化的子树。
+        
         Returns:
             {
                 "success": True,
                 "snapshot": str,  # 页面结构文本
                 "refs": dict,     # 元素引用 {"ref1": {"role": "button", "name": "提交", "selector": "#submit"}}
                 "truncated": bool,
-                "element_count": int
+                "element_count": int,
+                "diff": bool,          # 是否为增量快照
+                "removed_refs": list   # 增量快照中已消失的 ref
             }
         """
         if not self.is_started:
@@ -807,7 +996,7 @@ class WebAutomation:
                 return {"success": False, "error": "session_not_found"}
             
             generator = self._get_ai_snapshot_generator()
-            result = await generator.generate(session.page)
+            result = await generator.generate(session.page, diff=diff)
             
             return {
                 "success": True,
@@ -818,6 +1007,8 @@ class WebAutomation:
                 },
                 "truncated": result.truncated,
                 "element_count": result.element_count,
+                "diff": result.diff,
+                "removed_refs": result.removed_refs,
             }
 
         try:
@@ -516,6 +516,7 @@ class WindowsBridge:
         self._ipc_server.register_handler("web_get_title", self._handle_web_get_title)
         self._ipc_server.register_handler("web_extract_elements", self._handle_web_extract_elements)
         self._ipc_server.register_handler("web_extract_data", self._handle_web_extract_data)
+        self._ipc_server.register_handler("web_crawl", self._handle_web_crawl)
         self._ipc_server.register_handler("web_get_cookies", self._handle_web_get_cookies)
         self._ipc_server.register_handler("web_set_cookies", self._handle_web_set_cookies)
         self._ipc_server.register_handler("web_login", self._handle_web_login)
@@ -544,6 +545,10 @@ class WindowsBridge:
         self._ipc_server.register_handler("gui_screenshot_ocr", self._handle_gui_screenshot_ocr)
         self._ipc_server.register_handler("gui_click", self._handle_gui_click)
         self._ipc_server.register_handler("gui_input", self._handle_gui_input)
+        
+        # Workspace search handlers
+        self._ipc_server.register_handler("workspace_search", self._handle_workspace_search)
+        self._ipc_server.register_handler("workspace_index_status", self._handle_workspace_index_status)
 
     # Automation handler mapping (class-level constant)
     _AUTOMATION_HANDLERS = {
@@ -802,7 +807,7 @@ class WindowsBridge:
         # 强制使用有头模式，不支持 headless
         logger.info(f"[WindowsBridge] Starting web automation (visible mode), session_id={session_id}")
         try:
-            result = web.start(headless=False)
+            result = web.start(headless=False, load_profile=params.get("load_profile"))
             logger.info(f"[WindowsBridge] web.start() returned: {result}")
         except Exception as e:
             logger.error(f"[WindowsBridge] web.start() failed: {e}")
@@ -825,7 +830,8 @@ class WindowsBridge:
         url = params.get("url", "")
         wait_until = params.get("wait_until", "domcontentloaded")
         timeout = params.get("timeout", 30000)
-        return web.navigate(url, wait_until=wait_until, timeout=timeout)
+        load_profile = params.get("load_profile")
+        return web.navigate(url, wait_until=wait_until, timeout=timeout, load_profile=load_profile)
 
     def _handle_web_click(self, params: dict) -> dict:
         session_id = params.get("_session_id")
@@ -853,7 +859,7 @@ class WindowsBridge:
         if not selector:
             return {"success": False, "error": "no_selector", "message": f"Could not resolve ref: {ref}"}
         
-        return web.click(selector, timeout=timeout)
+        return web.click(selector, timeout=timeout, load_profile=params.get("load_profile"))
 
     def _handle_web_fill(self, params: dict) -> dict:
         session_id = params.get("_session_id")
@@ -937,7 +943,33 @@ class WindowsBridge:
         if web is None or not web.is_started:
             return {"success": False, "error": "browser_not_started"}
         selectors = params.get("selectors", [])
-        return web.extract_data(selectors=selectors)
+        row_selector = params.get("row_selector")
+        limit = params.get("limit")
+        return web.extract_data(selectors=selectors, row_selector=row_selector, limit=limit)
+
+    def _handle_web_crawl(self, params: dict) -> dict:
+        """并发抓取多个 URL；stream=True 时每完成一个 URL 推送 web_crawl_result 通知"""
+        session_id = params.get("_session_id")
+        web = self._get_web_automation_instance(session_id)
+        if web is None or not web.is_started:
+            return {"success": False, "error": "browser_not_started"}
+        urls = params.get("urls", [])
+        if not urls:
+            return {"success": False, "error": "invalid_params", "message": "Missing 'urls'"}
+
+        on_result = None
+        if params.get("stream", False) and session_id:
+            def on_result(item: dict):
+                self._ipc_server.notify_session(session_id, "web_crawl_result", item)
+
+        return web.crawl(
+            urls,
+            extract_config=params.get("extract_config"),
+            concurrency=params.get("concurrency", 4),
+            per_domain_concurrency=params.get("per_domain_concurrency", 2),
+            load_profile=params.get("load_profile"),
+            on_result=on_result,
+        )
 
     def _handle_web_get_cookies(self, params: dict) -> dict:
         session_id = params.get("_session_id")
@@ -1053,12 +1085,20 @@ class WindowsBridge:
         if web is None or not web.is_started:
             return {"success": False, "error": "browser_not_started"}
         
-        logger.info(f"[WindowsBridge] Generating AI snapshot for session: {session_id}")
-        result = web.ai_snapshot()
+        diff = params.get("diff", False)
+        logger.info(f"[WindowsBridge] Generating AI snapshot for session: {session_id}, diff={diff}")
+        result = web.ai_snapshot(diff=diff)
         
         # Cache refs for later use with ref-based operations
         if result.get("success") and session_id:
-            self._ai_snapshot_refs[session_id] = result.get("refs", {})
+            if result.get("diff"):
+                # Ref ids are stable, so an incremental snapshot updates the cache in place
+                refs = self._ai_snapshot_refs.setdefault(session_id, {})
+                for ref in result.get("removed_refs", []):
+                    refs.pop(ref, None)
+                refs.update(result.get("refs", {}))
+            else:
+                self._ai_snapshot_refs[session_id] = result.get("refs", {})
             logger.debug(f"[WindowsBridge] Cached {len(result.get('refs', {}))} refs for session: {session_id}")
         
         return result
@@ -1074,9 +1114,12 @@ class WindowsBridge:
         url = params.get("url", "")
         wait_until = params.get("wait_until", "domcontentloaded")
         timeout = params.get("timeout", 30000)
+        load_profile = params.get("load_profile")
         
         logger.info(f"[WindowsBridge] Safe navigate to: {url}")
-        return web.navigate_safe(url, wait_until=wait_until, timeout=timeout)
+        resolve = params.get("resolve", True)
+        return web.navigate_safe(url, wait_until=wait_until, timeout=timeout,
+                                 load_profile=load_profile, resolve=resolve)
 
     # ==================== Session Management Handlers ====================
     
@@ -1151,6 +1194,28 @@ class WindowsBridge:
                 return {"success": False, "error": str(e)}
         else:
             return {"success": False, "error": "missing_input_params"}
+    
+    # ==================== Workspace Search Handlers ====================
+    
+    def _get_workspace_indexer(self):
+        from .service_registry import ServiceRegistry
+        return ServiceRegistry.get("workspace_indexer")
+    
+    def _handle_workspace_search(self, params: dict) -> dict:
+        indexer = self._get_workspace_indexer()
+        if indexer is None:
+            return {"success": False, "error": "service_not_available"}
+        query = params.get("query")
+        if not query:
+            return {"success": False, "error": "invalid_params", "message": "Missing 'query'"}
+        return indexer.search(query, workspace=params.get("workspace"), top_k=params.get("top_k", 5))
+    
+    def _handle_workspace_index_status(self, params: dict) -> dict:
+        indexer = self._get_workspace_indexer()
+        if indexer is None:
+            return {"success": False, "error": "service_not_available"}
+        info = indexer.get_status()
+        return {"success": True, "status": info.status.value, "error": info.error, **info.details}
 
     @property
     def is_running(self) -> bool:
@@ -0,0 +1,651 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from loguru import logger
+
+from .service_registry import (
+    ServiceInfo, ServiceStatus, ServiceRegistry, register_service
+)
+
+# 参与索引的文本文件扩展名
+TEXT_EXTENSIONS = {
+    ".md", ".markdown", ".txt", ".rst", ".org", ".log", ".csv", ".tsv",
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".go", ".rs", ".c", ".h", ".cpp", ".hpp",
+    ".cs", ".rb", ".php", ".swift", ".lua", ".sh", ".ps1", ".bat", ".sql",
+    ".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".conf", ".xml", ".html", ".htm", ".css", ".vue",
+}
+# 不进入遍历的目录
+SKIP_DIRS = {
+    ".git", ".svn", ".hg", ".idea", ".vscode", "__pycache__", "node_modules",
+    ".venv", "venv", "env", "dist", "build", ".mypy_cache", ".pytest_cache", ".tox",
+}
+
+MAX_FILE_BYTES = 1024 * 1024  # 超过该大小的文件不索引
+CHUNK_CHARS = 1200  # 每个片段的最大字符数，按行边界切分
+UPSERT_BATCH = 64  # 每次写入向量集合的片段数
+DEBOUNCE_SECONDS = 1.0  # 文件事件静默多久后才处理，合并编辑器的连续写入
+POLL_INTERVAL = 30.0  # 未安装 watchdog 时的轮询扫描间隔
+RETRY_SECONDS = 5.0  # Embedding 服务不可用时的重试间隔
+THROUGHPUT_WINDOW = 60.0  # 吞吐统计的滑动窗口（秒）
+REQUEST_TIMEOUT = 120
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> List[Tuple[int, int, str]]:
+    """按行切分为不超过 max_chars 的片段，返回 [(起始行, 结束行, 文本)]，行号从 1 开始"""
+    chunks: List[Tuple[int, int, str]] = []
+    buffer: List[str] = []
+    size = 0
+    start = 1
+
+    def flush(end: int):
+        nonlocal buffer, size
+        if buffer:
+            piece = "".join(buffer)
+            if piece.strip():
+                chunks.append((start, end, piece))
+        buffer = []
+        size = 0
+
+    for line_no, line in enumerate(text.splitlines(keepends=True), 1):
+        if size + len(line) > max_chars:
+            flush(line_no - 1)
+        # 超长的单行按字符切开
+        while len(line) > max_chars:
+            start = line_no
+            buffer = [line[:max_chars]]
+            flush(line_no)
+            line = line[max_chars:]
+        if not buffer:
+            start = line_no
+        buffer.append(line)
+        size += len(line)
+    flush(start + len(buffer) - 1)
+    return chunks
+
+
+def _is_indexable(rel_path: str) -> bool:
+    parts = rel_path.replace("\\", "/").split("/")
+    if any(part in SKIP_DIRS for part in parts[:-1]):
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in TEXT_EXTENSIONS
+
+
+def _collection_name(workspace: str) -> str:
+    """工作空间名 -> 向量集合名（集合名只允许字母数字和 _.-）"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", workspace)[:40]
+    digest = hashlib.sha1(workspace.encode("utf-8")).hexdigest()[:8]
+    return f"ws-{safe}-{digest}"
+
+
+class _EmbeddingClient:
+    """Embedding 服务 /collections 接口的 HTTP 客户端"""
+
+    def __init__(self, port: int):
+        self._base = f"http://localhost:{port}"
+        self._session = requests.Session()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        r = self._session.post(f"{self._base}{path}", json=payload, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+    def ensure_collection(self, name: str) -> int:
+        """确保集合存在，返回其中的条目数"""
+        r = self._session.get(f"{self._base}/collections/{name}", timeout=REQUEST_TIMEOUT)
+        if r.status_code == 404:
+            return self._post("/collections", {"name": name}).get("count", 0)
+        r.raise_for_status()
+        return r.json().get("count", 0)
+
+    def upsert(self, name: str, ids: List[str], texts: List[str], metadata: List[dict]):
+        self._post(f"/collections/{name}/upsert", {"ids": ids, "texts": texts, "metadata": metadata})
+
+    def delete(self, name: str, ids: List[str]):
+        self._post(f"/collections/{name}/delete", {"ids": ids})
+
+    def query(self, name: str, text: str, top_k: int) -> List[dict]:
+        return self._post(f"/collections/{name}/query", {"texts": [text], "top_k": top_k})["results"][0]
+
+
+class _Workspace:
+    """单个工作空间的索引状态，manifest 记录每个文件的 mtime/大小/哈希与片段数"""
+
+    def __init__(self, name: str, root: str, manifest_dir: Path):
+        self.name = name
+        self.root_config = root
+        self.root = os.path.abspath(root)
+        self.collection = _collection_name(name)
+        self.manifest_path = manifest_dir / f"{self.collection}.json"
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.last_scan: Optional[float] = None
+        self.watch = None
+        self._load()
+
+    def _load(self):
+        if not self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                self.files = data.get("files") or {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"[INDEXER] 读取索引清单失败，将重建: {self.manifest_path}: {e}")
+
+    def save(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "collection": self.collection, "files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def chunk_count(self) -> int:
+        return sum(entry.get("chunks", 0) for entry in self.files.values())
+
+    def scan(self) -> List[str]:
+        """遍历目录，返回 mtime/大小与清单不一致的文件以及已删除的文件"""
+        changed = []
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root).replace("\\", "/")
+                if not _is_indexable(rel_path):
+                    continue
+                seen.add(rel_path)
+                try:
+                    st = os.stat(full_path)
+                except OSError:
+                    continue
+                entry = self.files.get(rel_path)
+                if entry is None or entry.get("mtime_ns") != st.st_mtime_ns or entry.get("size") != st.st_size:
+                    changed.append(rel_path)
+        changed.extend(rel_path for rel_path in self.files if rel_path not in seen)
+        self.last_scan = time.time()
+        return changed
+
+
+class WorkspaceIndexer:
+    """工作空间语义索引服务
+
+    把各 bot 工作空间中的文本文件切片后写入 Embedding 服务的向量集合。
+    文件变更通过 watchdog 监听（未安装时定期轮询扫描），按 mtime/大小与
+    内容哈希判断，只有内容真正变化的文件才会重新向量化。
+    """
+
+    def __init__(self):
+        self.id = "workspace_indexer"
+        self.name = "工作空间索引"
+        self.description = "增量向量化 bot 工作空间文件，提供语义检索"
+        self._status = ServiceStatus.STOPPED
+        self._error: Optional[str] = None
+        self._workspace_roots: Dict[str, str] = {}
+        self._workspaces: Dict[str, _Workspace] = {}
+        self._client: Optional[_EmbeddingClient] = None
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._cond = threading.Condition()
+        # 工作空间 -> {相对路径: (首次事件时间, 最近事件时间)}
+        self._pending: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        self._scan_requested: Dict[str, float] = {}  # 工作空间 -> 请求扫描的时间，"*" 表示重新同步配置
+        self._index_lock = threading.Lock()
+        self._stats = {"files_indexed": 0, "files_removed": 0, "chunks_indexed": 0}
+        self._recent: deque = deque()  # (完成时间, 片段数, 文件数)
+        self._last_lag = 0.0
+        self._ready_event = threading.Event()
+        self._config_manager = None
+
+    def set_workspaces_from_configs(self, configs: Dict[str, Any]):
+        """从 ClawbotConfig 字典中取出配置了 windows_workspace 的工作空间"""
+        self.set_config({"workspaces": {
+            name: config.windows_workspace
+            for name, config in configs.items()
+            if getattr(config, "windows_workspace", "")
+        }})
+
+    def bind_config_manager(self, config_manager):
+        """按当前配置设置工作空间，并在配置保存或删除后重新同步"""
+        from ftk_claw_bot.events import EventType, event_bus
+
+        if self._config_manager is None:
+            event_bus.subscribe(EventType.CONFIG_UPDATED, self._on_configs_changed)
+            event_bus.subscribe(EventType.CONFIG_DELETED, self._on_configs_changed)
+        self._config_manager = config_manager
+        self.set_workspaces_from_configs(config_manager.get_all())
+
+    def _on_configs_changed(self, event):
+        if self._config_manager is not None:
+            self.set_workspaces_from_configs(self._config_manager.get_all())
+
+    def start(self) -> bool:
+        if self._status in (ServiceStatus.RUNNING, ServiceStatus.STARTING):
+            return True
+        try:
+            from ftk_claw_bot.utils.user_data_dir import user_data
+            self._manifest_dir = user_data.embedding_indexer
+            self._stop_event.clear()
+            self._ready_event.clear()
+            self._error = None
+            self._status = ServiceStatus.STARTING
+            self._thread = threading.Thread(target=self._run, name="workspace-indexer", daemon=True)
+            self._thread.start()
+            return True
+        except Exception as e:
+            self._status = ServiceStatus.ERROR
+            self._error = str(e)
+            logger.exception(f"[INDEXER] 启动失败: {e}")
+            return False
+
+    def stop(self) -> bool:
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        self._thread = None
+        self._stop_watching()
+        with self._index_lock:
+            for workspace in self._workspaces.values():
+                self._save_manifest(workspace)
+            self._workspaces = {}
+        self._status = ServiceStatus.STOPPED
+        self._ready_event.set()
+        logger.info("[INDEXER] 服务已停止")
+        return True
+
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """阻塞等待索引线程连上 Embedding 服务并完成工作空间同步，返回是否已就绪"""
+        self._ready_event.wait(timeout)
+        return self._status == ServiceStatus.RUNNING
+
+    def check_started(self) -> bool:
+        return self._status == ServiceStatus.RUNNING
+
+    def get_status(self) -> ServiceInfo:
+        return ServiceInfo(
+            id=self.id,
+            name=self.name,
+            description=self.description,
+            status=self._status,
+            error=self._error,
+            details=self.get_stats()
+        )
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"workspaces": dict(self._workspace_roots)}
+
+    def set_config(self, config: Dict[str, Any]) -> bool:
+        if "workspaces" in config:
+            self._workspace_roots = {
+                name: str(root) for name, root in (config["workspaces"] or {}).items() if root
+            }
+            if self._status == ServiceStatus.RUNNING:
+                with self._cond:
+                    self._scan_requested["*"] = time.time()
+                    self._cond.notify_all()
+        return True
+
+    # ========================================
+    # 检索与统计
+    # ========================================
+
+    def search(self, query: str, workspace: Optional[str] = None, top_k: int = 5) -> Dict[str, Any]:
+        if self._status != ServiceStatus.RUNNING or self._client is None:
+            return {"success": False, "error": "service_not_running"}
+        if not query:
+            return {"success": False, "error": "invalid_params", "message": "Missing 'query'"}
+        workspaces = dict(self._workspaces)
+        if workspace is not None:
+            if workspace not in workspaces:
+                return {"success": False, "error": "workspace_not_found", "message": workspace}
+            workspaces = {workspace: workspaces[workspace]}
+
+        results = []
+        try:
+            for name, state in workspaces.items():
+                for hit in self._client.query(state.collection, query, top_k):
+                    metadata = hit.get("metadata") or {}
+                    results.append({
+                        "workspace": name,
+                        "path": metadata.get("path"),
+                        "start_line": metadata.get("start_line"),
+                        "end_line": metadata.get("end_line"),
+                        "text": metadata.get("text", ""),
+                        "score": hit.get("score", 0.0),
+                    })
+        except requests.RequestException as e:
+            return {"success": False, "error": "embedding_unavailable", "message": str(e)}
+        results.sort(key=lambda item: item["score"], reverse=True)
+        return {"success": True, "results": results[:top_k]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._cond:
+            while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW:
+                self._recent.popleft()
+            pending = sum(len(files) for files in self._pending.values())
+            oldest = min(
+                (first for files in self._pending.values() for first, _ in files.values()),
+                default=None
+            )
+            chunks = sum(item[1] for item in self._recent)
+            files = sum(item[2] for item in self._recent)
+        return {
+            **self._stats,
+            "chunks_per_second": chunks / THROUGHPUT_WINDOW,
+            "files_per_second": files / THROUGHPUT_WINDOW,
+            "pending_files": pending,
+            "lag_seconds": now - oldest if oldest is not None else 0.0,
+            "last_lag_seconds": self._last_lag,
+            "watching": self._observer is not None,
+            "workspaces": {
+                name: {
+                    "root": state.root,
+                    "files": len(state.files),
+                    "chunks": state.chunk_count(),
+                    "last_scan": state.last_scan,
+                }
+                for name, state in list(self._workspaces.items())
+            },
+        }
+
+    # ========================================
+    # 后台索引
+    # ========================================
+
+    def _embedding_port(self) -> Optional[int]:
+        service = ServiceRegistry.get("embedding")
+        if service is None:
+            return None
+        if hasattr(service, "wait_started"):
+            if not service.wait_started(RETRY_SECONDS):
+                return None
+        elif service.get_status().status != ServiceStatus.RUNNING:
+            return None
+        return service.get_config().get("port")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            port = self._embedding_port()
+            if port is None:
+                self._error = "等待 Embedding 服务就绪"
+                self._stop_event.wait(RETRY_SECONDS)
+                continue
+            self._client = _EmbeddingClient(port)
+            try:
+                self._sync_workspaces()
+                self._error = None
+                self._status = ServiceStatus.RUNNING
+                self._ready_event.set()
+                self._process_loop()
+            except requests.RequestException as e:
+                self._error = f"Embedding 服务请求失败: {e}"
+                logger.warning(f"[INDEXER] {self._error}")
+                self._stop_event.wait(RETRY_SECONDS)
+            except Exception as e:
+                self._error = str(e)
+                logger.exception(f"[INDEXER] 索引线程异常: {e}")
+                self._stop_event.wait(RETRY_SECONDS)
+
+    def _sync_workspaces(self):
+        """按配置增删工作空间，新工作空间执行一次全量扫描"""
+        with self._index_lock:
+            for name in list(self._workspaces):
+                if self._workspace_roots.get(name) != self._workspaces[name].root_config:
+                    state = self._workspaces.pop(name)
+                    self._unwatch(state)
+                    self._save_manifest(state)
+                    with self._cond:
+                        self._pending.pop(name, None)
+
+            for name, root in self._workspace_roots.items():
+                if name in self._workspaces:
+                    continue
+                if not os.path.isdir(root):
+                    logger.warning(f"[INDEXER] 工作空间目录不存在，跳过: {name} -> {root}")
+                    continue
+                state = _Workspace(name, root, self._manifest_dir)
+                state.root_config = root
+                if self._client.ensure_collection(state.collection) == 0 and state.files:
+                    # 向量集合被清空或删除，清单已失效
+                    state.files = {}
+                self._workspaces[name] = state
+                self._watch(state)
+                with self._cond:
+                    self._scan_requested[name] = time.time()
+                logger.info(f"[INDEXER] 添加工作空间: {name} -> {state.root}")
+
+    def _process_loop(self):
+        next_poll = time.time() + POLL_INTERVAL
+        while not self._stop_event.is_set():
+            if self._observer is None and time.time() >= next_poll:
+                # 没有文件监听时定期全量扫描
+                next_poll = time.time() + POLL_INTERVAL
+                with self._cond:
+                    for name in self._workspaces:
+                        self._scan_requested.setdefault(name, time.time())
+
+            with self._cond:
+                scan, ready, timeout = self._take_work()
+                if scan is None and not ready:
+                    self._cond.wait(timeout)
+                    continue
+
+            if scan is not None:
+                name, requested = scan
+                if name == "*":
+                    self._sync_workspaces()
+                elif name in self._workspaces:
+                    state = self._workspaces[name]
+                    self._index_files(state, {rel_path: requested for rel_path in state.scan()})
+                continue
+
+            for name, files in ready.items():
+                state = self._workspaces.get(name)
+                if state is not None:
+                    self._index_files(state, files)
+
+    def _take_work(self) -> Tuple[Optional[Tuple[str, float]], Dict[str, Dict[str, float]], float]:
+        """在持有 _cond 时调用：取出一个扫描请求，或静默超过 DEBOUNCE_SECONDS 的文件"""
+        if self._scan_requested:
+            name = "*" if "*" in self._scan_requested else next(iter(self._scan_requested))
+            return (name, self._scan_requested.pop(name)), {}, 0.0
+
+        now = time.time()
+        ready: Dict[str, Dict[str, float]] = {}
+        timeout = POLL_INTERVAL if self._observer is None else 60.0
+        for name, files in self._pending.items():
+            for rel_path, (first, last) in list(files.items()):
+                wait = last + DEBOUNCE_SECONDS - now
+                if wait <= 0:
+                    ready.setdefault(name, {})[rel_path] = first
+                    del files[rel_path]
+                else:
+                    timeout = min(timeout, wait)
+        return None, ready, timeout
+
+    def _index_files(self, state: _Workspace, files: Dict[str, float]):
+        """增量索引一组文件；files 为 相对路径 -> 变更首次被发现的时间"""
+        if not files:
+            return
+        ids: List[str] = []
+        texts: List[str] = []
+        metadata: List[dict] = []
+        stale: List[str] = []
+        updates: Dict[str, Optional[Dict[str, Any]]] = {}
+        indexed_files = 0
+        removed_files = 0
+        indexed_chunks = 0
+
+        def flush():
+            nonlocal ids, texts, metadata, stale
+            for i in range(0, len(ids), UPSERT_BATCH):
+                self._client.upsert(state.collection, ids[i:i + UPSERT_BATCH],
+                                    texts[i:i + UPSERT_BATCH], metadata[i:i + UPSERT_BATCH])
+            if stale:
+                self._client.delete(state.collection, stale)
+            for rel_path, entry in updates.items():
+                if entry is None:
+                    state.files.pop(rel_path, None)
+                else:
+                    state.files[rel_path] = entry
+            updates.clear()
+            ids, texts, metadata, stale = [], [], [], []
+
+        try:
+            with self._index_lock:
+                for rel_path in files:
+                    entry = state.files.get(rel_path)
+                    old_chunks = entry.get("chunks", 0) if entry else 0
+                    full_path = os.path.join(state.root, rel_path)
+                    try:
+                        st = os.stat(full_path)
+                    except OSError:
+                        st = None
+                    if st is None or st.st_size > MAX_FILE_BYTES:
+                        if entry is not None:
+                            stale.extend(f"{rel_path}#{i}" for i in range(old_chunks))
+                            updates[rel_path] = None
+                            removed_files += 1
+                        continue
+                    if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+                        continue
+                    try:
+                        with open(full_path, "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        continue
+                    digest = hashlib.sha1(data).hexdigest()
+                    new_entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": digest, "chunks": old_chunks}
+                    if entry and entry.get("sha1") == digest:
+                        # 只有 mtime 变化（如 touch、同步工具回写），无需重新向量化
+                        updates[rel_path] = new_entry
+                        continue
+
+                    chunks = [] if b"\0" in data[:8192] else chunk_text(data.decode("utf-8", errors="replace"))
+                    for i, (start_line, end_line, text) in enumerate(chunks):
+                        ids.append(f"{rel_path}#{i}")
+                        texts.append(text)
+                        metadata.append({
+                            "path": rel_path, "chunk": i,
+                            "start_line": start_line, "end_line": end_line, "text": text,
+                        })
+                    stale.extend(f"{rel_path}#{i}" for i in range(len(chunks), old_chunks))
+                    new_entry["chunks"] = len(chunks)
+                    updates[rel_path] = new_entry
+                    indexed_files += 1
+                    indexed_chunks += len(chunks)
+                    if len(ids) >= UPSERT_BATCH:
+                        flush()
+                flush()
+        except Exception:
+            # 整组放回队列，等服务恢复后重试；已写入的文件清单已更新，重试时会被跳过
+            with self._cond:
+                pending = self._pending.setdefault(state.name, {})
+                for rel_path, first in files.items():
+                    pending.setdefault(rel_path, (first, first))
+            self._save_manifest(state)
+            raise
+        self._save_manifest(state)
+
+        now = time.time()
+        with self._cond:
+            self._last_lag = now - min(files.values())
+            self._recent.append((now, indexed_chunks, indexed_files))
+        self._stats["files_indexed"] += indexed_files
+        self._stats["chunks_indexed"] += indexed_chunks
+        self._stats["files_removed"] += removed_files
+        if indexed_files or removed_files:
+            logger.info(
+                f"[INDEXER] {state.name}: 索引 {indexed_files} 个文件，移除 {removed_files} 个，"
+                f"延迟 {self._last_lag:.2f}s"
+            )
+
+    def _save_manifest(self, state: _Workspace):
+        try:
+            state.save()
+        except OSError as e:
+            logger.warning(f"[INDEXER] 保存索引清单失败: {state.manifest_path}: {e}")
+
+    # ========================================
+    # 文件监听
+    # ========================================
+
+    def _enqueue(self, name: str, rel_path: str):
+        now = time.time()
+        with self._cond:
+            files = self._pending.setdefault(name, {})
+            first, _ = files.get(rel_path, (now, now))
+            files[rel_path] = (first, now)
+            self._cond.notify_all()
+
+    def _watch(self, state: _Workspace):
+        if self._observer is None:
+            try:
+                from watchdog.observers import Observer
+            except ImportError:
+                logger.info("[INDEXER] 未安装 watchdog，使用定期扫描")
+                return
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+
+        from watchdog.events import FileSystemEventHandler
+        indexer = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed", "closed_no_write"):
+                    return
+                if event.is_directory:
+                    if event.event_type in ("moved", "deleted"):
+                        with indexer._cond:
+                            indexer._scan_requested.setdefault(state.name, time.time())
+                            indexer._cond.notify_all()
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if not path:
+                        continue
+                    rel_path = os.path.relpath(os.fsdecode(path), state.root).replace("\\", "/")
+                    if not rel_path.startswith("..") and _is_indexable(rel_path):
+                        indexer._enqueue(state.name, rel_path)
+
+        state.watch = self._observer.schedule(Handler(), state.root, recursive=True)
+
+    def _unwatch(self, state: _Workspace):
+        if self._observer is not None and state.watch is not None:
+            try:
+                self._observer.unschedule(state.watch)
+            except (KeyError, ValueError):
+                pass
+            state.watch = None
+
+    def _stop_watching(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+
+
+_service_instance: Optional[WorkspaceIndexer] = None
+
+
+def register_workspace_indexer_service() -> WorkspaceIndexer:
+    """注册工作空间索引服务"""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = WorkspaceIndexer()
+        register_service(_service_instance)
+        ServiceRegistry.register_auto_start(_service_instance.id)
+        logger.info("[INDEXER] WorkspaceIndexer 已注册为自启动服务")
+    return _service_instance
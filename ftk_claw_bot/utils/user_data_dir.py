@@ -101,6 +101,16 @@ class UserDataDir:
         """工作空间目录"""
         return self.base / "workspace"
     
+    @property
+    def embedding(self) -> Path:
+        """Embedding 服务数据目录"""
+        return self.base / "embedding"
+    
+    @property
+    def chat(self) -> Path:
+        """聊天记录目录"""
+        return self.base / "chat"
+    
     # ========================================
     # 二级子目录
     # ========================================
@@ -130,6 +140,26 @@ class UserDataDir:
         """按域名存储的 Cookie 目录"""
         return self.web_cookies / "domain"
     
+    @property
+    def embedding_cache(self) -> Path:
+        """向量缓存目录"""
+        return self.embedding / "cache"
+    
+    @property
+    def embedding_collections(self) -> Path:
+        """向量集合目录"""
+        return self.embedding / "collections"
+    
+    @property
+    def embedding_optimized(self) -> Path:
+        """图优化后的模型缓存目录"""
+        return self.embedding / "optimized"
+    
+    @property
+    def embedding_indexer(self) -> Path:
+        """工作空间索引清单目录"""
+        return self.embedding / "indexer"
+    
     # ========================================
     # 配置文件路径
     # ========================================
@@ -144,6 +174,16 @@ class UserDataDir:
         """白名单配置文件路径"""
         return self.authorized_apps / ".whitelist.json"
     
+    @property
+    def gateway_ports_file(self) -> Path:
+        """Gateway 端口分配记录路径"""
+        return self.config / "gateway_ports.json"
+    
+    @property
+    def chat_history_file(self) -> Path:
+        """聊天记录数据库路径"""
+        return self.chat / "history.db"
+    
     # ========================================
     # 工具方法
     # ========================================
@@ -158,12 +198,18 @@ class UserDataDir:
             self.authorized_apps,
             self.skills,
             self.workspace,
+            self.embedding,
+            self.chat,
             # 二级目录
             self.clawbot_configs,
             self.crash_logs,
             self.web_sessions,
             self.web_cookies,
             self.web_cookies_domain,
+            self.embedding_cache,
+            self.embedding_collections,
+            self.embedding_optimized,
+            self.embedding_indexer,
         ]
         for d in dirs:
             d.mkdir(parents=True, exist_ok=True)
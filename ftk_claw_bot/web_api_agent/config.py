@@ -6,6 +6,7 @@ class Config(BaseSettings):
     """Web API Agent 配置类"""
     HEADLESS: bool = False  # 无头模式（False = 显示浏览器窗口）
     MAX_ACTIONS_PER_MINUTE: int = 60  # 每分钟最大操作数
+    LOAD_PROFILE: str = "full"  # 默认页面加载策略（full / fast / text-only）
 
     class Config:
         env_file = ".env"
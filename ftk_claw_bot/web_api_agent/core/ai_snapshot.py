@@ -30,6 +30,32 @@ class AISnapshot:
     refs: dict[str, RefInfo]
     truncated: bool = False
     element_count: int = 0
+    diff: bool = False
+    removed_refs: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _IndexedTree:
+    """Flattened accessibility tree in pre-order.
+
+    ``entries[i]`` is ``(node, depth, sig, parent_sig)`` and ``sizes[i]`` is
+    the number of entries in the subtree rooted at ``i``, so a whole subtree
+    can be skipped by advancing the index.
+    """
+    entries: list[tuple[dict, int, int, int]]
+    sizes: list[int]
+    index_of: dict[int, int]
+    hashes: dict[int, int]
+
+
+@dataclass
+class _SnapshotState:
+    """Per-page state carried between consecutive snapshots."""
+    page_key: tuple[int, str]
+    ref_ids: dict[int, str] = field(default_factory=dict)
+    next_ref: int = 0
+    hashes: dict[int, int] = field(default_factory=dict)
+    truncated: bool = False
 
 
 class AISnapshotGenerator:
@@ -40,17 +66,34 @@ class AISnapshotGenerator:
     - Hierarchical structure with indentation
     - Element references for precise interaction
     - Selector hints for fallback interaction
+    
+    Ref ids are stable across consecutive snapshots of the same page: a node
+    is identified by its path of (role, name, sibling index) from the root,
+    so unchanged elements keep their ``refN`` between calls. With
+    ``diff=True`` only the subtrees that changed since the previous snapshot
+    are emitted.
     """
     
     MAX_CHARS = 50000
     MAX_ELEMENTS = 500
     
-    async def generate(self, page: Page) -> AISnapshot:
+    def __init__(self):
+        self._state: _SnapshotState | None = None
+    
+    def reset(self) -> None:
+        """Forget ref ids and change tracking state."""
+        self._state = None
+    
+    async def generate(self, page: Page, diff: bool = False) -> AISnapshot:
         """
         Generate an AI snapshot from a Playwright page.
         
         Args:
             page: Playwright page object
+            diff: Only return subtrees changed since the previous snapshot
+                of the same page. Falls back to a full snapshot when there
+                is no previous snapshot or the previous full snapshot was
+                truncated (the caller never saw the nodes that were cut off).
             
         Returns:
             AISnapshot with structured content and element references
@@ -58,6 +101,7 @@ class AISnapshotGenerator:
         accessibility_tree = await page.accessibility.snapshot()
         
         if not accessibility_tree:
+            self._state = None
             return AISnapshot(
                 snapshot="(Empty page - no accessibility tree)",
                 refs={},
@@ -65,76 +109,211 @@ class AISnapshotGenerator:
                 element_count=0,
             )
         
-        snapshot_lines, refs = self._format_tree(accessibility_tree)
+        page_key = (id(page), page.url.split("#", 1)[0])
+        previous = self._state
+        if previous is None or previous.page_key != page_key:
+            previous = None
+            self._state = _SnapshotState(page_key=page_key)
+        state = self._state
         
-        snapshot = "\n".join(snapshot_lines)
-        truncated = len(snapshot) > self.MAX_CHARS
+        tree = self._index_tree(accessibility_tree)
         
-        if truncated:
-            snapshot = snapshot[:self.MAX_CHARS] + "\n\n[...TRUNCATED - page too large]"
+        if diff and previous is not None and not previous.truncated:
+            result = self._format_diff(tree, previous)
+        else:
+            result = self._format_full(tree)
+        
+        removed = [sig for sig in state.hashes if sig not in tree.hashes]
+        for sig in removed:
+            ref_key = state.ref_ids.pop(sig, None)
+            if ref_key and result.diff:
+                result.removed_refs.append(ref_key)
+        if not (result.diff and result.truncated):
+            # A truncated diff did not report every change; keep comparing
+            # against the older tree so the rest shows up next time.
+            state.hashes = tree.hashes
+        if not result.diff:
+            state.truncated = result.truncated
+        
+        return result
+    
+    def _format_full(self, tree: _IndexedTree) -> AISnapshot:
+        """Format the whole tree, stopping as soon as a limit is reached."""
+        lines: list[str] = []
+        refs: dict[str, RefInfo] = {}
+        truncated, _ = self._emit(tree, 0, len(tree.entries), 0, None, lines, refs, 0)
+        return self._build(lines, refs, truncated, diff=False)
+    
+    def _format_diff(self, tree: _IndexedTree, previous: _SnapshotState) -> AISnapshot:
+        """Format only the subtrees whose content changed since ``previous``."""
+        lines: list[str] = []
+        refs: dict[str, RefInfo] = {}
+        chars = 0
+        truncated = False
+        
+        i = 0
+        total = len(tree.entries)
+        while i < total:
+            node, depth, sig, parent_sig = tree.entries[i]
+            size = tree.sizes[i]
+            
+            if previous.hashes.get(sig) == tree.hashes[sig]:
+                i += size
+                continue
+            
+            if sig in previous.hashes:
+                # The node itself existed before; the change is further down.
+                i += 1
+                continue
+            
+            parent_ref = None
+            if parent_sig in tree.index_of:
+                parent_ref = self._add_ref(tree.entries[tree.index_of[parent_sig]], refs)
+            
+            truncated, chars = self._emit(tree, i, i + size, depth, parent_ref, lines, refs, chars)
+            if truncated:
+                break
+            i += size
+        
+        if not lines and not truncated:
+            return AISnapshot(
+                snapshot="(No new or changed elements since previous snapshot)",
+                refs={},
+                truncated=False,
+                element_count=0,
+                diff=True,
+            )
+        return self._build(lines, refs, truncated, diff=True)
+    
+    def _emit(
+        self,
+        tree: _IndexedTree,
+        start: int,
+        stop: int,
+        base_depth: int,
+        parent_ref: str | None,
+        lines: list[str],
+        refs: dict[str, RefInfo],
+        chars: int,
+    ) -> tuple[bool, int]:
+        """
+        Append formatted lines for ``tree.entries[start:stop]``.
         
+        Returns:
+            Tuple of (truncated, chars): whether ``MAX_CHARS`` or
+            ``MAX_ELEMENTS`` was hit before ``stop``, and the running
+            character count
+        """
+        for i in range(start, stop):
+            entry = tree.entries[i]
+            if len(refs) >= self.MAX_ELEMENTS:
+                return True, chars
+            
+            node, depth, sig, _ = entry
+            ref_key = self._ref_id(sig)
+            indent = "  " * (depth - base_depth)
+            role = node.get("role", "unknown")
+            name = node.get("name", "")
+            suffix = f" parent={parent_ref}" if parent_ref and i == start else ""
+            
+            if name:
+                display_name = name[:100] + "..." if len(name) > 100 else name
+                line = f"{indent}- {role} \"{display_name}\" [ref={ref_key}{suffix}]"
+            else:
+                line = f"{indent}- {role} [ref={ref_key}{suffix}]"
+            
+            if chars + len(line) + 1 > self.MAX_CHARS:
+                return True, chars
+            chars += len(line) + 1
+            
+            lines.append(line)
+            self._add_ref(entry, refs)
+        return False, chars
+    
+    def _build(self, lines: list[str], refs: dict[str, RefInfo], truncated: bool, diff: bool) -> AISnapshot:
+        snapshot = "\n".join(lines)
+        if truncated:
+            snapshot += "\n\n[...TRUNCATED - page too large]"
         return AISnapshot(
             snapshot=snapshot,
             refs=refs,
             truncated=truncated,
             element_count=len(refs),
+            diff=diff,
         )
     
-    def _format_tree(
-        self,
-        node: dict,
-        depth: int = 0,
-        refs: dict | None = None,
-        counter: list | None = None,
-    ) -> tuple[list[str], dict]:
+    def _ref_id(self, sig: int) -> str:
+        """Return the stable ref id for a node signature, allocating one if new."""
+        state = self._state
+        ref_key = state.ref_ids.get(sig)
+        if ref_key is None:
+            state.next_ref += 1
+            ref_key = f"ref{state.next_ref}"
+            state.ref_ids[sig] = ref_key
+        return ref_key
+    
+    def _add_ref(self, entry: tuple[dict, int, int, int], refs: dict[str, RefInfo]) -> str:
+        node, _, sig, _ = entry
+        ref_key = self._ref_id(sig)
+        if ref_key not in refs:
+            name = node.get("name", "")
+            refs[ref_key] = RefInfo(
+                role=node.get("role", "unknown"),
+                name=name if name else None,
+                selector=self._generate_selector_hint(node),
+            )
+        return ref_key
+    
+    @staticmethod
+    def _is_skipped(node: dict) -> bool:
+        return node.get("role", "unknown") == "generic" and not node.get("name") and not node.get("children")
+    
+    def _index_tree(self, root: dict) -> _IndexedTree:
         """
-        Recursively format accessibility tree nodes.
+        Flatten the accessibility tree iteratively.
         
-        Args:
-            node: Accessibility tree node
-            depth: Current depth for indentation
-            refs: Accumulated refs dictionary
-            counter: Element counter
-            
-        Returns:
-            Tuple of (formatted lines, refs dict)
+        Each node gets a signature derived from its parent's signature and
+        its (role, name, nth sibling with that role and name). Subtree hashes
+        are computed in a reverse pass so that a diff can skip unchanged
+        subtrees.
         """
-        if refs is None:
-            refs = {}
-        if counter is None:
-            counter = [0]
-        
-        lines = []
-        indent = "  " * depth
-        
-        role = node.get("role", "unknown")
-        name = node.get("name", "")
+        entries: list[tuple[dict, int, int, int]] = []
+        child_sigs: list[list[int]] = []
         
-        if role == "generic" and not name and not node.get("children"):
-            return lines, refs
-        
-        counter[0] += 1
-        ref_key = f"ref{counter[0]}"
-        
-        selector_hint = self._generate_selector_hint(node)
-        
-        refs[ref_key] = RefInfo(
-            role=role,
-            name=name if name else None,
-            selector=selector_hint,
-        )
-        
-        if name:
-            display_name = name[:100] + "..." if len(name) > 100 else name
-            lines.append(f"{indent}- {role} \"{display_name}\" [ref={ref_key}]")
+        if not self._is_skipped(root):
+            root_sig = hash((0, root.get("role", "unknown"), root.get("name", ""), 0))
+            stack = [(root, 0, root_sig, 0)]
         else:
-            lines.append(f"{indent}- {role} [ref={ref_key}]")
+            stack = []
+        
+        while stack:
+            entry = stack.pop()
+            node, depth, sig, _ = entry
+            entries.append(entry)
+            
+            seen: dict[tuple[str, str], int] = {}
+            children = []
+            for child in node.get("children", ()):
+                if self._is_skipped(child):
+                    continue
+                key = (child.get("role", "unknown"), child.get("name", ""))
+                nth = seen.get(key, 0)
+                seen[key] = nth + 1
+                children.append((child, depth + 1, hash((sig, key[0], key[1], nth)), sig))
+            child_sigs.append([c[2] for c in children])
+            stack.extend(reversed(children))
         
-        for child in node.get("children", []):
-            child_lines, _ = self._format_tree(child, depth + 1, refs, counter)
-            lines.extend(child_lines)
+        index_of = {entry[2]: i for i, entry in enumerate(entries)}
+        sizes = [1] * len(entries)
+        hashes: dict[int, int] = {}
+        for i in range(len(entries) - 1, -1, -1):
+            node, _, sig, _ = entries[i]
+            kids = child_sigs[i]
+            own = (node.get("role", "unknown"), node.get("name", ""))
+            hashes[sig] = hash(own + tuple(hashes[k] for k in kids))
+            sizes[i] += sum(sizes[index_of[k]] for k in kids)
         
-        return lines, refs
+        return _IndexedTree(entries, sizes, index_of, hashes)
     
     def _generate_selector_hint(self, node: dict) -> str | None:
         """
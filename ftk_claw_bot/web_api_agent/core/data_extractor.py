@@ -1,5 +1,6 @@
 """页面数据提取器"""
 from typing import Dict, Any, List, Optional
+from loguru import logger
 from playwright.async_api import Page
 
 
@@ -156,18 +157,106 @@ class DataExtractor:
 
     @staticmethod
     async def extract_by_selectors(page: Page, selectors: List[Dict[str, str]]) -> Dict[str, Any]:
-        """根据选择器提取数据"""
+        """根据选择器提取数据
+
+        所有选择器在一次 page.evaluate 中完成提取，避免逐元素往返。
+        每项支持 name、selector，以及可选的 attribute（读取属性）
+        或 property（读取 DOM 属性，如 value、href），默认读取文本。
+        选择器无效或页面脚本出错时抛出异常，与"没有匹配的元素"（字段为 None）区分开。
+        """
+        specs = [DataExtractor._normalize_spec(item) for item in selectors]
+        try:
+            values = await page.evaluate(_EXTRACT_BY_SELECTORS_JS, specs)
+        except Exception as e:
+            logger.warning(f"[DataExtractor] 选择器提取失败: {e}")
+            raise
+
         data = {}
-        for item in selectors:
-            name = item.get("name")
-            selector = item.get("selector")
-            try:
-                elements = await page.query_selector_all(selector)
-                if elements:
-                    texts = [(await el.text_content()).strip() for el in elements]
-                    data[name] = texts[0] if len(texts) == 1 else texts
-                else:
-                    data[name] = None
-            except Exception:
-                data[name] = None
+        for i, spec in enumerate(specs):
+            texts = values[i] if values else None
+            if texts:
+                data[spec["name"]] = texts[0] if len(texts) == 1 else texts
+            else:
+                data[spec["name"]] = None
         return data
+
+    @staticmethod
+    async def extract_records(page: Page, row_selector: str, fields: List[Dict[str, Any]],
+                              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按行提取结构化记录
+
+        row_selector 匹配每一行，fields 中的 selector 相对于行元素查询
+        （为空时取行元素本身）。字段默认取首个匹配，multiple=True 时返回列表。
+        整个表格在一次 page.evaluate 中完成提取。
+        选择器无效或页面脚本出错时抛出异常，与"没有匹配的行"（返回空列表）区分开。
+        """
+        specs = [DataExtractor._normalize_spec(item) for item in fields]
+        try:
+            records = await page.evaluate(_EXTRACT_RECORDS_JS, {
+                "rowSelector": row_selector,
+                "fields": specs,
+                "limit": limit or 0,
+            })
+        except Exception as e:
+            logger.warning(f"[DataExtractor] 按行提取失败 (row_selector={row_selector!r}): {e}")
+            raise
+        return records or []
+
+    @staticmethod
+    def _normalize_spec(item: Dict[str, Any]) -> Dict[str, Any]:
+        """规范化选择器描述，只保留页面脚本需要的字段"""
+        return {
+            "name": item.get("name"),
+            "selector": item.get("selector") or "",
+            "attribute": item.get("attribute") or "",
+            "property": item.get("property") or "",
+            "multiple": bool(item.get("multiple", False)),
+        }
+
+
+# 读取单个元素的值：attribute > property > 文本
+_READ_VALUE_JS = '''
+    const readValue = (el, spec) => {
+        if (spec.attribute) return el.getAttribute(spec.attribute);
+        if (spec.property) {
+            const v = el[spec.property];
+            if (v === undefined || v === null) return null;
+            return typeof v === 'object' ? String(v) : v;
+        }
+        return (el.textContent || '').trim();
+    };
+'''
+
+_EXTRACT_BY_SELECTORS_JS = '''(specs) => {''' + _READ_VALUE_JS + '''
+    return specs.map((spec) => {
+        let matched;
+        try {
+            matched = Array.from(document.querySelectorAll(spec.selector));
+        } catch (e) {
+            throw new Error('invalid selector for ' + spec.name + ': ' + spec.selector);
+        }
+        return matched.map((el) => readValue(el, spec));
+    });
+}'''
+
+_EXTRACT_RECORDS_JS = '''({rowSelector, fields, limit}) => {''' + _READ_VALUE_JS + '''
+    let rows = Array.from(document.querySelectorAll(rowSelector));
+    if (limit > 0) rows = rows.slice(0, limit);
+    return rows.map((row) => {
+        const record = {};
+        for (const spec of fields) {
+            let matched;
+            try {
+                matched = spec.selector ? Array.from(row.querySelectorAll(spec.selector)) : [row];
+            } catch (e) {
+                throw new Error('invalid selector for field ' + spec.name + ': ' + spec.selector);
+            }
+            if (spec.multiple) {
+                record[spec.name] = matched.map((el) => readValue(el, spec));
+            } else {
+                record[spec.name] = matched.length ? readValue(matched[0], spec) : null;
+            }
+        }
+        return record;
+    });
+}'''
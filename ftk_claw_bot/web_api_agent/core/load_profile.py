@@ -0,0 +1,77 @@
+"""页面加载策略"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple, Union
+
+
+# 常见统计/广告脚本域名，text-only 模式下直接拦截
+ANALYTICS_KEYWORDS: Tuple[str, ...] = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "hotjar.com",
+    "segment.io",
+    "mixpanel.com",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+)
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """页面加载策略：导航等待条件、操作后等待、资源拦截与静默窗口"""
+    name: str
+    wait_until: str = "networkidle"  # goto 的等待条件
+    timeout: int = 30000
+    action_wait_until: Optional[str] = "networkidle"  # click 后的等待条件，None 表示不等待
+    action_timeout: int = 10000
+    blocked_resource_types: FrozenSet[str] = frozenset()
+    blocked_url_keywords: Tuple[str, ...] = ()
+    quiet_window_ms: int = 0  # 网络静默多久视为加载完成，0 表示不等待
+    quiet_max_ms: int = 0  # 静默等待的上限
+
+    @property
+    def blocks_requests(self) -> bool:
+        return bool(self.blocked_resource_types or self.blocked_url_keywords)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """判断请求是否应被拦截"""
+        if resource_type in self.blocked_resource_types:
+            return True
+        return any(keyword in url for keyword in self.blocked_url_keywords)
+
+
+LOAD_PROFILES: Dict[str, LoadProfile] = {
+    # 完整加载：等待 networkidle，加载全部资源
+    "full": LoadProfile(name="full"),
+    # 快速：DOM 就绪后等待短暂的网络静默窗口
+    "fast": LoadProfile(
+        name="fast",
+        wait_until="domcontentloaded",
+        action_wait_until=None,
+        quiet_window_ms=300,
+        quiet_max_ms=2000,
+    ),
+    # 纯文本：在 fast 基础上拦截图片、媒体、字体和统计脚本
+    "text-only": LoadProfile(
+        name="text-only",
+        wait_until="domcontentloaded",
+        action_wait_until=None,
+        blocked_resource_types=frozenset({"image", "media", "font"}),
+        blocked_url_keywords=ANALYTICS_KEYWORDS,
+        quiet_window_ms=300,
+        quiet_max_ms=2000,
+    ),
+}
+
+
+def get_load_profile(profile: Union[str, LoadProfile, None], default: str = "full") -> LoadProfile:
+    """按名称获取加载策略，未知名称抛出 ValueError"""
+    if isinstance(profile, LoadProfile):
+        return profile
+    name = profile or default
+    if name not in LOAD_PROFILES:
+        raise ValueError(f"Unknown load profile: {name}, available: {', '.join(LOAD_PROFILES)}")
+    return LOAD_PROFILES[name]
@@ -5,9 +5,55 @@ SSRF (Server-Side Request Forgery) Guard.
 Validates URLs to prevent access to internal/private network resources.
 """
 
+import asyncio
 import ipaddress
-from urllib.parse import urlparse
-from typing import Set, Tuple
+import socket
+import threading
+import time
+from urllib.parse import ParseResult, urlparse
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+_TERMINAL = ""  # Trie marker key; never a valid DNS label
+
+
+class _CompiledRules:
+    """Blocked networks and a reversed-label suffix trie built once per rule set."""
+
+    def __init__(self, blocked_ips: Iterable[str], blocked_domains: Iterable[str]):
+        self.networks: Dict[int, List[Tuple[IPNetwork, str]]] = {4: [], 6: []}
+        for blocked_range in blocked_ips:
+            network = ipaddress.ip_network(blocked_range, strict=False)
+            self.networks[network.version].append((network, blocked_range))
+
+        self.trie: dict = {}
+        for domain in blocked_domains:
+            node = self.trie
+            for label in reversed(domain.lower().rstrip(".").split(".")):
+                node = node.setdefault(label, {})
+            node[_TERMINAL] = True
+
+    def blocked_domain(self, hostname: str) -> bool:
+        """True if hostname equals a blocked domain or is a subdomain of one."""
+        node = self.trie
+        for label in reversed(hostname.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _TERMINAL in node:
+                return True
+        return False
+
+    def blocked_range(self, ip: IPAddress) -> Optional[str]:
+        """Return the blocked range containing ip, or None."""
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        for network, blocked_range in self.networks[ip.version]:
+            if ip in network:
+                return blocked_range
+        return None
 
 
 class SSRFGuard:
@@ -20,6 +66,11 @@ class SSRFGuard:
     - Link-local addresses (169.254.0.0/16, fe80::/10)
     - Unique local addresses (fc00::/7)
     - Common localhost hostnames
+    
+    Rules are compiled once into network objects and a domain suffix trie.
+    With ``resolve=True`` hostnames are resolved and every returned address
+    is checked as well, so names pointing at internal addresses are blocked;
+    resolutions are cached for ``DNS_CACHE_TTL`` seconds.
     """
     
     BLOCKED_IPS: Set[str] = {
@@ -44,13 +95,39 @@ class SSRFGuard:
         "*",
     }
     
+    DNS_CACHE_TTL = 60.0
+    DNS_CACHE_MAX_ENTRIES = 1024
+    
+    _compiled: Optional[_CompiledRules] = None
+    _dns_cache: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+    _dns_lock = threading.Lock()
+    
     @classmethod
-    def is_safe_url(cls, url: str) -> Tuple[bool, str]:
+    def compile_rules(cls) -> _CompiledRules:
+        """
+        Build the blocked networks and domain trie.
+        
+        Done lazily on first use; call again after modifying
+        ``BLOCKED_IPS`` or ``BLOCKED_DOMAINS``.
+        """
+        cls._compiled = _CompiledRules(cls.BLOCKED_IPS, cls.BLOCKED_DOMAINS)
+        return cls._compiled
+    
+    @classmethod
+    def _rules(cls) -> _CompiledRules:
+        rules = cls.__dict__.get("_compiled")
+        if rules is None:
+            rules = cls.compile_rules()
+        return rules
+    
+    @classmethod
+    def is_safe_url(cls, url: str, resolve: bool = False) -> Tuple[bool, str]:
         """
         Check if a URL is safe to access.
         
         Args:
             url: The URL to validate
+            resolve: Also resolve the hostname and check every address
             
         Returns:
             Tuple of (is_safe, error_message)
@@ -58,37 +135,37 @@ class SSRFGuard:
             - error_message: Description of why URL is blocked, empty if safe
         """
         try:
-            parsed = urlparse(url)
-            hostname = parsed.hostname
-            
-            if not hostname:
-                return False, "Invalid URL: no hostname"
-            
-            hostname_lower = hostname.lower()
-            
-            if hostname_lower in cls.BLOCKED_DOMAINS:
-                return False, f"Blocked domain: {hostname}"
-            
-            for blocked in cls.BLOCKED_DOMAINS:
-                if hostname_lower.endswith(f".{blocked}"):
-                    return False, f"Blocked domain: {hostname}"
-            
-            try:
-                ip = ipaddress.ip_address(hostname)
-                
-                for blocked_range in cls.BLOCKED_IPS:
-                    network = ipaddress.ip_network(blocked_range, strict=False)
-                    if ip in network:
-                        return False, f"Blocked IP range: {blocked_range}"
-                        
-            except ValueError:
-                pass
-            
-            if parsed.scheme not in ("http", "https"):
-                return False, f"Blocked scheme: {parsed.scheme}"
-            
+            parsed, hostname, error = cls._check_url(url)
+            if error:
+                return False, error
+            if resolve and not cls._is_ip_literal(hostname):
+                return cls._check_addresses(hostname, cls._resolve(hostname, parsed.port))
+            return True, ""
+        except Exception as e:
+            return False, f"Invalid URL: {e}"
+    
+    @classmethod
+    async def is_safe_url_async(cls, url: str, resolve: bool = True) -> Tuple[bool, str]:
+        """
+        Async variant of ``is_safe_url`` that resolves without blocking the loop.
+        
+        Suitable for checking every subrequest from a Playwright route handler.
+        """
+        try:
+            parsed, hostname, error = cls._check_url(url)
+            if error:
+                return False, error
+            if resolve and not cls._is_ip_literal(hostname):
+                addresses = cls._cached_addresses(hostname)
+                if addresses is None:
+                    loop = asyncio.get_running_loop()
+                    try:
+                        infos = await loop.getaddrinfo(hostname, parsed.port, type=socket.SOCK_STREAM)
+                    except socket.gaierror:
+                        infos = []
+                    addresses = cls._store_addresses(hostname, infos)
+                return cls._check_addresses(hostname, addresses)
             return True, ""
-            
         except Exception as e:
             return False, f"Invalid URL: {e}"
     
@@ -106,18 +183,97 @@ class SSRFGuard:
         if not hostname:
             return False, "Empty hostname"
         
-        hostname_lower = hostname.lower()
+        return cls._check_hostname(hostname)
+    
+    @classmethod
+    def clear_dns_cache(cls) -> None:
+        with cls._dns_lock:
+            cls._dns_cache.clear()
+    
+    @classmethod
+    def _check_url(cls, url: str) -> Tuple[ParseResult, str, str]:
+        """Static checks shared by the sync and async paths."""
+        parsed = urlparse(url)
+        hostname = parsed.hostname
+        
+        if not hostname:
+            return parsed, "", "Invalid URL: no hostname"
+        
+        is_safe, error = cls._check_hostname(hostname)
+        if not is_safe:
+            return parsed, hostname, error
+        
+        if parsed.scheme not in ("http", "https"):
+            return parsed, hostname, f"Blocked scheme: {parsed.scheme}"
+        
+        return parsed, hostname, ""
+    
+    @classmethod
+    def _check_hostname(cls, hostname: str) -> Tuple[bool, str]:
+        rules = cls._rules()
+        hostname_lower = hostname.lower().rstrip(".")
         
-        if hostname_lower in cls.BLOCKED_DOMAINS:
+        if rules.blocked_domain(hostname_lower):
             return False, f"Blocked domain: {hostname}"
         
         try:
-            ip = ipaddress.ip_address(hostname)
-            for blocked_range in cls.BLOCKED_IPS:
-                network = ipaddress.ip_network(blocked_range, strict=False)
-                if ip in network:
-                    return False, f"Blocked IP range: {blocked_range}"
+            ip = ipaddress.ip_address(hostname_lower)
         except ValueError:
-            pass
+            return True, ""
         
+        blocked_range = rules.blocked_range(ip)
+        if blocked_range:
+            return False, f"Blocked IP range: {blocked_range}"
+        return True, ""
+    
+    @staticmethod
+    def _is_ip_literal(hostname: str) -> bool:
+        try:
+            ipaddress.ip_address(hostname)
+            return True
+        except ValueError:
+            return False
+    
+    @classmethod
+    def _check_addresses(cls, hostname: str, addresses: Tuple[str, ...]) -> Tuple[bool, str]:
+        if not addresses:
+            return False, f"DNS resolution failed: {hostname}"
+        rules = cls._rules()
+        for address in addresses:
+            blocked_range = rules.blocked_range(ipaddress.ip_address(address))
+            if blocked_range:
+                return False, f"Blocked IP range: {blocked_range} ({hostname} -> {address})"
         return True, ""
+    
+    @classmethod
+    def _resolve(cls, hostname: str, port: Optional[int]) -> Tuple[str, ...]:
+        addresses = cls._cached_addresses(hostname)
+        if addresses is None:
+            try:
+                infos = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+            except socket.gaierror:
+                infos = []
+            addresses = cls._store_addresses(hostname, infos)
+        return addresses
+    
+    @classmethod
+    def _cached_addresses(cls, hostname: str) -> Optional[Tuple[str, ...]]:
+        key = hostname.lower()
+        with cls._dns_lock:
+            entry = cls._dns_cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del cls._dns_cache[key]
+                return None
+            return entry[1]
+    
+    @classmethod
+    def _store_addresses(cls, hostname: str, infos: list) -> Tuple[str, ...]:
+        # sockaddr[0] may carry an IPv6 scope id ("fe80::1%eth0")
+        addresses = tuple(dict.fromkeys(info[4][0].split("%", 1)[0] for info in infos))
+        with cls._dns_lock:
+            if len(cls._dns_cache) >= cls.DNS_CACHE_MAX_ENTRIES:
+                cls._dns_cache.pop(next(iter(cls._dns_cache)))
+            cls._dns_cache[hostname.lower()] = (time.monotonic() + cls.DNS_CACHE_TTL, addresses)
+        return addresses
@@ -1,6 +1,7 @@
 """Web 自动化代理"""
-from playwright.async_api import Page
-from typing import Optional, Dict, Any
+from playwright.async_api import Page, Route, Request
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Dict, Any, Union
 import asyncio
 import random
 import time
@@ -8,6 +9,8 @@ import uuid
 
 from ftk_claw_bot.web_api_agent.config import config
 from ftk_claw_bot.web_api_agent.core.data_extractor import DataExtractor
+from ftk_claw_bot.web_api_agent.core.load_profile import LoadProfile, get_load_profile
+from ftk_claw_bot.web_api_agent.core.ssrf_guard import SSRFGuard
 
 
 def empty_result(url: str = "", title: str = "", error: str = None) -> Dict[str, Any]:
@@ -25,27 +28,122 @@ def empty_result(url: str = "", title: str = "", error: str = None) -> Dict[str,
 class WebAgent:
     """Web 自动化代理：执行浏览器操作"""
 
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, load_profile: Union[str, LoadProfile, None] = None):
         self.page = page
         self.action_count = 0
         self.last_action_time = 0
         self.max_actions_per_minute = config.MAX_ACTIONS_PER_MINUTE
-
-    async def navigate(self, url: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.load_profile = get_load_profile(load_profile, default=config.LOAD_PROFILE)
+        self._active_profile = self.load_profile
+        self._routing_installed = False
+        self._ssrf_guard_enabled = False
+        self._ssrf_resolve = True
+        self._network_tracking = False
+        self._inflight_requests = 0
+        self._last_network_activity = 0.0
+
+    async def _apply_profile(self, load_profile: Union[str, LoadProfile, None] = None) -> LoadProfile:
+        """激活加载策略（单次调用覆盖或会话默认），按需安装请求拦截和网络跟踪"""
+        profile = get_load_profile(load_profile) if load_profile else self.load_profile
+        self._active_profile = profile
+
+        if profile.blocks_requests and not self._routing_installed:
+            await self.page.route("**/*", self._route_request)
+            self._routing_installed = True
+
+        if profile.quiet_window_ms and not self._network_tracking:
+            self.page.on("request", self._on_request_started)
+            self.page.on("requestfinished", self._on_request_done)
+            self.page.on("requestfailed", self._on_request_done)
+            self._network_tracking = True
+
+        return profile
+
+    async def enable_ssrf_guard(self, resolve: bool = True):
+        """对页面发出的每个 http(s) 子请求做 SSRF 检查（DNS 结果带缓存）"""
+        self._ssrf_guard_enabled = True
+        self._ssrf_resolve = resolve
+        if not self._routing_installed:
+            await self.page.route("**/*", self._route_request)
+            self._routing_installed = True
+
+    def disable_ssrf_guard(self):
+        """关闭子请求 SSRF 检查（请求拦截保留，只是不再检查）"""
+        self._ssrf_guard_enabled = False
+
+    @asynccontextmanager
+    async def ssrf_guard(self, resolve: bool = True) -> AsyncIterator["WebAgent"]:
+        """仅在 with 块内开启 SSRF 检查，退出时恢复原来的状态"""
+        previous = (self._ssrf_guard_enabled, self._ssrf_resolve)
+        await self.enable_ssrf_guard(resolve=resolve)
+        try:
+            yield self
+        finally:
+            self._ssrf_guard_enabled, self._ssrf_resolve = previous
+
+    async def _route_request(self, route: Route):
+        """按当前加载策略和 SSRF 防护拦截资源请求"""
+        request = route.request
+        if self._active_profile.should_block(request.resource_type, request.url):
+            await route.abort()
+            return
+        if self._ssrf_guard_enabled and request.url.startswith(("http://", "https://")):
+            is_safe, _ = await SSRFGuard.is_safe_url_async(request.url, resolve=self._ssrf_resolve)
+            if not is_safe:
+                await route.abort("blockedbyclient")
+                return
+        await route.continue_()
+
+    def _on_request_started(self, request: Request):
+        self._inflight_requests += 1
+        self._last_network_activity = time.monotonic()
+
+    def _on_request_done(self, request: Request):
+        self._inflight_requests = max(0, self._inflight_requests - 1)
+        self._last_network_activity = time.monotonic()
+
+    async def _wait_for_quiet(self, profile: LoadProfile):
+        """等待网络静默 quiet_window_ms，最长 quiet_max_ms"""
+        if not profile.quiet_window_ms:
+            return
+        quiet = profile.quiet_window_ms / 1000
+        deadline = time.monotonic() + profile.quiet_max_ms / 1000
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            idle_for = now - self._last_network_activity
+            if self._inflight_requests == 0 and idle_for >= quiet:
+                return
+            remaining = quiet - idle_for if self._inflight_requests == 0 else quiet
+            await asyncio.sleep(min(max(remaining, 0.01), deadline - now))
+
+    async def goto(self, url: str, load_profile: Union[str, LoadProfile, None] = None):
+        """按加载策略打开 URL，不提取页面结构，失败时抛出异常"""
+        profile = await self._apply_profile(load_profile)
+        await self.page.goto(url, wait_until=profile.wait_until, timeout=profile.timeout)
+        await self.page.wait_for_load_state("domcontentloaded")
+        await self._wait_for_quiet(profile)
+
+    async def navigate(self, url: str, config: Optional[Dict[str, Any]] = None,
+                       load_profile: Union[str, LoadProfile, None] = None) -> Dict[str, Any]:
         """导航到指定 URL"""
         try:
-            await self.page.goto(url, wait_until="networkidle", timeout=30000)
-            await self.page.wait_for_load_state("domcontentloaded")
+            await self.goto(url, load_profile)
             return await DataExtractor.extract_page_structure(self.page, config)
         except Exception as e:
             return empty_result(self.page.url, '', str(e))
 
-    async def click(self, selector: str, retries: int = 3, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def click(self, selector: str, retries: int = 3, config: Optional[Dict[str, Any]] = None,
+                    load_profile: Union[str, LoadProfile, None] = None) -> Dict[str, Any]:
         """点击元素"""
         for attempt in range(retries):
             try:
+                profile = await self._apply_profile(load_profile)
                 await self.page.click(selector)
-                await self.page.wait_for_load_state("networkidle", timeout=10000)
+                if profile.action_wait_until:
+                    await self.page.wait_for_load_state(profile.action_wait_until, timeout=profile.action_timeout)
+                await self._wait_for_quiet(profile)
                 return await DataExtractor.extract_page_structure(self.page, config)
             except Exception:
                 if attempt == retries - 1:
@@ -201,6 +299,10 @@ class WebAgent:
         """提取数据"""
         return await DataExtractor.extract_by_selectors(self.page, selectors)
 
+    async def extract_records(self, row_selector: str, fields: list, limit: Optional[int] = None) -> list:
+        """按行提取结构化记录"""
+        return await DataExtractor.extract_records(self.page, row_selector, fields, limit)
+
     async def get_page_content(self) -> str:
         """获取页面内容"""
         try:
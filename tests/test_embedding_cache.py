@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+from ftk_claw_bot.services.embedding.cache import EmbeddingCache, _DiskTier
+
+DIM = 4
+
+
+def _vectors(n, start=0):
+    return np.arange(start, start + n, dtype=np.float32)[:, None] * np.ones((1, DIM), dtype=np.float32)
+
+
+def test_memory_lru_evicts_oldest():
+    cache = EmbeddingCache("m", max_memory_bytes=2 * DIM * 4)
+    cache.put_many(["a", "b"], _vectors(2))
+    cache.get_many(["a"])
+    cache.put_many(["c"], _vectors(1, 2))
+    a, b, c = cache.get_many(["a", "b", "c"])
+    assert a is not None and b is None and c is not None
+
+
+def test_key_is_nfc_normalized_and_model_scoped():
+    cache = EmbeddingCache("m")
+    assert cache.key("\u00e9") == cache.key("e\u0301")
+    assert cache.key("x") != EmbeddingCache("other").key("x")
+
+
+def test_disk_ring_buffer_overwrites_oldest(tmp_path):
+    disk = _DiskTier(str(tmp_path), "m", DIM, capacity=3)
+    keys = [bytes([i]) * 20 for i in range(5)]
+    disk.put_many(list(zip(keys, _vectors(5))))
+    assert disk.count == 3
+    assert disk.next_slot == 2
+    assert disk.get(keys[0]) is None and disk.get(keys[1]) is None
+    assert disk.get(keys[4])[0] == 4.0
+    disk.flush()
+
+    reopened = _DiskTier(str(tmp_path), "m", DIM, capacity=3)
+    assert reopened.count == 3
+    assert [reopened.get(k)[0] for k in keys[2:]] == [2.0, 3.0, 4.0]
+
+    rebuilt = _DiskTier(str(tmp_path), "other-model", DIM, capacity=3)
+    assert rebuilt.count == 0 and rebuilt.get(keys[4]) is None
+
+
+def test_disk_tier_grows_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(_DiskTier, "INITIAL_ROWS", 2)
+    disk = _DiskTier(str(tmp_path), "m", DIM, capacity=10)
+    keys = [bytes([i]) * 20 for i in range(7)]
+    disk.put_many(list(zip(keys, _vectors(7))))
+    assert disk.rows == 8
+    assert [disk.get(k)[0] for k in keys] == list(range(7))
+
+
+def test_disk_persists_through_writer(tmp_path):
+    cache = EmbeddingCache("m", disk_dir=str(tmp_path))
+    cache.put_many(["a", "b"], _vectors(2, 1))
+    cache.close()
+
+    reloaded = EmbeddingCache("m", max_memory_bytes=0, disk_dir=str(tmp_path))
+    reloaded.open_disk(DIM)
+    a, b, c = reloaded.get_many(["a", "b", "c"])
+    assert a[0] == 1.0 and b[0] == 2.0 and c is None
+    stats = reloaded.stats()
+    assert stats["disk_hits"] == 2 and stats["misses"] == 1
+    reloaded.close()
+
+
+def test_get_many_does_not_wait_for_disk_writes(tmp_path):
+    cache = EmbeddingCache("m", disk_dir=str(tmp_path))
+    cache.open_disk(DIM)
+    cache.put_many(["a"], _vectors(1))
+    cache.flush()
+
+    # 模拟写入线程正在写盘：内存层照常命中，磁盘层查询按未命中处理
+    assert cache._disk_lock.acquire(timeout=1)
+    try:
+        done = threading.Event()
+        result = []
+
+        def lookup():
+            result.extend(cache.get_many(["a", "not-cached"]))
+            done.set()
+
+        threading.Thread(target=lookup).start()
+        assert done.wait(1)
+        assert result[0] is not None and result[1] is None
+    finally:
+        cache._disk_lock.release()
+    cache.close()
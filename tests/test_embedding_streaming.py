@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from ftk_claw_bot.services.embedding import streaming
+from ftk_claw_bot.services.embedding.server import require_loopback
+from ftk_claw_bot.services.embedding.streaming import (
+    StreamInputError, iter_file_items, iter_request_items, parse_item, stream_embeddings
+)
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def test_parse_item_forms():
+    assert parse_item('"hello"\n', 3) == (3, "hello")
+    assert parse_item('{"id": "a", "text": "x"}', 1) == ("a", "x")
+    assert parse_item('{"text": "x"}', 7) == (7, "x")
+    assert parse_item("   \n", 1) is None
+    assert parse_item("plain text\r\n", 2, ndjson=False) == (2, "plain text")
+
+
+@pytest.mark.parametrize("line", ["{bad", "123", '{"id": 1}'])
+def test_parse_item_rejects_invalid(line):
+    with pytest.raises(StreamInputError) as info:
+        parse_item(line, 5)
+    assert info.value.line == 5
+
+
+def test_request_lines_split_across_chunks():
+    items = asyncio.run(_collect(iter_request_items(_chunks(b'"a"\n"b', b'"\n\n{"id": "z", "te', b'xt": "c"}'))))
+    assert items == [(1, "a"), (2, "b"), ("z", "c")]
+
+
+def test_request_line_too_long(monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_LINE_BYTES", 8)
+    with pytest.raises(StreamInputError) as info:
+        asyncio.run(_collect(iter_request_items(_chunks(b'"a"\n', b'"0123456789'))))
+    assert info.value.line == 2
+
+
+def test_file_lines(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("first\n\nsecond\nlast", encoding="utf-8")
+    items = asyncio.run(_collect(iter_file_items(str(path), ndjson=False)))
+    assert items == [(1, "first"), (3, "second"), (4, "last")]
+
+
+def test_file_line_too_long_is_not_split(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_LINE_BYTES", 8)
+    path = tmp_path / "input.txt"
+    path.write_text("short\n" + "x" * 20 + "\nafter\n", encoding="utf-8")
+
+    seen = []
+
+    async def run():
+        async for item in iter_file_items(str(path), ndjson=False):
+            seen.append(item)
+
+    with pytest.raises(StreamInputError) as info:
+        asyncio.run(run())
+    assert info.value.line == 2
+    assert seen == [(1, "short")]
+
+
+def test_file_last_line_at_limit_without_newline(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_LINE_BYTES", 8)
+    path = tmp_path / "input.txt"
+    path.write_text("a\n" + "y" * 8, encoding="utf-8")
+    items = asyncio.run(_collect(iter_file_items(str(path), ndjson=False)))
+    assert items == [(1, "a"), (2, "y" * 8)]
+
+
+def test_stream_embeddings_reports_bad_line_after_earlier_batches():
+    async def embed(texts):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    body = b'"a"\n"b"\n"c"\n{bad\n"d"\n'
+    output = asyncio.run(_collect(stream_embeddings(iter_request_items(_chunks(body)), embed, batch_size=2)))
+    lines = [json.loads(line) for chunk in output for line in chunk.decode("utf-8").splitlines()]
+    assert [line["id"] for line in lines[:-1]] == [1, 2, 3]
+    assert lines[-1]["line"] == 4
+    assert lines[-1]["count"] == 3
+
+
+def _request(host):
+    scope = {"type": "http", "method": "POST", "path": "/embed/file", "headers": [],
+             "query_string": b"", "client": (host, 50000) if host else None}
+    return Request(scope)
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "::1", "localhost"])
+def test_require_loopback_allows_local(host):
+    require_loopback(_request(host))
+
+
+@pytest.mark.parametrize("host", ["172.20.0.5", "192.168.1.10", "testclient", None])
+def test_require_loopback_rejects_remote(host):
+    with pytest.raises(HTTPException) as info:
+        require_loopback(_request(host))
+    assert info.value.status_code == 403
@@ -0,0 +1,100 @@
+import pytest
+
+from ftk_claw_bot.core.group_chat_scheduler import GroupChatScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _scheduler(clock, rate=0):
+    fired = []
+    scheduler = GroupChatScheduler(lambda bot, reason: fired.append((bot, reason)),
+                                   max_triggers_per_second=rate, clock=clock)
+    return scheduler, fired
+
+
+def test_fires_when_due(clock):
+    scheduler, fired = _scheduler(clock)
+    scheduler.schedule("a", 5)
+    assert scheduler.run_pending(clock.now + 4) == pytest.approx(1)
+    assert fired == []
+    assert scheduler.run_pending(clock.now + 5) is None
+    assert fired == [("a", "timer_expired")]
+    assert scheduler.pending() == 0
+
+
+def test_reschedule_debounces(clock):
+    scheduler, fired = _scheduler(clock)
+    scheduler.schedule("a", 5)
+    clock.now += 3
+    scheduler.schedule("a", 5)
+    scheduler.run_pending(clock.now + 4)
+    assert fired == []
+    scheduler.run_pending(clock.now + 5)
+    assert fired == [("a", "timer_expired")]
+    assert scheduler.get_stats()["debounced"] == 1
+
+
+def test_mention_replaces_timer_and_is_not_postponed(clock):
+    scheduler, fired = _scheduler(clock)
+    scheduler.schedule("a", 10)
+    scheduler.trigger_now("a")
+    scheduler.schedule("a", 10)
+    scheduler.run_pending(clock.now)
+    assert fired == [("a", "mentioned")]
+    assert scheduler.run_pending(clock.now + 20) is None
+    assert fired == [("a", "mentioned")]
+
+
+def test_cancel(clock):
+    scheduler, fired = _scheduler(clock)
+    scheduler.schedule("a", 1)
+    scheduler.schedule("b", 1)
+    scheduler.cancel("a")
+    scheduler.run_pending(clock.now + 1)
+    assert fired == [("b", "timer_expired")]
+    scheduler.schedule("c", 1)
+    scheduler.cancel_all()
+    assert scheduler.run_pending(clock.now + 2) is None
+    assert fired == [("b", "timer_expired")]
+
+
+def test_rate_limit_prefers_mentions(clock):
+    scheduler, fired = _scheduler(clock, rate=1)
+    scheduler.schedule("t1", 0)
+    scheduler.schedule("t2", 0)
+    scheduler.trigger_now("m")
+    wait = scheduler.run_pending(clock.now)
+    assert fired == [("m", "mentioned")]
+    assert wait == pytest.approx(1)
+
+    scheduler.run_pending(clock.now + 1)
+    assert fired[1:] == [("t1", "timer_expired")]
+    scheduler.run_pending(clock.now + 2)
+    assert fired[2:] == [("t2", "timer_expired")]
+    assert scheduler.get_stats()["rate_limited"] >= 2
+
+
+def test_callback_error_does_not_stop_others(clock):
+    fired = []
+
+    def on_trigger(bot, reason):
+        if bot == "bad":
+            raise RuntimeError("boom")
+        fired.append(bot)
+
+    scheduler = GroupChatScheduler(on_trigger, max_triggers_per_second=0, clock=clock)
+    scheduler.schedule("bad", 0)
+    scheduler.schedule("good", 0)
+    scheduler.run_pending(clock.now)
+    assert fired == ["good"]
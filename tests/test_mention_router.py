@@ -0,0 +1,54 @@
+from ftk_claw_bot.core.mention_router import MentionRouter
+
+
+def _router():
+    router = MentionRouter()
+    router.set_bots(["alice", "bob", "bot-2", "v1.5", "carol"])
+    router.set_aliases("alice", ["@al"])
+    router.set_group("team-x", ["al", "bob"])
+    return router
+
+
+def test_routes_names_aliases_and_groups():
+    router = _router()
+    assert router.route("hi @alice") == {"alice"}
+    assert router.route("@al please") == {"alice"}
+    assert router.route("@team-x sync") == {"alice", "bob"}
+    assert router.route("@all") == {"alice", "bob", "bot-2", "v1.5", "carol"}
+    assert router.route("no mention here") == set()
+    assert router.route("") == set()
+
+
+def test_longest_match_and_boundaries():
+    router = _router()
+    assert router.route("@bot-2 go") == {"bot-2"}
+    assert router.route("ask @bob.") == {"bob"}
+    assert router.route("@bob-") == {"bob"}
+    assert router.route("@v1.5, then @carol!") == {"v1.5", "carol"}
+    assert router.route("@bobby") == set()
+    assert router.route("@alice_x") == set()
+
+
+def test_email_is_not_a_mention():
+    assert _router().route("mail me at x@bob") == set()
+
+
+def test_roster_changes_rebuild():
+    router = _router()
+    assert router.route("@dave") == set()
+    router.set_bots(["alice", "dave"])
+    assert router.route("@dave @bob") == {"dave"}
+    assert router.route("@team-x") == {"alice"}
+    router.set_aliases("alice", [])
+    assert router.route("@al") == set()
+    router.set_group("team-x", None)
+    assert router.route("@team-x") == set()
+
+
+def test_bot_name_wins_over_alias_and_group():
+    router = MentionRouter()
+    router.set_bots(["a", "b"])
+    router.set_aliases("b", ["a"])
+    router.set_group("b", ["a"])
+    assert router.route("@a") == {"a"}
+    assert router.route("@b") == {"b"}
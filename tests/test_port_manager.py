@@ -0,0 +1,123 @@
+import json
+import socket
+
+import pytest
+
+from ftk_claw_bot.core import port_manager as port_manager_module
+from ftk_claw_bot.core.port_manager import PortManager
+
+
+@pytest.fixture
+def busy(monkeypatch):
+    """被其他进程占用的端口"""
+    ports = set()
+    monkeypatch.setattr(PortManager, "is_port_available", lambda self, port: port not in ports)
+    return ports
+
+
+def test_assigns_lowest_free_port(busy):
+    manager = PortManager(20000, 20004)
+    assert manager.assign_port("a") == 20000
+    assert manager.assign_port("b") == 20001
+    assert manager.assign_port("a") == 20000
+    assert manager.get_all_assigned_ports() == {"a": 20000, "b": 20001}
+
+
+def test_batch_assign_keeps_existing(busy):
+    manager = PortManager(20000, 20004)
+    manager.assign_port("b")
+    result = manager.assign_ports(["a", "b", "c", "a"])
+    assert result == {"a": 20001, "b": 20000, "c": 20002}
+
+
+def test_skips_ports_held_by_other_processes(busy):
+    busy.update({20000, 20001})
+    manager = PortManager(20000, 20004)
+    assert manager.assign_port("a") == 20002
+    assert manager.get_stats()["conflicts"] == [20000, 20001]
+
+
+def test_conflicts_are_retried_later(busy, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(port_manager_module.time, "monotonic", lambda: now[0])
+    busy.add(20000)
+    manager = PortManager(20000, 20001)
+    assert manager.assign_port("a") == 20001
+    busy.clear()
+    assert manager.assign_port("b") is None
+    now[0] += port_manager_module.CONFLICT_RETRY_SECONDS
+    assert manager.assign_port("b") == 20000
+
+
+def test_release_keeps_mapping_and_reclaims_when_exhausted(busy):
+    manager = PortManager(20000, 20001)
+    manager.assign_ports(["a", "b"])
+    assert manager.release_port("a")
+    assert not manager.release_port("a")
+    assert manager.get_assigned_port("a") == 20000
+    assert manager.assign_port("a") == 20000
+
+    manager.release_port("a")
+    assert manager.assign_port("c") == 20000
+    assert manager.get_assigned_port("a") is None
+    assert manager.assign_port("a") is None
+
+
+def test_forget_returns_port_to_pool(busy):
+    manager = PortManager(20000, 20001)
+    manager.assign_port("a")
+    assert manager.forget_port("a")
+    assert not manager.forget_port("a")
+    assert manager.assign_port("b") == 20000
+
+
+def test_reserve_port(busy):
+    manager = PortManager(20000, 20004)
+    manager.assign_port("a")
+    assert not manager.reserve_port("b", 20000)
+    assert manager.reserve_port("b", 20003)
+    busy.add(20004)
+    assert not manager.reserve_port("c", 20004)
+    manager.release_port("a")
+    assert manager.reserve_port("c", 20000)
+    assert manager.get_assigned_port("a") is None
+    assert manager.assign_port("d") == 20001
+
+
+def test_persists_assignments(busy, tmp_path):
+    state_file = tmp_path / "gateway_ports.json"
+    manager = PortManager(20000, 20009, state_file=state_file)
+    manager.assign_ports(["a", "b"])
+    manager.forget_port("a")
+    manager.assign_port("c")
+    assert json.loads(state_file.read_text(encoding="utf-8")) == {"ports": {"b": 20001, "c": 20000}}
+
+    reloaded = PortManager(20000, 20009, state_file=state_file)
+    assert reloaded.get_all_assigned_ports() == {}
+    assert reloaded.assign_ports(["new", "c", "b"]) == {"new": 20002, "c": 20000, "b": 20001}
+
+
+def test_kept_port_taken_by_other_process_is_replaced(busy, tmp_path):
+    state_file = tmp_path / "gateway_ports.json"
+    PortManager(20000, 20009, state_file=state_file).assign_port("a")
+    busy.add(20000)
+    assert PortManager(20000, 20009, state_file=state_file).assign_port("a") == 20001
+
+
+def test_ignores_corrupt_state_file(busy, tmp_path):
+    state_file = tmp_path / "gateway_ports.json"
+    state_file.write_text("{not json", encoding="utf-8")
+    assert PortManager(20000, 20001, state_file=state_file).assign_port("a") == 20000
+
+
+def test_invalid_range():
+    with pytest.raises(ValueError):
+        PortManager(20010, 20000)
+
+
+def test_bind_probe_detects_listening_socket():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        s.listen()
+        port = s.getsockname()[1]
+        assert not PortManager(port, port).is_port_available(port)
@@ -0,0 +1,110 @@
+import asyncio
+import socket
+
+import pytest
+
+from ftk_claw_bot.web_api_agent.core.ssrf_guard import SSRFGuard
+
+
+class FakeResolver:
+    """hostname -> addresses; unknown names fail like a real lookup."""
+
+    def __init__(self):
+        self.table = {}
+        self.calls = []
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        self.calls.append(host)
+        if host not in self.table:
+            raise socket.gaierror("not found")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port or 0))
+                for address in self.table[host]]
+
+
+@pytest.fixture(autouse=True)
+def dns(monkeypatch):
+    resolver = FakeResolver()
+
+    async def loop_getaddrinfo(loop, host, port, *args, **kwargs):
+        return resolver.getaddrinfo(host, port)
+
+    monkeypatch.setattr(socket, "getaddrinfo", resolver.getaddrinfo)
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", loop_getaddrinfo)
+    SSRFGuard.clear_dns_cache()
+    yield resolver
+    SSRFGuard.clear_dns_cache()
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/",
+    "http://10.1.2.3:8080/x",
+    "http://172.31.0.1/",
+    "http://192.168.1.1/",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/",
+    "http://[fd00::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://localhost/",
+    "http://LOCALHOST./",
+    "http://api.localhost/",
+    "http://0.0.0.0/",
+])
+def test_blocks_internal_targets(url):
+    safe, error = SSRFGuard.is_safe_url(url)
+    assert not safe and error
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/", "http:///nohost"])
+def test_blocks_bad_scheme_and_missing_host(url):
+    assert not SSRFGuard.is_safe_url(url)[0]
+
+
+def test_allows_public_targets():
+    assert SSRFGuard.is_safe_url("https://93.184.216.34/") == (True, "")
+    assert SSRFGuard.is_safe_url("https://example.com/path") == (True, "")
+    assert SSRFGuard.is_safe_url("https://mylocalhost.com/")[0]
+
+
+def test_resolve_blocks_names_pointing_inside(dns):
+    dns.table["internal.example"] = ["93.184.216.34", "10.0.0.5"]
+    safe, error = SSRFGuard.is_safe_url("http://internal.example/", resolve=True)
+    assert not safe and "10.0.0.0/8" in error
+
+    dns.table["public.example"] = ["93.184.216.34"]
+    assert SSRFGuard.is_safe_url("http://public.example/", resolve=True) == (True, "")
+    assert not SSRFGuard.is_safe_url("http://missing.example/", resolve=True)[0]
+
+
+def test_resolutions_are_cached(dns):
+    dns.table["public.example"] = ["93.184.216.34"]
+    for _ in range(3):
+        assert SSRFGuard.is_safe_url("http://public.example/", resolve=True)[0]
+    assert dns.calls == ["public.example"]
+
+    SSRFGuard.clear_dns_cache()
+    SSRFGuard.is_safe_url("http://public.example/", resolve=True)
+    assert dns.calls == ["public.example", "public.example"]
+
+
+def test_ip_literals_are_not_resolved(dns):
+    assert SSRFGuard.is_safe_url("http://93.184.216.34/", resolve=True)[0]
+    assert dns.calls == []
+
+
+def test_async_check_shares_cache(dns):
+    dns.table["internal.example"] = ["192.168.0.10"]
+    safe, _ = asyncio.run(SSRFGuard.is_safe_url_async("http://internal.example/"))
+    assert not safe
+    assert not SSRFGuard.is_safe_url("http://internal.example/", resolve=True)[0]
+    assert dns.calls == ["internal.example"]
+
+
+def test_recompile_after_rule_change(monkeypatch):
+    monkeypatch.setattr(SSRFGuard, "BLOCKED_DOMAINS", SSRFGuard.BLOCKED_DOMAINS | {"corp.example"})
+    SSRFGuard.compile_rules()
+    try:
+        assert not SSRFGuard.is_safe_url("http://wiki.corp.example/")[0]
+    finally:
+        monkeypatch.undo()
+        SSRFGuard.compile_rules()
+    assert SSRFGuard.is_safe_url("http://wiki.corp.example/")[0]
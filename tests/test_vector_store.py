@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+from ftk_claw_bot.services.embedding.vector_index import VectorStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / "embedding"
+    (root / "cache").mkdir(parents=True)
+    (root / "cache" / "meta.json").write_text("{}", encoding="utf-8")
+    store = VectorStore(str(root / "collections"))
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("name", [".", "..", "...", ".hidden", "-x", "_x", "a/b", "a\\b", "", "x" * 65])
+def test_rejects_unsafe_names(store, name):
+    with pytest.raises(ValueError):
+        store.create(name, 4)
+    with pytest.raises(ValueError):
+        store.drop(name)
+
+
+def test_drop_dotdot_keeps_sibling_data(store, tmp_path):
+    with pytest.raises(ValueError):
+        store.drop("..")
+    assert (tmp_path / "embedding" / "cache" / "meta.json").exists()
+
+
+def test_create_and_drop_inside_root(store, tmp_path):
+    collection = store.create("docs.v1", 4)
+    collection.upsert(["a"], np.ones((1, 4), dtype=np.float32))
+    collection.flush()
+    directory = tmp_path / "embedding" / "collections" / "docs.v1"
+    assert os.path.isdir(directory)
+
+    assert store.drop("docs.v1")
+    assert not directory.exists()
+    assert (tmp_path / "embedding" / "cache" / "meta.json").exists()
+    assert not store.drop("docs.v1")
+
+
+def test_reload_skips_unsafe_directories(tmp_path):
+    root = tmp_path / "collections"
+    store = VectorStore(str(root))
+    store.create("notes", 3).upsert(["n"], np.ones((1, 3), dtype=np.float32))
+    store.close()
+    (root / ".hidden").mkdir()
+    (root / ".hidden" / "meta.json").write_text('{"dimension": 3}', encoding="utf-8")
+
+    reloaded = VectorStore(str(root))
+    assert [c["name"] for c in reloaded.list()] == ["notes"]
+    reloaded.close()